@@ -0,0 +1,250 @@
+# backend/admission.py
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+# --- Admission Configuration ---
+# Total requests allowed to run at once across every class
+ADMISSION_MAX_CONCURRENCY = _env_int("ADMISSION_MAX_CONCURRENCY", 64)
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+
+# Lower priority number = served first when a slot frees up.
+# Each class can be tuned with ADMISSION_<CLASS>_LIMIT / _QUEUE / _WAIT_SECONDS.
+_CLASS_DEFAULTS = {
+    #  name       priority  limit  queue  max wait (s)
+    "booking":  (0,        64,    200,   5.0),
+    "manager":  (1,        32,    100,   5.0),
+    "default":  (2,        32,    100,   2.0),
+    "browse":   (3,        24,    100,   1.0),
+}
+
+# Paths that are never queued (probes, docs and the admin endpoints themselves)
+EXEMPT_PREFIXES = ("/health", "/ready", "/docs", "/redoc", "/openapi.json", "/api/admin")
+
+WAIT_WINDOW = 500
+
+
+def classify_request(method: str, path: str) -> Optional[str]:
+    """Maps a request to its route class, or None if it bypasses admission control."""
+    if method == "OPTIONS" or path == "/" or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if method == "POST" and path == "/api/appointments":
+        return "booking"
+    if path.startswith("/api/manager") or path.startswith("/api/owner"):
+        return "manager"
+    if path.startswith("/api/availability"):
+        return "browse"
+    return "default"
+
+
+class RouteClass:
+    """Configuration and live counters for one route class."""
+
+    def __init__(self, name: str, priority: int, limit: int, queue_size: int, max_wait_seconds: float):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.recent_waits = deque(maxlen=WAIT_WINDOW)
+
+    def stats(self) -> dict:
+        waits = sorted(self.recent_waits)
+        return {
+            "priority": self.priority,
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "max_wait_seconds": self.max_wait_seconds,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits) * 1000, 1) if waits else None,
+                "p95": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))] * 1000, 1) if waits else None,
+                "max": round(waits[-1] * 1000, 1) if waits else None,
+            },
+        }
+
+
+class Overloaded(Exception):
+    def __init__(self, status_code: int, retry_after: int, detail: str):
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class AdmissionController:
+    """
+    A priority scheduler for request concurrency. Requests take a slot from a
+    shared pool, subject to their class limit. When no slot is free they wait
+    in a priority queue, so booking writes and manager actions are admitted
+    ahead of availability reads. Full queues and long waits are shed.
+    """
+
+    def __init__(self, max_concurrency: int = ADMISSION_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.classes: Dict[str, RouteClass] = {}
+        for name, (priority, limit, queue_size, max_wait) in _CLASS_DEFAULTS.items():
+            prefix = f"ADMISSION_{name.upper()}"
+            self.classes[name] = RouteClass(
+                name,
+                priority,
+                _env_int(f"{prefix}_LIMIT", limit),
+                _env_int(f"{prefix}_QUEUE", queue_size),
+                _env_float(f"{prefix}_WAIT_SECONDS", max_wait),
+            )
+        self._waiters = [] # heap of (priority, sequence, route_class, future)
+        self._sequence = itertools.count()
+
+    def _has_room(self, route_class: RouteClass) -> bool:
+        return self.in_flight < self.max_concurrency and route_class.in_flight < route_class.limit
+
+    def _grant(self, route_class: RouteClass):
+        self.in_flight += 1
+        route_class.in_flight += 1
+        route_class.admitted += 1
+
+    async def acquire(self, name: str):
+        route_class = self.classes[name]
+        # Serve anyone already queued who could run now, then only take a slot
+        # directly if no waiter of equal or higher priority could use it. A
+        # waiter held back by its own class limit does not hold up other classes.
+        self._wake_waiters()
+        if self._has_room(route_class) and not any(
+            w[0] <= route_class.priority and not w[3].done() and w[2].in_flight < w[2].limit
+            for w in self._waiters
+        ):
+            self._grant(route_class)
+            route_class.recent_waits.append(0.0)
+            return
+
+        if route_class.queued >= route_class.queue_size:
+            route_class.shed_queue_full += 1
+            raise Overloaded(429, 1, f"Too many '{name}' requests queued. Please retry shortly.")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (route_class.priority, next(self._sequence), route_class, future)
+        heapq.heappush(self._waiters, entry)
+        route_class.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=route_class.max_wait_seconds)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self._remove_waiter(entry)
+                route_class.shed_timeout += 1
+                raise Overloaded(503, max(1, int(route_class.max_wait_seconds)), "Server is busy. Please retry shortly.")
+            # Granted at the same moment the wait timed out, so keep the slot
+        except asyncio.CancelledError:
+            # The client went away while queued
+            if future.done() and not future.cancelled():
+                self.release(name)
+            else:
+                future.cancel()
+                self._remove_waiter(entry)
+            raise
+        finally:
+            route_class.queued -= 1
+        route_class.recent_waits.append(time.monotonic() - started)
+
+    def _remove_waiter(self, entry):
+        try:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+        except ValueError:
+            pass
+
+    def release(self, name: str):
+        route_class = self.classes[name]
+        self.in_flight -= 1
+        route_class.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        """Hands free slots to the highest-priority waiters whose class has room."""
+        skipped = []
+        while self._waiters and self.in_flight < self.max_concurrency:
+            entry = heapq.heappop(self._waiters)
+            _, _, route_class, future = entry
+            if future.done():
+                continue # Timed out or cancelled
+            if route_class.in_flight >= route_class.limit:
+                skipped.append(entry)
+                continue
+            self._grant(route_class)
+            future.set_result(True)
+        for entry in skipped:
+            heapq.heappush(self._waiters, entry)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": ADMISSION_ENABLED,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": sum(route_class.queued for route_class in self.classes.values()),
+            "classes": {name: route_class.stats() for name, route_class in self.classes.items()},
+        }
+
+
+admission_controller = AdmissionController()
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware that applies the admission controller to every HTTP request."""
+
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED:
+            return await self.app(scope, receive, send)
+
+        name = classify_request(scope["method"], scope["path"])
+        if name is None:
+            return await self.app(scope, receive, send)
+
+        try:
+            await self.controller.acquire(name)
+        except Overloaded as overload:
+            body = json.dumps({"detail": overload.detail}).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": overload.status_code,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(overload.retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name)
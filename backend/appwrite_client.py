@@ -1,10 +1,17 @@
 # backend/appwrite_client.py
 
 import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+import appwrite.client
 from appwrite.client import Client
 from appwrite.services.databases import Databases
 
+from query_stats import fingerprint, query_stats
+
 # Load environment variables from .env file located in the parent directory
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 
@@ -13,6 +20,17 @@ APPWRITE_ENDPOINT = os.getenv("APPWRITE_ENDPOINT")
 APPWRITE_PROJECT_ID = os.getenv("APPWRITE_PROJECT_ID")
 APPWRITE_API_KEY = os.getenv("APPWRITE_API_KEY")
 APPWRITE_DATABASE_ID = os.getenv("APPWRITE_DATABASE_ID")
+# Maximum number of keep-alive connections held open to Appwrite
+APPWRITE_POOL_SIZE = int(os.getenv("APPWRITE_POOL_SIZE", "20"))
+# Limit for a single attempt of a read (enforced by resilience.py)
+APPWRITE_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("APPWRITE_ATTEMPT_TIMEOUT_SECONDS", "3"))
+# Socket timeout for every HTTP request to Appwrite (the SDK sets none). Never
+# longer than an attempt: a thread still blocked after its attempt was given
+# up on would only pile up in the executor during an outage.
+APPWRITE_HTTP_TIMEOUT_SECONDS = min(
+    float(os.getenv("APPWRITE_HTTP_TIMEOUT_SECONDS", str(APPWRITE_ATTEMPT_TIMEOUT_SECONDS))),
+    APPWRITE_ATTEMPT_TIMEOUT_SECONDS
+)
 
 # --- Appwrite Collection IDs ---
 # We will store all collection IDs here for easy access
@@ -25,17 +43,134 @@ COLLECTION_APPOINTMENTS = os.getenv("COLLECTION_ID_APPOINTMENTS")
 COLLECTION_APPOINTMENT_SERVICES = os.getenv("COLLECTION_ID_APPOINTMENT_SERVICES")
 COLLECTION_CUSTOMERS = os.getenv("COLLECTION_ID_CUSTOMERS")
 COLLECTION_MANAGERS = os.getenv("COLLECTION_ID_MANAGERS")
+COLLECTION_WAITLIST = os.getenv("COLLECTION_ID_WAITLIST")
 
 
-# Initialize the Appwrite Client
-client = Client()
-(client
-    .set_endpoint(APPWRITE_ENDPOINT)
-    .set_project(APPWRITE_PROJECT_ID)
-    .set_key(APPWRITE_API_KEY)
-)
+class _PooledRequests:
+    """
+    Stands in for the `requests` module inside the Appwrite SDK. The SDK calls
+    `requests.request(...)` directly, which opens a new connection every time;
+    routing those calls through one Session reuses pooled keep-alive connections.
+    """
+
+    def __init__(self, session: requests.Session):
+        self._session = session
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", APPWRITE_HTTP_TIMEOUT_SECONDS)
+        response = self._session.request(*args, **kwargs)
+        # Remembered per thread so the query statistics can attribute bytes to the call
+        _last_response.bytes = len(response.content)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+_last_response = threading.local()
+_init_lock = threading.Lock()
+_session = None
+_databases = None
+
+
+def init_backend() -> Databases:
+    """
+    Builds the Appwrite client and the pooled HTTP session on first use.
+    Called from the app's lifespan handler, so workers pay for it once at
+    warm-up instead of at import time.
+    """
+    global _session, _databases
+    with _init_lock:
+        if _databases is not None:
+            return _databases
+
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=APPWRITE_POOL_SIZE, pool_maxsize=APPWRITE_POOL_SIZE)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+        appwrite.client.requests = _PooledRequests(_session)
+
+        # Initialize the Appwrite Client
+        client = Client()
+        (client
+            .set_endpoint(APPWRITE_ENDPOINT)
+            .set_project(APPWRITE_PROJECT_ID)
+            .set_key(APPWRITE_API_KEY)
+        )
+
+        # Initialize the Databases service
+        _databases = Databases(client)
+
+        print("Appwrite client initialized successfully.")
+        return _databases
+
+
+def close_backend():
+    """Closes the pooled connections. Called when the app shuts down."""
+    global _session, _databases
+    with _init_lock:
+        if _session is not None:
+            _session.close()
+        appwrite.client.requests = requests
+        _session = None
+        _databases = None
+
+
+_COLLECTION_NAMES = {
+    COLLECTION_SHOPS: "shops",
+    COLLECTION_SERVICES: "services",
+    COLLECTION_BARBERS: "barbers",
+    COLLECTION_SCHEDULES: "schedules",
+    COLLECTION_SHOP_TIMINGS: "shop_timings",
+    COLLECTION_APPOINTMENTS: "appointments",
+    COLLECTION_APPOINTMENT_SERVICES: "appointment_services",
+    COLLECTION_CUSTOMERS: "customers",
+    COLLECTION_MANAGERS: "managers",
+    COLLECTION_WAITLIST: "waitlist",
+}
+
+# Databases methods that are fingerprinted, and the short operation name used for them
+_MEASURED_METHODS = {
+    "list_documents": "list",
+    "get_document": "get",
+    "create_document": "create",
+    "update_document": "update",
+}
+
+
+def _measured(name: str, method):
+    """Wraps a Databases method so every call is recorded in the query statistics."""
+    operation = _MEASURED_METHODS[name]
+
+    def call(*args, **kwargs):
+        collection_id = kwargs.get("collection_id", args[1] if len(args) > 1 else None)
+        shape = fingerprint(operation, _COLLECTION_NAMES.get(collection_id, collection_id), kwargs.get("queries"))
+        _last_response.bytes = 0
+        started = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception as e:
+            query_stats.record(shape, (time.perf_counter() - started) * 1000, error=type(e).__name__)
+            raise
+        documents = len(result.get("documents", ())) if operation == "list" else 1
+        query_stats.record(shape, (time.perf_counter() - started) * 1000, documents, getattr(_last_response, "bytes", 0))
+        return result
+
+    return call
+
+
+class _LazyDatabases:
+    """
+    A drop-in proxy for the Appwrite `Databases` service that initializes the
+    client on first use, so `from appwrite_client import databases` stays cheap.
+    Document reads and writes are fingerprinted into `query_stats` on the way.
+    """
+
+    def __getattr__(self, name):
+        method = getattr(_databases or init_backend(), name)
+        if name in _MEASURED_METHODS:
+            return _measured(name, method)
+        return method
 
-# Initialize the Databases service
-databases = Databases(client)
 
-print("Appwrite client initialized successfully.")
\ No newline at end of file
+databases = _LazyDatabases()
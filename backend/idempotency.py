@@ -0,0 +1,158 @@
+# backend/idempotency.py
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException
+
+# --- Idempotency Configuration ---
+# How long a finished request's result is replayed for a retried key
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# Upper bound on remembered keys; the oldest are dropped first
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+# Keys longer than this are rejected rather than stored
+IDEMPOTENCY_MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(payload: dict) -> str:
+    """A stable hash of a request body, so a reused key with a different body is caught."""
+    encoded = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def document_id_for(scope: str, key: str) -> str:
+    """
+    The Appwrite document ID a request with this key creates. Every worker
+    derives the same ID, so a retry that lands on another worker finds the
+    first attempt's document (or collides with it) instead of creating a
+    second one.
+    """
+    # Appwrite IDs are at most 36 characters from [a-zA-Z0-9._-]
+    return hashlib.sha256(f"{scope}:{key}".encode("utf-8")).hexdigest()[:36]
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "future", "expires_at")
+
+    def __init__(self, fingerprint: str, future: asyncio.Future):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.expires_at = None # Set once the request finishes
+
+
+class IdempotencyStore:
+    """
+    Remembers the outcome of requests sent with an Idempotency-Key header.
+
+    - A retry of a finished request gets the original result (or the original
+      4xx error) back without the handler running again.
+    - A retry that arrives while the first attempt is still running waits for
+      it and shares its outcome, instead of racing it to the backend.
+    - Server errors (5xx) are not remembered, so the client can retry them.
+    - Reusing a key with a different request body is rejected with a 422.
+
+    The store is per worker process, like the other in-memory caches. Across
+    workers, callers key the document they create with document_id_for(),
+    so Appwrite itself rejects the duplicate and the retry is answered with
+    the existing document.
+    """
+
+    def __init__(self, ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.counters = {"executed": 0, "replayed": 0, "joined_in_flight": 0, "mismatched": 0}
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = []
+        for key, entry in self._entries.items():
+            if entry.expires_at is None:
+                continue # Still running
+            if entry.expires_at > now:
+                break
+            expired.append(key)
+        for key in expired:
+            del self._entries[key]
+        while len(self._entries) > self.max_keys:
+            # Never drop a request that is still running; its waiters need it
+            key = next((key for key, entry in self._entries.items() if entry.future.done()), None)
+            if key is None:
+                break
+            del self._entries[key]
+
+    async def run(self, scope: str, key: str, fingerprint: str, operation: Callable[[], Awaitable]):
+        """
+        Runs `operation` once per (scope, key). Returns (result, replayed).
+        """
+        if not key or len(key) > IDEMPOTENCY_MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_MAX_KEY_LENGTH} characters.")
+
+        self._evict()
+        store_key = f"{scope}:{key}"
+        entry = self._entries.get(store_key)
+        if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            del self._entries[store_key]
+            entry = None
+
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                self.counters["mismatched"] += 1
+                raise HTTPException(status_code=422, detail="This Idempotency-Key was already used with a different request.")
+            self.counters["joined_in_flight" if not entry.future.done() else "replayed"] += 1
+            # shield() so a waiter that disconnects does not cancel the original
+            return await asyncio.shield(entry.future), True
+
+        future = asyncio.get_running_loop().create_future()
+        entry = self._entries[store_key] = _Entry(fingerprint, future)
+        self.counters["executed"] += 1
+        try:
+            result = await operation()
+        except HTTPException as e:
+            if e.status_code < 500:
+                # A 4xx (e.g. 409 slot taken) is the request's real answer; replay it
+                self._finish(store_key, entry)
+            else:
+                self._entries.pop(store_key, None)
+            self._settle(future, exception=e)
+            raise
+        except BaseException as e:
+            self._entries.pop(store_key, None)
+            self._settle(future, exception=e)
+            raise
+
+        self._finish(store_key, entry)
+        future.set_result(result)
+        return result, False
+
+    def _finish(self, store_key: str, entry: _Entry):
+        entry.expires_at = time.monotonic() + self.ttl_seconds
+        # Finished entries are kept in expiry order, so _evict() can stop at the first live one
+        self._entries.move_to_end(store_key)
+
+    @staticmethod
+    def _settle(future: asyncio.Future, exception: BaseException):
+        if isinstance(exception, asyncio.CancelledError):
+            future.cancel()
+            return
+        future.set_exception(exception)
+        # Mark it retrieved, so asyncio does not warn when nobody was waiting
+        future.exception()
+
+    def stats(self) -> dict:
+        in_flight = sum(1 for entry in self._entries.values() if not entry.future.done())
+        return {
+            "entries": len(self._entries),
+            "in_flight": in_flight,
+            "ttl_seconds": self.ttl_seconds,
+            "max_keys": self.max_keys,
+            "counters": dict(self.counters),
+        }
+
+
+idempotency_store = IdempotencyStore()
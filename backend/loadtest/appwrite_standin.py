@@ -0,0 +1,274 @@
+# backend/loadtest/appwrite_standin.py
+"""
+A local, in-memory stand-in for the Appwrite Databases REST API, serving a
+synthetic chain from loadtest.generator. It implements the subset this
+backend uses: list (with the Query methods below), get, create and update
+of documents. Nothing leaves the machine.
+
+Run it on its own and point a manually started app at it:
+    python -m loadtest.appwrite_standin --port 8090 --shops 20
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from loadtest.generator import COLLECTIONS, appwrite_timestamp, generate_chain
+
+DATABASE_ID = "loadtest"
+DEFAULT_LIMIT = 25 # Appwrite's default page size
+
+
+def _comparable(value):
+    """ISO timestamps are compared as instants, everything else as-is."""
+    if isinstance(value, str) and len(value) >= 19 and value[4] == "-" and value[10] == "T":
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+    return value
+
+
+def _matches(document: dict, query: dict) -> bool:
+    method = query["method"]
+    values = query.get("values") or []
+    field = document.get(query.get("attribute"))
+    if method == "equal":
+        return field in values
+    if method == "notEqual":
+        return field not in values
+    if method in ("greaterThan", "greaterThanEqual", "lessThan", "lessThanEqual"):
+        if field is None:
+            return False
+        left, right = _comparable(field), _comparable(values[0])
+        return {
+            "greaterThan": left > right,
+            "greaterThanEqual": left >= right,
+            "lessThan": left < right,
+            "lessThanEqual": left <= right,
+        }[method]
+    if method == "search":
+        return all(word.lower() in str(field or "").lower() for word in str(values[0]).split())
+    if method == "startsWith":
+        return str(field or "").lower().startswith(str(values[0]).lower())
+    if method == "contains":
+        return any(str(value).lower() in str(field or "").lower() for value in values)
+    raise ValueError(f"Query method '{method}' is not supported by the stand-in.")
+
+
+class DocumentStore:
+    """Thread-safe collections of documents, kept in insertion order like Appwrite."""
+
+    def __init__(self, chain: Dict[str, List[dict]]):
+        self._lock = threading.Lock()
+        self._collections: Dict[str, Dict[str, dict]] = {
+            name: {document["$id"]: document for document in chain.get(name, [])}
+            for name in set(COLLECTIONS) | set(chain)
+        }
+        self.requests = 0
+
+    def list(self, collection: str, queries: List[dict]) -> Optional[dict]:
+        with self._lock:
+            if collection not in self._collections:
+                return None
+            documents = list(self._collections[collection].values())
+
+        limit, offset, cursor_after = DEFAULT_LIMIT, 0, None
+        orders = []
+        for query in queries:
+            method = query["method"]
+            if method == "limit":
+                limit = query["values"][0]
+            elif method == "offset":
+                offset = query["values"][0]
+            elif method == "cursorAfter":
+                cursor_after = query["values"][0]
+            elif method in ("orderAsc", "orderDesc"):
+                orders.append((query.get("attribute") or "$id", method == "orderDesc"))
+            else:
+                documents = [document for document in documents if _matches(document, query)]
+
+        # Stable sorts applied last-to-first give a multi-key ordering
+        for attribute, descending in reversed(orders):
+            documents.sort(key=lambda document: _comparable(document.get(attribute)) or "", reverse=descending)
+
+        total = len(documents)
+        if cursor_after is not None:
+            position = next((index for index, document in enumerate(documents) if document["$id"] == cursor_after), None)
+            if position is None:
+                raise LookupError(f"Cursor document '{cursor_after}' not found.")
+            documents = documents[position + 1:]
+        return {"total": total, "documents": documents[offset:offset + limit]}
+
+    def get(self, collection: str, document_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._collections.get(collection, {}).get(document_id)
+
+    def create(self, collection: str, document_id: str, data: dict) -> Optional[dict]:
+        """The new document, None if the collection is unknown, or False if the ID is taken."""
+        if document_id == "unique()":
+            document_id = uuid.uuid4().hex[:20]
+        now = appwrite_timestamp(datetime.now(timezone.utc))
+        document = {
+            "$id": document_id,
+            "$collectionId": collection,
+            "$databaseId": DATABASE_ID,
+            "$createdAt": now,
+            "$updatedAt": now,
+            "$permissions": [],
+            **data,
+        }
+        with self._lock:
+            if collection not in self._collections:
+                return None
+            if document_id in self._collections[collection]:
+                return False
+            self._collections[collection][document_id] = document
+        return document
+
+    def update(self, collection: str, document_id: str, data: dict) -> Optional[dict]:
+        with self._lock:
+            document = self._collections.get(collection, {}).get(document_id)
+            if document is None:
+                return None
+            updated = {**document, **(data or {}), "$updatedAt": appwrite_timestamp(datetime.now(timezone.utc))}
+            self._collections[collection][document_id] = updated
+            return updated
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Routes /v1/databases/{db}/collections/{collection}/documents[/{id}]."""
+
+    protocol_version = "HTTP/1.1" # Keep-alive, like the real API
+    store: DocumentStore = None
+    latency_seconds = 0.0
+    jitter_seconds = 0.0
+
+    def log_message(self, format, *args):
+        pass # Too chatty under load
+
+    def _route(self):
+        parts = urlsplit(self.path)
+        segments = [segment for segment in parts.path.split("/") if segment]
+        # ["v1", "databases", db, "collections", collection, "documents", (id)]
+        if len(segments) < 6 or segments[:2] != ["v1", "databases"] or segments[3] != "collections" or segments[5] != "documents":
+            return None, None, parts.query
+        document_id = segments[6] if len(segments) > 6 else None
+        return segments[4], document_id, parts.query
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _not_found(self, what: str):
+        self._reply(404, {"message": f"{what} could not be found.", "code": 404, "type": "document_not_found"})
+
+    def _simulate_latency(self):
+        if self.latency_seconds or self.jitter_seconds:
+            time.sleep(self.latency_seconds + random.uniform(0, self.jitter_seconds))
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        self._simulate_latency()
+        self.store.requests += 1
+        collection, document_id, query_string = self._route()
+        if collection is None:
+            return self._not_found("Route")
+
+        if document_id is not None:
+            document = self.store.get(collection, document_id)
+            return self._reply(200, document) if document else self._not_found("Document")
+
+        queries = [json.loads(value) for key, value in parse_qsl(query_string) if key.startswith("queries[")]
+        try:
+            result = self.store.list(collection, queries)
+        except (ValueError, LookupError) as e:
+            return self._reply(400, {"message": str(e), "code": 400, "type": "general_query_invalid"})
+        return self._reply(200, result) if result is not None else self._not_found("Collection")
+
+    def do_POST(self):
+        self._simulate_latency()
+        self.store.requests += 1
+        collection, _, _ = self._route()
+        body = self._body()
+        document = self.store.create(collection, body.get("documentId", "unique()"), body.get("data") or {}) if collection else None
+        if document is False:
+            return self._reply(409, {"message": "Document with the requested ID already exists.", "code": 409, "type": "document_already_exists"})
+        return self._reply(201, document) if document else self._not_found("Collection")
+
+    def do_PATCH(self):
+        self._simulate_latency()
+        self.store.requests += 1
+        collection, document_id, _ = self._route()
+        body = self._body()
+        document = self.store.update(collection, document_id, body.get("data")) if collection and document_id else None
+        return self._reply(200, document) if document else self._not_found("Document")
+
+
+def start_standin(chain: Dict[str, List[dict]], port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+    """Starts the stand-in on a background thread and returns (server, base_url)."""
+    handler = type("BoundStandInHandler", (StandInHandler,), {
+        "store": DocumentStore(chain),
+        "latency_seconds": latency_ms / 1000,
+        "jitter_seconds": jitter_ms / 1000,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def app_environment(endpoint: str) -> Dict[str, str]:
+    """The environment variables that point the backend at the stand-in."""
+    environment = {
+        "APPWRITE_ENDPOINT": endpoint,
+        "APPWRITE_PROJECT_ID": "loadtest",
+        "APPWRITE_API_KEY": "loadtest",
+        "APPWRITE_DATABASE_ID": DATABASE_ID,
+    }
+    for name in COLLECTIONS:
+        environment[f"COLLECTION_ID_{name.upper()}"] = name
+    return environment
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--shops", type=int, default=10)
+    parser.add_argument("--barbers-per-shop", type=int, default=6)
+    parser.add_argument("--days-behind", type=int, default=60)
+    parser.add_argument("--days-ahead", type=int, default=30)
+    parser.add_argument("--density", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every response, to mimic a remote Appwrite")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    chain = generate_chain(args.shops, args.barbers_per_shop, args.days_behind, args.days_ahead, args.density, args.seed)
+    server, endpoint = start_standin(chain, args.port, args.latency_ms, args.jitter_ms)
+    print(f"Appwrite stand-in serving {len(chain['appointments'])} appointments at {endpoint}")
+    print("Start the backend with:")
+    for key, value in app_environment(endpoint).items():
+        print(f"  export {key}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
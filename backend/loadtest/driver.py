@@ -0,0 +1,312 @@
+# backend/loadtest/driver.py
+"""
+Drives mixed customer and manager traffic against the FastAPI app and
+reports throughput and latency percentiles per endpoint.
+
+By default everything runs locally and offline: a synthetic chain is served
+by the Appwrite stand-in and the app is started with uvicorn pointed at it.
+Run from the backend directory:
+    python -m loadtest.driver --shops 20 --barbers-per-shop 8 --concurrency 32 --duration 60
+
+Use --target to drive an app you started yourself (e.g. against the stand-in
+started with `python -m loadtest.appwrite_standin`).
+"""
+
+import argparse
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+from loadtest.appwrite_standin import app_environment, start_standin
+from loadtest.generator import generate_chain
+from profiling import sign_profile_request
+from utils import TARGET_TIMEZONE
+
+# Signs the admin calls; an app started here is given it, one started with --target must share it
+ADMIN_SECRET = os.getenv("PROFILING_SECRET") or secrets.token_hex(16)
+
+# (name, weight) - how often each kind of request is sent
+TRAFFIC_MIX = [
+    ("GET /api/shops", 6),
+    ("GET /api/services", 4),
+    ("GET /api/shops/{id}/barbers", 8),
+    ("GET /api/availability/dates", 12),
+    ("GET /api/availability/slots", 20),
+    ("GET /api/availability/slots (any)", 14),
+    ("GET /api/availability/assign", 4),
+    ("POST /api/appointments", 6),
+    ("GET /api/manager/appointments", 10),
+    ("PATCH /api/manager/appointments/{id}/status", 3),
+    ("GET /api/manager/financials", 3),
+    ("GET /api/manager/utilization", 2),
+    ("GET /api/owner/financials", 1),
+]
+
+
+class Workload:
+    """Builds random but valid requests from the generated chain."""
+
+    def __init__(self, chain: dict, rng: random.Random):
+        self.rng = rng
+        self.shops = chain["shops"]
+        self.services = chain["services"]
+        self.barbers_by_shop = defaultdict(list)
+        for barber in chain["barbers"]:
+            self.barbers_by_shop[barber["shop_id"]].append(barber)
+        self.booked_ids = [document["$id"] for document in chain["appointments"] if document["status"] == "Booked"]
+        self._lock = threading.Lock()
+        self.today = datetime.now(TARGET_TIMEZONE).date()
+        names, weights = zip(*TRAFFIC_MIX)
+        self.names, self.weights = list(names), list(weights)
+
+    def _date(self, days_ahead: int = 6) -> str:
+        return (self.today + timedelta(days=self.rng.randint(0, days_ahead))).strftime("%Y-%m-%d")
+
+    def _duration(self) -> int:
+        return sum(service["duration"] for service in self.rng.sample(self.services, self.rng.choice([1, 1, 2])))
+
+    def next_request(self):
+        """Returns (name, method, path, params, json_body)."""
+        rng = self.rng
+        name = rng.choices(self.names, self.weights)[0]
+        shop = rng.choice(self.shops)
+        barbers = self.barbers_by_shop[shop["$id"]]
+        barber = rng.choice(barbers)
+
+        if name == "GET /api/shops":
+            return name, "GET", "/api/shops", None, None
+        if name == "GET /api/services":
+            return name, "GET", "/api/services", None, None
+        if name == "GET /api/shops/{id}/barbers":
+            return name, "GET", f"/api/shops/{shop['$id']}/barbers", None, None
+        if name == "GET /api/availability/dates":
+            return name, "GET", "/api/availability/dates", {"shop_id": shop["$id"], "barber_id": rng.choice([barber["$id"], "any"])}, None
+        if name == "GET /api/availability/slots":
+            return name, "GET", "/api/availability/slots", {"shop_id": shop["$id"], "barber_id": barber["$id"], "date_str": self._date(), "total_duration": self._duration()}, None
+        if name == "GET /api/availability/slots (any)":
+            return name, "GET", "/api/availability/slots", {"shop_id": shop["$id"], "barber_id": "any", "date_str": self._date(), "total_duration": self._duration()}, None
+        if name == "GET /api/availability/assign":
+            start_time = f"{rng.randint(10, 19):02d}:{rng.choice(['00', '30'])}"
+            return name, "GET", "/api/availability/assign", {"shop_id": shop["$id"], "date_str": self._date(), "start_time": start_time, "total_duration": self._duration()}, None
+        if name == "POST /api/appointments":
+            chosen = rng.sample(self.services, rng.choice([1, 1, 2]))
+            start = datetime.combine(self.today + timedelta(days=rng.randint(1, 14)), datetime.min.time(), tzinfo=TARGET_TIMEZONE)
+            start += timedelta(hours=rng.randint(10, 19), minutes=rng.choice([0, 30]))
+            body = {
+                "customer_name": "Load Test",
+                "customer_phone": f"+91{rng.randint(7000000000, 9999999999)}",
+                "shop_id": shop["$id"],
+                "shop_name": shop["name"],
+                "barber_id": rng.choice([barber["$id"], "any"]),
+                "barber_name": barber["name"],
+                "start_time": start.isoformat(),
+                "service_snapshots": [
+                    {"id": service["$id"], "name": service["name"], "duration": service["duration"], "price": service["price"]}
+                    for service in chosen
+                ],
+                "tax_rate": shop["tax_rate"],
+            }
+            return name, "POST", "/api/appointments", None, body
+        if name == "GET /api/manager/appointments":
+            return name, "GET", "/api/manager/appointments", {"shop_id": shop["$id"], "date": self._date(3)}, None
+        if name == "PATCH /api/manager/appointments/{id}/status":
+            with self._lock:
+                appointment_id = self.booked_ids.pop(rng.randrange(len(self.booked_ids))) if self.booked_ids else "missing"
+            return name, "PATCH", f"/api/manager/appointments/{appointment_id}/status", None, {"status": rng.choice(["InProgress", "Completed", "Cancelled"])}
+        if name == "GET /api/manager/financials":
+            return name, "GET", "/api/manager/financials", {"shop_id": shop["$id"], "month": self.today.strftime("%Y-%m")}, None
+        if name == "GET /api/manager/utilization":
+            start_date = self.today - timedelta(days=27)
+            return name, "GET", "/api/manager/utilization", {"shop_id": shop["$id"], "start_date": start_date.strftime("%Y-%m-%d"), "end_date": self.today.strftime("%Y-%m-%d")}, None
+        return name, "GET", "/api/owner/financials", {"month": self.today.strftime("%Y-%m")}, None
+
+
+class Results:
+    """Latency samples and status codes per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, name: str, seconds: float, status):
+        with self._lock:
+            self.latencies[name].append(seconds)
+            self.statuses[name][status] += 1
+
+    def report(self, elapsed: float) -> dict:
+        def percentile(ordered, fraction):
+            return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+
+        report = {}
+        for name in sorted(self.latencies):
+            ordered = sorted(self.latencies[name])
+            report[name] = {
+                "requests": len(ordered),
+                "throughput_rps": round(len(ordered) / elapsed, 1),
+                "p50_ms": percentile(ordered, 0.50),
+                "p95_ms": percentile(ordered, 0.95),
+                "p99_ms": percentile(ordered, 0.99),
+                "max_ms": round(ordered[-1] * 1000, 1),
+                "statuses": dict(self.statuses[name]),
+            }
+        total = sum(len(samples) for samples in self.latencies.values())
+        report["TOTAL"] = {"requests": total, "throughput_rps": round(total / elapsed, 1)}
+        return report
+
+
+def drive(base_url: str, workload: Workload, concurrency: int, duration: float, warmup: float) -> dict:
+    """Runs `concurrency` closed-loop clients for `warmup` + `duration` seconds."""
+    results = Results()
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def client():
+        session = requests.Session()
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                return
+            name, method, path, params, body = workload.next_request()
+            request_started = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, params=params, json=body, timeout=30)
+                status = response.status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            if now >= measure_from:
+                results.record(name, time.perf_counter() - request_started, status)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+
+    return results.report(duration)
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_app(endpoint: str, workers: int, extra_env: dict) -> tuple:
+    """Starts the backend with uvicorn pointed at the stand-in; returns (process, base_url)."""
+    port = _free_port()
+    environment = {
+        **os.environ,
+        **app_environment(endpoint),
+        # Keep the load test's shared snapshot away from a real deployment's
+        "REFERENCE_SNAPSHOT_PATH": os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "reference.snapshot"),
+        "PROFILING_SECRET": ADMIN_SECRET,
+        **extra_env,
+    }
+    backend_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=backend_directory,
+        env=environment,
+    )
+    return process, f"http://127.0.0.1:{port}"
+
+
+def wait_until_ready(base_url: str, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(base_url + "/ready", timeout=5).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"The app at {base_url} did not become ready within {timeout:.0f}s.")
+
+
+def print_report(report: dict):
+    header = f"{'endpoint':<46}{'reqs':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  statuses"
+    print(header)
+    print("-" * len(header))
+    for name, row in report.items():
+        if name == "TOTAL":
+            continue
+        statuses = ", ".join(f"{status}x{count}" for status, count in sorted(row["statuses"].items(), key=str))
+        print(f"{name:<46}{row['requests']:>8}{row['throughput_rps']:>9}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}  {statuses}")
+    print("-" * len(header))
+    print(f"{'TOTAL':<46}{report['TOTAL']['requests']:>8}{report['TOTAL']['throughput_rps']:>9}   (latencies in ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", help="Base URL of an already running app (skips the stand-in and uvicorn)")
+    parser.add_argument("--shops", type=int, default=10)
+    parser.add_argument("--barbers-per-shop", type=int, default=6)
+    parser.add_argument("--days-behind", type=int, default=60)
+    parser.add_argument("--days-ahead", type=int, default=30)
+    parser.add_argument("--density", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent closed-loop clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before measuring")
+    parser.add_argument("--backend-latency-ms", type=float, default=0.0, help="Simulated Appwrite round-trip time")
+    parser.add_argument("--backend-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra app environment, e.g. ADMISSION_ENABLED=false")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    chain = generate_chain(args.shops, args.barbers_per_shop, args.days_behind, args.days_ahead, args.density, args.seed)
+    print(f"Generated {len(chain['shops'])} shops, {len(chain['barbers'])} barbers, {len(chain['appointments'])} appointments.")
+    workload = Workload(chain, random.Random(args.seed))
+
+    process = None
+    if args.target:
+        base_url = args.target.rstrip("/")
+    else:
+        _, endpoint = start_standin(chain, latency_ms=args.backend_latency_ms, jitter_ms=args.backend_jitter_ms)
+        extra_env = dict(item.split("=", 1) for item in args.env)
+        process, base_url = start_app(endpoint, args.workers, extra_env)
+        print(f"Appwrite stand-in at {endpoint}; app starting at {base_url} with {args.workers} worker(s)...")
+
+    try:
+        wait_until_ready(base_url)
+        print(f"Driving {args.concurrency} clients for {args.warmup:.0f}s warm-up + {args.duration:.0f}s...")
+        report = drive(base_url, workload, args.concurrency, args.duration, args.warmup)
+        # The busiest Appwrite query shapes (of whichever worker answers)
+        query_response = requests.get(
+            base_url + "/api/admin/queries", params={"limit": 10},
+            headers={"X-Profile": sign_profile_request(secret=ADMIN_SECRET)}, timeout=10
+        )
+        query_shapes = query_response.json()["shapes"] if query_response.ok else None
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print_report(report)
+    if query_shapes is None:
+        print("\nQuery shapes unavailable: the admin endpoint refused the signature (with --target, run both with the same PROFILING_SECRET).")
+    else:
+        print("\nTop Appwrite query shapes by total time:")
+        for row in query_shapes:
+            print(f"{row['calls']:>8} calls {row['total_ms']:>10.0f}ms total {row['p95_ms']:>8}ms p95 {row['avg_documents']:>7} docs  {row['shape']}")
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# backend/loadtest/generator.py
+"""
+Generates a synthetic barber chain in the shape of the Appwrite collections:
+shops, services, barbers, weekly schedules, shop timings and months of
+appointments around today.
+
+Used by the load-testing stand-in, but can also dump a dataset to JSON:
+    python -m loadtest.generator --shops 20 --barbers-per-shop 8 --out chain.json
+"""
+
+import argparse
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+from utils import TARGET_TIMEZONE
+
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+SERVICE_CATALOGUE = [
+    ("Haircut", 30, 300.0),
+    ("Beard Trim", 15, 150.0),
+    ("Haircut & Beard", 45, 400.0),
+    ("Head Shave", 30, 250.0),
+    ("Hair Colour", 60, 900.0),
+    ("Kids Haircut", 20, 200.0),
+    ("Hair Spa", 45, 700.0),
+    ("Facial", 40, 600.0),
+]
+
+FIRST_NAMES = ["Aarav", "Vihaan", "Ishaan", "Kabir", "Rohan", "Arjun", "Dev", "Neel", "Kunal", "Yash", "Sai", "Om"]
+LAST_NAMES = ["Patel", "Shah", "Mehta", "Desai", "Joshi", "Iyer", "Nair", "Rao", "Singh", "Gupta"]
+CITIES = ["Ahmedabad", "Surat", "Vadodara", "Rajkot", "Mumbai", "Pune"]
+
+# The collection names the stand-in serves and the app is pointed at
+COLLECTIONS = [
+    "shops", "services", "barbers", "schedules", "shop_timings",
+    "appointments", "appointment_services", "customers", "managers", "waitlist",
+]
+
+
+def appwrite_timestamp(moment: datetime) -> str:
+    """Formats a datetime the way Appwrite returns it (UTC, milliseconds)."""
+    return moment.astimezone(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _document(document_id: str, collection: str, data: dict, created_at: str) -> dict:
+    return {
+        "$id": document_id,
+        "$collectionId": collection,
+        "$databaseId": "loadtest",
+        "$createdAt": created_at,
+        "$updatedAt": created_at,
+        "$permissions": [],
+        **data,
+    }
+
+
+def generate_chain(
+    shops: int = 10,
+    barbers_per_shop: int = 6,
+    days_behind: int = 60,
+    days_ahead: int = 30,
+    density: float = 0.6,
+    seed: int = 7,
+) -> dict:
+    """
+    Returns {collection_name: [documents]}. `density` is the share of each
+    barber's working day that ends up booked (before cancellations).
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    created_at = appwrite_timestamp(now - timedelta(days=days_behind + 1))
+    chain = {name: [] for name in COLLECTIONS}
+
+    # --- Services (shared by every shop) ---
+    services = []
+    for position, (name, duration, price) in enumerate(SERVICE_CATALOGUE):
+        service = _document(f"svc{position:04d}", "services", {"name": name, "duration": duration, "price": price}, created_at)
+        services.append(service)
+    chain["services"] = services
+
+    today = now.astimezone(TARGET_TIMEZONE).date()
+    appointment_number = 0
+
+    for shop_number in range(shops):
+        shop_id = f"shop{shop_number:04d}"
+        shop_name = f"Loadtest Cuts {shop_number}"
+        tax_rate = 0.18
+        chain["shops"].append(_document(shop_id, "shops", {
+            "name": shop_name,
+            "address": f"{rng.randint(1, 300)} Market Road, {rng.choice(CITIES)}",
+            "phone_number": f"+91{rng.randint(7000000000, 9999999999)}",
+            "tax_rate": tax_rate,
+        }, created_at))
+
+        # --- Shop timings: open every day, a little later on Sundays ---
+        for day in DAYS_OF_WEEK:
+            chain["shop_timings"].append(_document(f"{shop_id}-{day[:3].lower()}", "shop_timings", {
+                "shop_id": shop_id,
+                "day_of_week": day,
+                "open_time": "10:00" if day == "Sunday" else "09:00",
+                "close_time": "21:00",
+                "is_closed": False,
+            }, created_at))
+
+        for barber_number in range(barbers_per_shop):
+            barber_id = f"{shop_id}-b{barber_number:03d}"
+            barber_name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            chain["barbers"].append(_document(barber_id, "barbers", {
+                "name": barber_name,
+                "contact_info": f"+91{rng.randint(7000000000, 9999999999)}",
+                "shop_id": shop_id,
+            }, created_at))
+
+            # --- Weekly schedule: one day off, staggered shifts ---
+            day_off = rng.choice(DAYS_OF_WEEK)
+            shift_start = rng.choice(["09:00", "10:00", "11:00"])
+            shift_end = rng.choice(["18:00", "19:00", "20:00", "21:00"])
+            shifts = {}
+            for day in DAYS_OF_WEEK:
+                shifts[day] = None if day == day_off else (shift_start, shift_end)
+                chain["schedules"].append(_document(f"{barber_id}-{day[:3].lower()}", "schedules", {
+                    "barber_id": barber_id,
+                    "shop_id": shop_id,
+                    "day_of_week": day,
+                    "start_time": shift_start,
+                    "end_time": shift_end,
+                    "is_day_off": day == day_off,
+                }, created_at))
+
+            # --- Appointments: walk each working day filling it to `density` ---
+            for offset in range(-days_behind, days_ahead + 1):
+                day = today + timedelta(days=offset)
+                shift = shifts[day.strftime("%A")]
+                if shift is None:
+                    continue
+                cursor = datetime.combine(day, datetime.strptime(shift[0], "%H:%M").time(), tzinfo=TARGET_TIMEZONE)
+                day_end = datetime.combine(day, datetime.strptime(shift[1], "%H:%M").time(), tzinfo=TARGET_TIMEZONE)
+
+                while True:
+                    chosen = rng.sample(services, rng.choice([1, 1, 1, 2]))
+                    duration = sum(service["duration"] for service in chosen)
+                    if cursor + timedelta(minutes=duration) > day_end:
+                        break
+                    if rng.random() < density:
+                        start, end = cursor, cursor + timedelta(minutes=duration)
+                        if offset < 0:
+                            status = "Cancelled" if rng.random() < 0.08 else "Completed"
+                        else:
+                            status = "Cancelled" if rng.random() < 0.05 else "Booked"
+                        bill_amount = sum(service["price"] for service in chosen)
+                        snapshot = [
+                            {"id": service["$id"], "name": service["name"], "duration": service["duration"], "price": service["price"]}
+                            for service in chosen
+                        ]
+                        booked_at = appwrite_timestamp(min(start - timedelta(days=rng.randint(0, 5)), now))
+                        document = _document(f"apt{appointment_number:08d}", "appointments", {
+                            "shop_id": shop_id,
+                            "shop_name": shop_name,
+                            "barber_id": barber_id,
+                            "barber_name": barber_name,
+                            "customer_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                            "customer_phone": f"+91{rng.randint(7000000000, 9999999999)}",
+                            "customer_gender": rng.choice(["male", "female", None]),
+                            "start_time": appwrite_timestamp(start),
+                            "end_time": appwrite_timestamp(end),
+                            "status": status,
+                            "is_walk_in": rng.random() < 0.15,
+                            "payment_status": status == "Completed",
+                            "bill_amount": bill_amount,
+                            "total_amount": round(bill_amount * (1 + tax_rate), 2),
+                            "tax_rate_snapshot": tax_rate,
+                            "services_snapshot": json.dumps(snapshot),
+                        }, booked_at)
+                        chain["appointments"].append(document)
+                        appointment_number += 1
+                        cursor = end
+                    else:
+                        cursor += timedelta(minutes=30)
+
+    return chain
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shops", type=int, default=10)
+    parser.add_argument("--barbers-per-shop", type=int, default=6)
+    parser.add_argument("--days-behind", type=int, default=60)
+    parser.add_argument("--days-ahead", type=int, default=30)
+    parser.add_argument("--density", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="-", help="Output file (default: stdout summary only)")
+    args = parser.parse_args()
+
+    chain = generate_chain(args.shops, args.barbers_per_shop, args.days_behind, args.days_ahead, args.density, args.seed)
+    for name, documents in chain.items():
+        print(f"{name:>22}: {len(documents)}")
+    if args.out != "-":
+        with open(args.out, "w") as output:
+            json.dump(chain, output)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
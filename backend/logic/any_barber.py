@@ -3,18 +3,9 @@
 import asyncio
 from datetime import datetime
 
-from appwrite.query import Query
-
-# Import our Appwrite database client and collection IDs
-from appwrite_client import (
-    COLLECTION_SCHEDULES,
-    COLLECTION_SHOP_TIMINGS,
-    databases, 
-    APPWRITE_DATABASE_ID, 
-    COLLECTION_BARBERS
-)
 # IMPORTANT: Import the function we want to reuse from our other logic file
 from logic.availability import calculate_barber_availability
+from reference_cache import reference_cache
 
 async def calculate_any_barber_availability(shop_id: str, date_str: str, total_duration: int):
     """
@@ -24,13 +15,7 @@ async def calculate_any_barber_availability(shop_id: str, date_str: str, total_d
     # --- PART 1: Function Definition & Initial Data Fetching ---
     try:
         # Get all barbers that belong to the specified shop
-        barbers_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_BARBERS,
-            queries=[Query.equal("shop_id", [shop_id])]
-        )
-        
-        all_barbers = barbers_response['documents']
+        all_barbers = reference_cache.barbers(shop_id=shop_id)
         
         if not all_barbers:
             print(f"No barbers found for shop_id: {shop_id}")
@@ -93,32 +78,15 @@ async def check_any_barber_date_availability(shop_id: str, date_str: str):
         day_of_week = selected_date.strftime("%A")
 
         # 1. Check if the shop is even open on that day of the week
-        shop_timing_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_SHOP_TIMINGS,
-            queries=[
-                Query.equal("shop_id", [shop_id]),
-                Query.equal("day_of_week", [day_of_week]),
-                Query.limit(1)
-            ]
-        )
-        if not shop_timing_response['documents'] or shop_timing_response['documents'][0]['is_closed']:
+        shop_timings = reference_cache.shop_timings(shop_id, day_of_week=day_of_week)
+        if not shop_timings or shop_timings[0]['is_closed']:
             return False # Shop is closed, so no availability
 
         # 2. Check if at least ONE barber is scheduled to work and is NOT on a day off
-        barber_schedule_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_SCHEDULES,
-            queries=[
-                Query.equal("shop_id", [shop_id]), # We can add shop_id to schedules for faster lookup
-                Query.equal("day_of_week", [day_of_week]),
-                Query.equal("is_day_off", [False]),
-                Query.limit(1) # We only need to find one, not all of them
-            ]
-        )
+        barber_schedules = reference_cache.schedules(shop_id=shop_id, day_of_week=day_of_week)
         
-        # If the document list is not empty, it means we found at least one working barber
-        if barber_schedule_response['documents']:
+        # If any schedule is a working day, it means we found at least one working barber
+        if any(not schedule['is_day_off'] for schedule in barber_schedules):
             return True # Date is available!
         
         return False # No working barbers found
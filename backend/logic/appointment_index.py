@@ -0,0 +1,267 @@
+# backend/logic/appointment_index.py
+
+import asyncio
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from appwrite.query import Query
+
+from appwrite_client import databases, APPWRITE_DATABASE_ID, COLLECTION_APPOINTMENTS
+from logic.appointment_record import AppointmentRecord, FreeBlock, free_blocks_in_minutes, minute_of
+from utils import TARGET_TIMEZONE
+
+# --- Index Configuration ---
+# The index covers a rolling window of days around "today" in the shop's timezone.
+INDEX_DAYS_BEHIND = int(os.getenv("APPOINTMENT_INDEX_DAYS_BEHIND", "1"))
+INDEX_DAYS_AHEAD = int(os.getenv("APPOINTMENT_INDEX_DAYS_AHEAD", "60"))
+# How often the index is rebuilt from Appwrite, which stays the source of truth.
+INDEX_RECONCILE_SECONDS = int(os.getenv("APPOINTMENT_INDEX_RECONCILE_SECONDS", "300"))
+# When only ONE worker writes appointments, the index sees every booking and can
+# answer double-booking checks on its own. With several workers it cannot, so by
+# default a "free" answer is still confirmed against Appwrite.
+INDEX_AUTHORITATIVE = os.getenv("APPOINTMENT_INDEX_AUTHORITATIVE", "false").lower() == "true"
+
+WARM_PAGE_SIZE = 100
+
+class _BarberTimeline:
+    """Sorted parallel arrays holding one barber's non-cancelled appointments."""
+
+    __slots__ = ("starts", "records", "max_length")
+
+    def __init__(self):
+        self.starts: List[int] = []                 # Sorted start minutes, used for bisecting
+        self.records: List[AppointmentRecord] = []  # Same order as `starts`
+        self.max_length = 0                         # Longest appointment ever seen for this barber, in minutes
+
+    def add(self, record: AppointmentRecord):
+        position = bisect_right(self.starts, record.start)
+        self.records.insert(position, record)
+        self.starts.insert(position, record.start)
+        self.max_length = max(self.max_length, record.end - record.start)
+
+    def remove(self, record: AppointmentRecord):
+        position = bisect_left(self.starts, record.start)
+        while position < len(self.starts) and self.starts[position] == record.start:
+            if self.records[position] is record:
+                del self.records[position]
+                del self.starts[position]
+                return
+            position += 1
+
+    def overlapping(self, start: int, end: int) -> List[AppointmentRecord]:
+        # Any appointment overlapping [start, end) must begin before `end` and no
+        # earlier than `start - max_length`, so two bisects bound the candidates.
+        low = bisect_left(self.starts, start - self.max_length)
+        high = bisect_left(self.starts, end)
+        return [record for record in self.records[low:high] if record.end > start]
+
+    def starting_between(self, start: int, end: int) -> List[AppointmentRecord]:
+        low = bisect_left(self.starts, start)
+        high = bisect_left(self.starts, end)
+        return self.records[low:high]
+
+
+class AppointmentIndex:
+    """
+    An in-memory interval index of non-cancelled appointments per barber,
+    covering a rolling window (by default yesterday through 60 days out).
+    It is warmed from Appwrite at startup, kept current by the appointment
+    write paths and periodically reconciled against Appwrite.
+
+    Appointments are held as compact AppointmentRecords (integer minutes),
+    converted once when a document enters the index. Queries take naive
+    local datetimes, like the rest of the logic modules.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._timelines: Dict[str, _BarberTimeline] = {}
+        self._by_id: Dict[str, AppointmentRecord] = {}
+        self._window_start: Optional[datetime] = None
+        self._window_end: Optional[datetime] = None
+        self._window_start_minute = 0
+        self._window_end_minute = 0
+        self._is_warm = False
+        self._rebuilding = False
+        self._writes_during_rebuild: List[dict] = []
+        self.last_reconciled_at: Optional[datetime] = None
+        # Change counters, so derived data (e.g. precomputed free intervals) can tell it is stale
+        self._generation = 0
+        self._versions: Dict[str, int] = {}
+
+    # --- Window & State ---
+
+    @property
+    def is_warm(self) -> bool:
+        return self._is_warm
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        """True if the index is warm and [start, end) lies inside its window."""
+        with self._lock:
+            return (
+                self._is_warm
+                and self._window_start <= start
+                and end <= self._window_end
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "is_warm": self._is_warm,
+                "barbers": len(self._timelines),
+                "appointments": len(self._by_id),
+                "window_start": self._window_start.isoformat() if self._window_start else None,
+                "window_end": self._window_end.isoformat() if self._window_end else None,
+                "last_reconciled_at": self.last_reconciled_at.isoformat() if self.last_reconciled_at else None,
+            }
+
+    def barber_version(self, barber_id: str) -> Tuple[int, int]:
+        """Changes whenever the barber's appointments change or the index is rebuilt."""
+        with self._lock:
+            return self._generation, self._versions.get(barber_id, 0)
+
+    # --- Queries (answered locally) ---
+
+    def overlapping(self, barber_id: str, start: datetime, end: datetime) -> List[AppointmentRecord]:
+        """Returns the barber's appointments overlapping [start, end), sorted by start."""
+        with self._lock:
+            timeline = self._timelines.get(barber_id)
+            return timeline.overlapping(minute_of(start), minute_of(end, round_up=True)) if timeline else []
+
+    def has_overlap(self, barber_id: str, start: datetime, end: datetime) -> bool:
+        return bool(self.overlapping(barber_id, start, end))
+
+    def appointments_starting_between(self, barber_id: str, start: datetime, end: datetime) -> List[AppointmentRecord]:
+        """Returns the barber's appointments whose start falls in [start, end), sorted by start."""
+        with self._lock:
+            timeline = self._timelines.get(barber_id)
+            return timeline.starting_between(minute_of(start), minute_of(end)) if timeline else []
+
+    def free_blocks(self, barber_id: str, work_start: datetime, work_end: datetime) -> List[FreeBlock]:
+        """Returns the gaps between the barber's appointments inside [work_start, work_end)."""
+        start_minute, end_minute = minute_of(work_start), minute_of(work_end)
+        with self._lock:
+            timeline = self._timelines.get(barber_id)
+            records = timeline.overlapping(start_minute, end_minute) if timeline else []
+        return free_blocks_in_minutes(start_minute, end_minute, records)
+
+    def _set_window(self, window_start: datetime, window_end: datetime):
+        self._window_start = window_start
+        self._window_end = window_end
+        self._window_start_minute = minute_of(window_start)
+        self._window_end_minute = minute_of(window_end)
+
+    # --- Write Path ---
+
+    def apply(self, document: dict):
+        """
+        Applies a created or updated appointment document to the index.
+        Cancelled appointments (and ones outside the window) are dropped.
+        """
+        with self._lock:
+            if self._rebuilding:
+                # Replayed on top of the fresh snapshot once the rebuild swaps in.
+                self._writes_during_rebuild.append(document)
+            self._apply_locked(document)
+
+    def _apply_locked(self, document: dict):
+        appointment_id = document['$id']
+        previous = self._by_id.pop(appointment_id, None)
+        if previous:
+            self._timelines[previous.barber_id].remove(previous)
+            self._versions[previous.barber_id] = self._versions.get(previous.barber_id, 0) + 1
+
+        if document.get('status') == "Cancelled":
+            return
+
+        record = AppointmentRecord.from_document(document)
+        if self._window_start is None or record.end <= self._window_start_minute or record.start >= self._window_end_minute:
+            return
+
+        self._timelines.setdefault(record.barber_id, _BarberTimeline()).add(record)
+        self._by_id[appointment_id] = record
+        self._versions[record.barber_id] = self._versions.get(record.barber_id, 0) + 1
+
+    # --- Warm-up & Reconciliation (Appwrite is the source of truth) ---
+
+    def rebuild(self):
+        """
+        Loads every non-cancelled appointment in the window from Appwrite and
+        swaps it in as the new index. Safe to call while the index is serving.
+        """
+        today_local = datetime.now(timezone.utc).astimezone(TARGET_TIMEZONE).replace(tzinfo=None)
+        window_start = datetime.combine(today_local.date() - timedelta(days=INDEX_DAYS_BEHIND), datetime.min.time())
+        window_end = datetime.combine(today_local.date() + timedelta(days=INDEX_DAYS_AHEAD + 1), datetime.min.time())
+
+        window_start_utc = window_start.replace(tzinfo=TARGET_TIMEZONE).astimezone(timezone.utc)
+        window_end_utc = window_end.replace(tzinfo=TARGET_TIMEZONE).astimezone(timezone.utc)
+
+        with self._lock:
+            self._rebuilding = True
+            self._writes_during_rebuild = []
+
+        try:
+            documents = []
+            last_id = None
+            while True:
+                queries = [
+                    Query.not_equal("status", ["Cancelled"]),
+                    Query.greater_than_equal("start_time", window_start_utc.isoformat()),
+                    Query.less_than("start_time", window_end_utc.isoformat()),
+                    Query.limit(WARM_PAGE_SIZE),
+                ]
+                if last_id:
+                    queries.append(Query.cursor_after(last_id))
+
+                response = databases.list_documents(
+                    database_id=APPWRITE_DATABASE_ID,
+                    collection_id=COLLECTION_APPOINTMENTS,
+                    queries=queries
+                )
+                page = response['documents']
+                documents.extend(page)
+
+                if len(page) < WARM_PAGE_SIZE:
+                    break
+                last_id = page[-1]['$id']
+        except Exception:
+            with self._lock:
+                self._rebuilding = False
+                self._writes_during_rebuild = []
+            raise
+
+        # Build the fresh index off to the side, then swap it in.
+        fresh = AppointmentIndex()
+        fresh._set_window(window_start, window_end)
+        for document in documents:
+            fresh._apply_locked(document)
+
+        with self._lock:
+            self._timelines = fresh._timelines
+            self._by_id = fresh._by_id
+            self._set_window(window_start, window_end)
+            self._generation += 1
+            for document in self._writes_during_rebuild:
+                self._apply_locked(document)
+            self._writes_during_rebuild = []
+            self._rebuilding = False
+            self._is_warm = True
+            self.last_reconciled_at = datetime.now(timezone.utc)
+
+        print(f"Appointment index rebuilt with {len(self._by_id)} appointments for {len(self._timelines)} barbers.")
+
+    async def run_reconciler(self):
+        """Background loop that periodically rebuilds the index from Appwrite."""
+        while True:
+            await asyncio.sleep(INDEX_RECONCILE_SECONDS)
+            try:
+                await asyncio.to_thread(self.rebuild)
+            except Exception as e:
+                print(f"Appointment index reconciliation failed: {e}")
+
+
+# A single, process-wide index shared by the routers and logic modules.
+appointment_index = AppointmentIndex()
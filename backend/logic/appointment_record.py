@@ -0,0 +1,147 @@
+# backend/logic/appointment_record.py
+
+import math
+import sys
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils import TIMEZONE_OFFSET
+
+# Appointment times are held as whole minutes since 1970-01-01 00:00 in
+# TARGET_TIMEZONE, so comparisons and day arithmetic are plain integer math.
+LOCAL_EPOCH = datetime(1970, 1, 1)
+MINUTES_PER_DAY = 24 * 60
+_OFFSET_SECONDS = TIMEZONE_OFFSET.total_seconds()
+_ONE_MINUTE = timedelta(minutes=1)
+
+STATUSES = ("Booked", "InProgress", "Completed", "Cancelled")
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+BOOKED, IN_PROGRESS, COMPLETED, CANCELLED = range(len(STATUSES))
+UNKNOWN_STATUS = len(STATUSES)
+
+FreeBlock = Tuple[datetime, datetime]
+
+
+# --- Minute Conversions ---
+
+def iso_to_minute(iso_string: str, round_up: bool = False) -> int:
+    """An Appwrite (UTC) timestamp as local minutes since LOCAL_EPOCH."""
+    seconds = datetime.fromisoformat(iso_string.replace('Z', '+00:00')).timestamp() + _OFFSET_SECONDS
+    return math.ceil(seconds / 60) if round_up else math.floor(seconds / 60)
+
+
+def minute_of(moment: datetime, round_up: bool = False) -> int:
+    """A naive local datetime (as returned by parse_iso_to_datetime) as minutes since LOCAL_EPOCH."""
+    if round_up:
+        return -((LOCAL_EPOCH - moment) // _ONE_MINUTE)
+    return (moment - LOCAL_EPOCH) // _ONE_MINUTE
+
+
+@lru_cache(maxsize=65536)
+def minute_to_datetime(minute: int) -> datetime:
+    # Cached: free blocks keep landing on the same few thousand boundaries,
+    # and handing out shared (immutable) datetimes is cheaper than building new ones
+    return LOCAL_EPOCH + _ONE_MINUTE * minute
+
+
+def day_number(day: date) -> int:
+    """The day a date falls on, in the same numbering as `minute // MINUTES_PER_DAY`."""
+    return (day - LOCAL_EPOCH.date()).days
+
+
+# --- Records ---
+
+class AppointmentRecord:
+    """
+    The fields the scheduling and reporting logic actually reads, converted
+    once from an Appwrite document. Start times are rounded down and end
+    times up to the minute, so a record never looks shorter than the booking.
+    """
+
+    __slots__ = ("appointment_id", "barber_id", "start", "end", "status", "bill_amount", "total_amount")
+
+    def __init__(self, appointment_id: str, barber_id: str, start: int, end: int, status: int, bill_amount: float = 0.0, total_amount: float = 0.0):
+        self.appointment_id = appointment_id
+        self.barber_id = barber_id
+        self.start = start
+        self.end = end
+        self.status = status
+        self.bill_amount = bill_amount
+        self.total_amount = total_amount
+
+    @classmethod
+    def from_document(cls, document: dict) -> "AppointmentRecord":
+        return cls(
+            document['$id'],
+            # Every appointment of a barber shares one copy of the ID string
+            sys.intern(document.get('barber_id') or ""),
+            iso_to_minute(document['start_time']),
+            iso_to_minute(document['end_time'], round_up=True),
+            STATUS_CODES.get(document.get('status'), UNKNOWN_STATUS),
+            float(document.get('bill_amount') or 0),
+            float(document.get('total_amount') or 0),
+        )
+
+    @property
+    def start_datetime(self) -> datetime:
+        return minute_to_datetime(self.start)
+
+    @property
+    def end_datetime(self) -> datetime:
+        return minute_to_datetime(self.end)
+
+    @property
+    def status_name(self) -> str:
+        return STATUSES[self.status] if self.status < len(STATUSES) else ""
+
+    def __repr__(self) -> str:
+        return f"AppointmentRecord({self.appointment_id!r}, {self.barber_id!r}, {self.start_datetime}, {self.end_datetime}, {self.status_name!r})"
+
+
+def free_blocks_between(work_start: datetime, work_end: datetime, records: Iterable[AppointmentRecord]) -> List[FreeBlock]:
+    """
+    The gaps the records (sorted by start) leave inside [work_start, work_end).
+    The sweep runs on integer minutes; only the resulting blocks are turned
+    back into datetimes.
+    """
+    return free_blocks_in_minutes(minute_of(work_start), minute_of(work_end), records)
+
+
+def free_blocks_in_minutes(start_minute: int, end_minute: int, records: Iterable[AppointmentRecord]) -> List[FreeBlock]:
+    free_blocks = []
+    last_free_start = start_minute
+    for record in records:
+        if record.start > last_free_start:
+            free_blocks.append((minute_to_datetime(last_free_start), minute_to_datetime(min(record.start, end_minute))))
+        last_free_start = max(last_free_start, record.end)
+    if end_minute > last_free_start:
+        free_blocks.append((minute_to_datetime(last_free_start), minute_to_datetime(end_minute)))
+    return [(start, end) for start, end in free_blocks if end > start]
+
+
+class AppointmentColumns:
+    """
+    A columnar (NumPy) copy of many records for bulk aggregation. `barber`
+    holds each record's position in `barber_ids` (-1 if it is not listed).
+    """
+
+    __slots__ = ("barber_ids", "barber", "start", "end", "status", "bill_amount", "total_amount")
+
+    def __init__(self, records: Sequence[AppointmentRecord], barber_ids: Optional[List[str]] = None):
+        if barber_ids is None:
+            barber_ids = list(dict.fromkeys(record.barber_id for record in records))
+        positions = {barber_id: position for position, barber_id in enumerate(barber_ids)}
+        count = len(records)
+        self.barber_ids = barber_ids
+        self.barber = np.fromiter((positions.get(record.barber_id, -1) for record in records), dtype=np.int32, count=count)
+        self.start = np.fromiter((record.start for record in records), dtype=np.int64, count=count)
+        self.end = np.fromiter((record.end for record in records), dtype=np.int64, count=count)
+        self.status = np.fromiter((record.status for record in records), dtype=np.int8, count=count)
+        self.bill_amount = np.fromiter((record.bill_amount for record in records), dtype=np.float64, count=count)
+        self.total_amount = np.fromiter((record.total_amount for record in records), dtype=np.float64, count=count)
+
+    def __len__(self) -> int:
+        return len(self.start)
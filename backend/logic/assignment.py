@@ -0,0 +1,180 @@
+# backend/logic/assignment.py
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from appwrite.query import Query
+
+from appwrite_client import APPWRITE_DATABASE_ID, COLLECTION_APPOINTMENTS
+from utils import TARGET_TIMEZONE
+from logic.appointment_index import appointment_index
+from logic.appointment_record import AppointmentRecord, FreeBlock, free_blocks_between
+from logic.precompute import availability_precompute, working_window
+from reference_cache import reference_cache
+from resilience import backend
+
+# Idle gaps shorter than this cannot hold any service on the menu, so they are
+# "dead" chair time. Placements that leave fewer dead minutes score better.
+MIN_USEFUL_GAP_MINUTES = int(os.getenv("MIN_USEFUL_GAP_MINUTES", "30"))
+
+
+# --- Pure Helpers (no database access, shared with the benchmark) ---
+
+def score_placement(
+    block: FreeBlock,
+    slot_start: datetime,
+    slot_end: datetime,
+    min_useful_minutes: int = MIN_USEFUL_GAP_MINUTES
+) -> Optional[Tuple[int, int]]:
+    """
+    Scores placing [slot_start, slot_end) inside a free block. Lower is better.
+    Returns None if the slot does not fit in the block.
+
+    The score is (dead_minutes, block_minutes):
+      - dead_minutes: idle fragments left before/after the booking that are too
+        short to ever be booked.
+      - block_minutes: the size of the block used, so that among equally clean
+        placements the tightest fit wins and long blocks stay free for long services.
+    """
+    block_start, block_end = block
+    if slot_start < block_start or slot_end > block_end:
+        return None
+
+    dead_minutes = 0
+    for gap in (slot_start - block_start, block_end - slot_end):
+        gap_minutes = int(gap.total_seconds() // 60)
+        if 0 < gap_minutes < min_useful_minutes:
+            dead_minutes += gap_minutes
+
+    block_minutes = int((block_end - block_start).total_seconds() // 60)
+    return dead_minutes, block_minutes
+
+
+def choose_barber(
+    free_blocks_by_barber: Dict[str, List[FreeBlock]],
+    slot_start: datetime,
+    total_duration: int,
+    min_useful_minutes: int = MIN_USEFUL_GAP_MINUTES
+) -> Optional[Tuple[str, Tuple[int, int]]]:
+    """
+    Picks the barber whose free time is fragmented the least by the booking.
+    Returns (barber_id, score) or None if no barber can take the slot.
+    """
+    slot_end = slot_start + timedelta(minutes=total_duration)
+    best = None
+    for barber_id, free_blocks in free_blocks_by_barber.items():
+        for block in free_blocks:
+            score = score_placement(block, slot_start, slot_end, min_useful_minutes)
+            if score is None:
+                continue
+            # barber_id breaks ties so the choice is deterministic
+            candidate = (score, barber_id)
+            if best is None or candidate < best:
+                best = candidate
+            break # Free blocks never overlap, so at most one can contain the slot
+    if best is None:
+        return None
+    score, barber_id = best
+    return barber_id, score
+
+
+# --- Data Loading ---
+
+async def load_shop_free_blocks(shop_id: str, date_str: str) -> Tuple[Dict[str, List[FreeBlock]], Dict[str, dict]]:
+    """
+    Loads the free blocks of every working barber in a shop for one date.
+    Barbers, schedules and shop timing come from the reference cache, and
+    bookings from the appointment index (or one batched appointment query).
+    Returns (free_blocks_by_barber, barbers_by_id).
+    """
+    selected_date = datetime.strptime(date_str, "%Y-%m-%d")
+    day_of_week = selected_date.strftime("%A")
+
+    barbers_by_id = {barber['$id']: barber for barber in reference_cache.barbers(shop_id=shop_id)}
+    if not barbers_by_id:
+        return {}, {}
+
+    # Fast path: every barber's free blocks were computed ahead of time
+    precomputed = {barber_id: availability_precompute.lookup(shop_id, barber_id, date_str) for barber_id in barbers_by_id}
+    if all(blocks is not None for blocks in precomputed.values()):
+        return {barber_id: blocks for barber_id, blocks in precomputed.items() if blocks}, barbers_by_id
+
+    shop_timings = reference_cache.shop_timings(shop_id, day_of_week=day_of_week)
+    if not shop_timings or shop_timings[0]['is_closed']:
+        return {}, barbers_by_id
+    shop_timing = shop_timings[0]
+
+    # Each barber's actual working window is their shift clipped to shop hours
+    working_windows = {}
+    for schedule in reference_cache.schedules(day_of_week=day_of_week):
+        if schedule['barber_id'] not in barbers_by_id:
+            continue
+        window = working_window(schedule, shop_timing, selected_date.date())
+        if window is not None:
+            working_windows[schedule['barber_id']] = window
+
+    if not working_windows:
+        return {}, barbers_by_id
+
+    day_start = selected_date
+    day_end = day_start + timedelta(days=1)
+
+    free_blocks_by_barber = {}
+    if appointment_index.covers(day_start, day_end):
+        for barber_id, (work_start, work_end) in working_windows.items():
+            free_blocks_by_barber[barber_id] = appointment_index.free_blocks(barber_id, work_start, work_end)
+    else:
+        day_start_utc = day_start.replace(tzinfo=TARGET_TIMEZONE).astimezone(timezone.utc)
+        day_end_utc = day_end.replace(tzinfo=TARGET_TIMEZONE).astimezone(timezone.utc)
+        appointments_response = await backend.list_documents(
+            database_id=APPWRITE_DATABASE_ID,
+            collection_id=COLLECTION_APPOINTMENTS,
+            queries=[
+                Query.equal("barber_id", list(working_windows)),
+                Query.greater_than_equal("start_time", day_start_utc.isoformat()),
+                Query.less_than("start_time", day_end_utc.isoformat()),
+                Query.not_equal("status", ["Cancelled"]),
+                Query.order_asc("start_time"),
+                Query.limit(5000)
+            ]
+        )
+        records_by_barber: Dict[str, List[AppointmentRecord]] = {}
+        for appointment in appointments_response['documents']:
+            record = AppointmentRecord.from_document(appointment)
+            records_by_barber.setdefault(record.barber_id, []).append(record)
+        for barber_id, (work_start, work_end) in working_windows.items():
+            free_blocks_by_barber[barber_id] = free_blocks_between(
+                work_start, work_end, records_by_barber.get(barber_id, [])
+            )
+
+    return free_blocks_by_barber, barbers_by_id
+
+
+# --- Assignment Engine ---
+
+async def assign_any_barber(shop_id: str, date_str: str, start_time: str, total_duration: int) -> Optional[dict]:
+    """
+    For an "Any Barber" booking at a chosen slot, picks the barber whose day is
+    left least fragmented. Returns the chosen barber together with the slot,
+    or None if nobody can take it.
+    """
+    slot_start = datetime.strptime(f"{date_str} {start_time}", "%Y-%m-%d %H:%M")
+    free_blocks_by_barber, barbers_by_id = await load_shop_free_blocks(shop_id, date_str)
+
+    choice = choose_barber(free_blocks_by_barber, slot_start, total_duration)
+    if choice is None:
+        return None
+
+    barber_id, (dead_minutes, _) = choice
+    barber = barbers_by_id.get(barber_id, {})
+    print(f"Assigned barber {barber_id} for {date_str} {start_time} leaving {dead_minutes} dead minutes.")
+
+    return {
+        "barber_id": barber_id,
+        "barber_name": barber.get('name', ""),
+        "date": date_str,
+        "start_time": start_time,
+        "end_time": (slot_start + timedelta(minutes=total_duration)).strftime("%H:%M"),
+        "idle_fragment_minutes": dead_minutes
+    }
@@ -4,19 +4,48 @@ import asyncio
 from datetime import datetime, time, timedelta
 from typing import List
 from appwrite.query import Query
+from fastapi import HTTPException
 # Import our Appwrite database client and collection IDs
 from appwrite_client import (
-    databases, 
     APPWRITE_DATABASE_ID, 
     COLLECTION_SCHEDULES, 
     COLLECTION_SHOP_TIMINGS,
     COLLECTION_APPOINTMENTS
 
 )
-from utils import parse_iso_to_datetime
+from logic.appointment_index import appointment_index
+from logic.appointment_record import AppointmentRecord, free_blocks_between
+from logic.precompute import availability_precompute, working_window
+from reference_cache import reference_cache
+from resilience import backend
 
 
 
+def slots_from_free_blocks(free_blocks, total_duration: int) -> List[str]:
+    """Turns free time blocks into the "HH:MM" start times (every 30 minutes) where the appointment fits."""
+    available_slots = []
+    slot_interval = timedelta(minutes=30)
+    appointment_duration = timedelta(minutes=total_duration)
+
+    # Iterate through each large free time window we found
+    for start_block, end_block in free_blocks:
+        
+        # Start checking for slots from the beginning of the free block
+        current_slot_start = start_block
+
+        # Keep adding slots as long as a full appointment can fit in the remaining block
+        while current_slot_start + appointment_duration <= end_block:
+            
+            # Add the current slot start time to our list of results
+            # We format it as a "HH:MM" string for the frontend
+            available_slots.append(current_slot_start.strftime("%H:%M"))
+
+            # Move to the next potential slot time (30 minutes later)
+            current_slot_start += slot_interval
+
+    return available_slots
+
+
 async def calculate_barber_availability(barber_id: str, shop_id: str, date_str: str, total_duration: int):
     """
     Calculates the available time slots for a single barber on a specific date.
@@ -31,37 +60,26 @@ async def calculate_barber_availability(barber_id: str, shop_id: str, date_str:
         # If the date format is wrong, return no availability
         return []
 
+    # Fast path: the free intervals were computed ahead of time in the background
+    precomputed_blocks = availability_precompute.lookup(shop_id, barber_id, date_str)
+    if precomputed_blocks is not None:
+        return slots_from_free_blocks(precomputed_blocks, total_duration)
+
     # --- PART 2: Fetch Barber's Schedule & Shop Timings ---
     try:
-        # Fetch the barber's schedule for that day of the week
-        schedule_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_SCHEDULES,
-            queries=[
-                Query.equal("barber_id", [barber_id]),
-                Query.equal("day_of_week", [day_of_week]),
-                Query.limit(1) # We only expect one schedule per barber per day
-            ]
-        )
+        # Look up the barber's schedule for that day of the week (from the reference cache)
+        barber_schedules = reference_cache.schedules(barber_id=barber_id, day_of_week=day_of_week)
         
-        # Fetch the shop's timings for that day of the week
-        shop_timing_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_SHOP_TIMINGS,
-            queries=[
-                Query.equal("shop_id", [shop_id]),
-                Query.equal("day_of_week", [day_of_week]),
-                Query.limit(1)
-            ]
-        )
+        # Look up the shop's timings for that day of the week
+        shop_timings = reference_cache.shop_timings(shop_id, day_of_week=day_of_week)
 
         # Early Exit Check 1: No schedule or timing found
-        if not schedule_response['documents'] or not shop_timing_response['documents']:
+        if not barber_schedules or not shop_timings:
             print(f"No schedule or shop timing found for {day_of_week}.")
             return []
 
-        barber_schedule = schedule_response['documents'][0]
-        shop_timing = shop_timing_response['documents'][0]
+        barber_schedule = barber_schedules[0]
+        shop_timing = shop_timings[0]
         
         # Early Exit Check 2: Barber has day off or shop is closed
         if barber_schedule['is_day_off'] or shop_timing['is_closed']:
@@ -70,98 +88,56 @@ async def calculate_barber_availability(barber_id: str, shop_id: str, date_str:
         
          # --- PART 3: Determine the Barber's Actual Working Hours ---
 
-        # Convert time strings from Appwrite (e.g., "09:00") to Python time objects
-        barber_start_time = datetime.strptime(barber_schedule['start_time'], "%H:%M").time()
-        barber_end_time = datetime.strptime(barber_schedule['end_time'], "%H:%M").time()
-        shop_open_time = datetime.strptime(shop_timing['open_time'], "%H:%M").time()
-        shop_close_time = datetime.strptime(shop_timing['close_time'], "%H:%M").time()
+        # The actual hours are the barber's shift clipped to the shop's hours:
+        # the LATEST of the two starts and the EARLIEST of the two ends
+        working_hours = working_window(barber_schedule, shop_timing, selected_date.date())
 
-        # The actual start time is the LATEST of when the shop opens and when the barber starts
-        actual_start_time = max(barber_start_time, shop_open_time)
-        
-        # The actual end time is the EARLIEST of when the shop closes and when the barber ends
-        actual_end_time = min(barber_end_time, shop_close_time)
-
-        # Combine the date with the calculated times to get full datetime objects
-        # This will be crucial for comparing with appointments later
-        working_start_dt = selected_date.replace(hour=actual_start_time.hour, minute=actual_start_time.minute)
-        working_end_dt = selected_date.replace(hour=actual_end_time.hour, minute=actual_end_time.minute)
-        
         # Another check: if for some reason the start time is after or at the end time, something is wrong
-        if working_start_dt >= working_end_dt:
+        if working_hours is None:
             print("Calculated working hours are invalid (start is after end).")
             return []
+        working_start_dt, working_end_dt = working_hours
 
         # --- PART 4: Fetch Existing Appointments for the Day (CORRECTED) ---
 
         day_start = selected_date.replace(hour=0, minute=0, second=0)
         day_end = day_start + timedelta(days=1)
-        
-        day_start_iso = day_start.isoformat()
-        day_end_iso = day_end.isoformat()
-
-        # Build the queries with the CORRECT method names
-        appointment_queries = [
-            Query.equal("barber_id", [barber_id]),
-            Query.greater_than_equal("start_time", day_start_iso), # CORRECTED
-            Query.less_than("start_time", day_end_iso),           # CORRECTED
-            Query.not_equal("status", ["Cancelled"]),             # CORRECTED
-            Query.order_asc("start_time")                         # CORRECTED
-        ]
-        
-        appointments_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_APPOINTMENTS,
-            queries=appointment_queries
-        )
-        
-        appointments = appointments_response['documents']
-        
-         # --- PART 5: Calculate the "Free Time" Blocks (The Core Algorithm) ---
-
-        free_blocks = []
-        # Start tracking free time from the beginning of the barber's actual working day.
-        last_free_time_start = working_start_dt
 
-        # Loop through each sorted appointment to find the gaps
-        for appointment in appointments:
-            appointment_start = parse_iso_to_datetime(appointment['start_time'])
-            appointment_end = parse_iso_to_datetime(appointment['end_time'])
+        if appointment_index.covers(day_start, day_end):
+            # Fast path: the in-memory index answers this without touching Appwrite.
+            appointments = appointment_index.appointments_starting_between(barber_id, day_start, day_end)
+        else:
+            day_start_iso = day_start.isoformat()
+            day_end_iso = day_end.isoformat()
 
-            # The free block is the time between our last known free point and the start of this appointment.
-            # Only add the block if there is a positive amount of free time.
-            if appointment_start > last_free_time_start:
-                free_blocks.append((last_free_time_start, appointment_start))
+            # Build the queries with the CORRECT method names
+            appointment_queries = [
+                Query.equal("barber_id", [barber_id]),
+                Query.greater_than_equal("start_time", day_start_iso), # CORRECTED
+                Query.less_than("start_time", day_end_iso),           # CORRECTED
+                Query.not_equal("status", ["Cancelled"]),             # CORRECTED
+                Query.order_asc("start_time")                         # CORRECTED
+            ]
+            
+            appointments_response = await backend.list_documents(
+                database_id=APPWRITE_DATABASE_ID,
+                collection_id=COLLECTION_APPOINTMENTS,
+                queries=appointment_queries
+            )
             
-            # Update our tracker to the end of the current appointment, as this is the start of the next potential free block.
-            last_free_time_start = appointment_end
+            # Converted once to compact records; the free-time sweep reads nothing else
+            appointments = [AppointmentRecord.from_document(appointment) for appointment in appointments_response['documents']]
         
-        # After the loop, calculate the final free block from the end of the last appointment to the end of the day.
-        # Again, only add it if there is a positive amount of time.
-        if working_end_dt > last_free_time_start:
-            free_blocks.append((last_free_time_start, working_end_dt))
+         # --- PART 5: Calculate the "Free Time" Blocks (The Core Algorithm) ---
+
+        # Walk the sorted appointments in integer minutes: each gap between the last
+        # known free point and the next appointment's start is a free block, and
+        # whatever is left after the last appointment runs to the end of the day.
+        free_blocks = free_blocks_between(working_start_dt, working_end_dt, appointments)
             
           # --- PART 6: Generate 30-Minute Bookable Slots from Free Blocks ---
 
-        available_slots = []
-        slot_interval = timedelta(minutes=30)
-        appointment_duration = timedelta(minutes=total_duration)
-
-        # Iterate through each large free time window we found
-        for start_block, end_block in free_blocks:
-            
-            # Start checking for slots from the beginning of the free block
-            current_slot_start = start_block
-
-            # Keep adding slots as long as a full appointment can fit in the remaining block
-            while current_slot_start + appointment_duration <= end_block:
-                
-                # Add the current slot start time to our list of results
-                # We format it as a "HH:MM" string for the frontend
-                available_slots.append(current_slot_start.strftime("%H:%M"))
-
-                # Move to the next potential slot time (30 minutes later)
-                current_slot_start += slot_interval
+        available_slots = slots_from_free_blocks(free_blocks, total_duration)
         
         print(f"Calculated Actual Working Hours: {working_start_dt.time()} - {working_end_dt.time()}")
         print(f"Found {len(appointments)} active appointments for the day.")
@@ -170,6 +146,8 @@ async def calculate_barber_availability(barber_id: str, shop_id: str, date_str:
 
         return available_slots
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"An error occurred: {e}")
         return []
@@ -188,14 +166,14 @@ async def is_barber_working_on_date(barber_id: str, shop_id: str, date_str: str)
         # --- FIX: Run these synchronous calls directly ---
         
         # Query for the barber's schedule for that day
-        schedule_response = databases.list_documents(
+        schedule_response = await backend.list_documents(
             database_id=APPWRITE_DATABASE_ID,
             collection_id=COLLECTION_SCHEDULES,
             queries=[Query.equal("barber_id", [barber_id]), Query.equal("day_of_week", [day_of_week]), Query.limit(1)]
         )
 
         # Query for the shop's timing for that day
-        shop_timing_response = databases.list_documents(
+        shop_timing_response = await backend.list_documents(
             database_id=APPWRITE_DATABASE_ID,
             collection_id=COLLECTION_SHOP_TIMINGS,
             queries=[Query.equal("shop_id", [shop_id]), Query.equal("day_of_week", [day_of_week]), Query.limit(1)]
@@ -226,29 +204,16 @@ async def is_any_barber_working_on_date(shop_id: str, date_str: str) -> bool:
         day_of_week = selected_date.strftime("%A")
 
         # 1. First, check if the shop is even open.
-        shop_timing_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_SHOP_TIMINGS,
-            queries=[Query.equal("shop_id", [shop_id]), Query.equal("day_of_week", [day_of_week]), Query.limit(1)]
-        )
-        if not shop_timing_response['documents'] or shop_timing_response['documents'][0]['is_closed']:
+        shop_timings = reference_cache.shop_timings(shop_id, day_of_week=day_of_week)
+        if not shop_timings or shop_timings[0]['is_closed']:
             return False
 
         # 2. Then, check if at least ONE barber is working.
         # REMINDER: This requires 'shop_id' attribute in the Schedules collection.
-        barber_schedule_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_SCHEDULES,
-            queries=[
-                Query.equal("shop_id", [shop_id]),
-                Query.equal("day_of_week", [day_of_week]),
-                Query.equal("is_day_off", [False]),
-                Query.limit(1)
-            ]
-        )
+        barber_schedules = reference_cache.schedules(shop_id=shop_id, day_of_week=day_of_week)
         
-        # If we found at least one document, a barber is working.
-        return bool(barber_schedule_response['documents'])
+        # If we found at least one schedule without a day off, a barber is working.
+        return any(not schedule['is_day_off'] for schedule in barber_schedules)
     except Exception:
         return False
     
@@ -260,26 +225,18 @@ async def get_weekly_available_dates_for_barber(
 ) -> List[str]:
     """
     Efficiently finds available dates for a single barber over a given
-    period by fetching the entire weekly schedule in just two DB calls.
+    period using the cached weekly schedule and shop timings.
     """
     try:
-        # 1. Fetch the barber's entire weekly schedule in one call
-        schedule_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_SCHEDULES,
-            queries=[Query.equal("barber_id", [barber_id])]
-        )
+        # 1. Look up the barber's entire weekly schedule
+        barber_schedules = reference_cache.schedules(barber_id=barber_id)
         
-        # 2. Fetch the shop's entire weekly timings in one call
-        shop_timing_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_SHOP_TIMINGS,
-            queries=[Query.equal("shop_id", [shop_id])]
-        )
+        # 2. Look up the shop's entire weekly timings
+        shop_timings = reference_cache.shop_timings(shop_id)
 
         # 3. Convert the lists into efficient lookup dictionaries (hash maps)
-        schedule_map = {item['day_of_week']: item for item in schedule_response['documents']}
-        shop_timing_map = {item['day_of_week']: item for item in shop_timing_response['documents']}
+        schedule_map = {item['day_of_week']: item for item in barber_schedules}
+        shop_timing_map = {item['day_of_week']: item for item in shop_timings}
 
         # 4. Loop through the dates in Python (very fast) and check availability
         available_dates = []
@@ -298,6 +255,8 @@ async def get_weekly_available_dates_for_barber(
         
         return available_dates
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_weekly_available_dates_for_barber: {e}")
         return []
@@ -0,0 +1,143 @@
+# backend/logic/booking.py
+
+import json
+from datetime import timedelta, timezone
+from typing import Optional
+
+from appwrite.exception import AppwriteException
+from appwrite.query import Query
+from fastapi import HTTPException
+
+import schemas
+from appwrite_client import APPWRITE_DATABASE_ID, COLLECTION_APPOINTMENTS
+from logic.appointment_index import appointment_index, INDEX_AUTHORITATIVE
+from logic.assignment import assign_any_barber
+from resilience import backend
+from utils import TARGET_TIMEZONE
+
+
+async def find_appointment(document_id: str) -> Optional[dict]:
+    """The appointment with this ID, read from Appwrite, or None if there is none."""
+    try:
+        return await backend.get_document(
+            database_id=APPWRITE_DATABASE_ID,
+            collection_id=COLLECTION_APPOINTMENTS,
+            document_id=document_id,
+            allow_stale=False
+        )
+    except AppwriteException as e:
+        if e.code == 404:
+            return None
+        raise
+
+
+async def book_appointment(appointment_data: schemas.AppointmentCreate, document_id: str = 'unique()') -> dict:
+    """
+    Runs the double-booking check and creates the appointment document.
+    Shared by the booking endpoint and the waitlist backfill. Raises a 409
+    HTTPException if the slot is taken, or if a fixed `document_id` already
+    exists. The caller's request is not modified.
+    """
+    # --- Part 1: Calculate Totals from Incoming Data ---
+    # No database calls needed here anymore!
+    total_duration = sum(service.duration for service in appointment_data.service_snapshots)
+    bill_amount = sum(service.price for service in appointment_data.service_snapshots)
+    total_amount = bill_amount * (1 + appointment_data.tax_rate)
+    
+    appointment_end_time = appointment_data.start_time + timedelta(minutes=total_duration)
+
+    try:
+        # --- Part 1b: Resolve "Any Barber" to a concrete barber ---
+        if appointment_data.barber_id.lower() == "any":
+            assignment = await assign_any_barber(
+                shop_id=appointment_data.shop_id,
+                date_str=appointment_data.start_time.strftime("%Y-%m-%d"),
+                start_time=appointment_data.start_time.strftime("%H:%M"),
+                total_duration=total_duration
+            )
+            if assignment is None:
+                raise HTTPException(status_code=409, detail="This time slot has just been booked. Please select another slot.")
+            appointment_data = appointment_data.model_copy(update={
+                "barber_id": assignment['barber_id'],
+                "barber_name": assignment['barber_name'],
+            })
+
+        # --- Part 2: Final Double-Booking Check (No change in logic) ---
+        local_start_check = appointment_data.start_time.replace(tzinfo=TARGET_TIMEZONE)
+        local_end_check = appointment_end_time.replace(tzinfo=TARGET_TIMEZONE)
+        utc_start_check = local_start_check.astimezone(timezone.utc)
+        utc_end_check = local_end_check.astimezone(timezone.utc)
+
+        # The in-memory index rejects known clashes without a round-trip. A "free"
+        # answer is only trusted on its own when this worker sees every booking.
+        naive_start = appointment_data.start_time.replace(tzinfo=None)
+        naive_end = appointment_end_time.replace(tzinfo=None)
+        index_covers_slot = appointment_index.covers(naive_start, naive_end)
+
+        if index_covers_slot and appointment_index.has_overlap(appointment_data.barber_id, naive_start, naive_end):
+            raise HTTPException(status_code=409, detail="This time slot has just been booked. Please select another slot.")
+
+        if not (index_covers_slot and INDEX_AUTHORITATIVE):
+            overlapping_appointments_response = await backend.list_documents(
+                database_id=APPWRITE_DATABASE_ID,
+                collection_id=COLLECTION_APPOINTMENTS,
+                queries=[
+                    Query.equal("barber_id", [appointment_data.barber_id]),
+                    Query.not_equal("status", "Cancelled"),
+                    Query.less_than("start_time", utc_end_check.isoformat()),
+                    Query.greater_than("end_time", utc_start_check.isoformat())
+                ],
+                allow_stale=False # A stale "no overlap" would let a double booking through
+            )
+
+            if overlapping_appointments_response['documents']:
+                raise HTTPException(status_code=409, detail="This time slot has just been booked. Please select another slot.")
+        
+        # --- Part 3: Create the Single, Denormalized Appointment Document ---
+        
+        # Convert the list of service snapshots to a JSON string for storage
+        services_json_string = json.dumps([s.dict() for s in appointment_data.service_snapshots])
+        
+        new_appointment_data = {
+            "shop_id": appointment_data.shop_id,
+            "shop_name": appointment_data.shop_name,
+            "barber_id": appointment_data.barber_id,
+            "barber_name": appointment_data.barber_name,
+            "customer_name": appointment_data.customer_name,
+            "customer_phone": appointment_data.customer_phone,
+            "customer_gender": appointment_data.customer_gender,
+            "start_time": utc_start_check.isoformat(),
+            "end_time": utc_end_check.isoformat(),
+            "status": appointment_data.status,
+            "is_walk_in": appointment_data.is_walk_in,
+            "payment_status": False,
+            "bill_amount": bill_amount,
+            "total_amount": round(total_amount, 2),
+            "tax_rate_snapshot": appointment_data.tax_rate,
+            "services_snapshot": services_json_string
+        }
+
+        try:
+            created_document = await backend.create_document(
+                database_id=APPWRITE_DATABASE_ID,
+                collection_id=COLLECTION_APPOINTMENTS,
+                document_id=document_id,
+                data=new_appointment_data
+            )
+        except AppwriteException as e:
+            if e.code == 409:
+                raise HTTPException(status_code=409, detail="This appointment has already been booked.")
+            raise
+
+        # Keep the in-memory index current with the new booking
+        appointment_index.apply(created_document)
+
+        print(f"Successfully created denormalized appointment with ID: {created_document['$id']}")
+        
+        return created_document # FastAPI will validate this against AppointmentDetails
+
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"An error occurred during booking: {e}")
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
@@ -0,0 +1,62 @@
+# backend/logic/cross_shop.py
+
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+from logic.availability import calculate_barber_availability
+from reference_cache import reference_cache
+from utils import TARGET_TIMEZONE
+
+# How many per-barber availability computations may run at once, across
+# every cross-shop search in this worker
+CROSS_SHOP_CONCURRENCY = int(os.getenv("CROSS_SHOP_CONCURRENCY", "16"))
+
+_budget = asyncio.Semaphore(CROSS_SHOP_CONCURRENCY)
+
+
+async def _barber_slots(barber_id: str, shop_id: str, date_str: str, total_duration: int) -> List[str]:
+    async with _budget:
+        return await calculate_barber_availability(barber_id, shop_id, date_str, total_duration)
+
+
+async def _shop_availability(shop: dict, date_str: str, total_duration: int, not_before: Optional[str]) -> dict:
+    """The "any barber" slots of one shop: the union of its barbers' slots."""
+    barbers = reference_cache.barbers(shop_id=shop['$id'])
+    per_barber = await asyncio.gather(*(
+        _barber_slots(barber['$id'], shop['$id'], date_str, total_duration) for barber in barbers
+    ))
+    slots, barber_ids = set(), []
+    for barber, barber_slots in zip(barbers, per_barber):
+        if not_before is not None:
+            barber_slots = [slot for slot in barber_slots if slot > not_before]
+        if barber_slots:
+            slots.update(barber_slots)
+            barber_ids.append(barber['$id'])
+    return {"shop_id": shop['$id'], "shop_name": shop['name'], "slots": sorted(slots), "barber_ids": barber_ids}
+
+
+async def calculate_cross_shop_availability(date_str: str, total_duration: int, shop_ids: Optional[List[str]] = None) -> dict:
+    """
+    "Any barber" availability for every shop (or the given ones) on a date,
+    in shop order. All shops' barbers are computed concurrently, but no more
+    than CROSS_SHOP_CONCURRENCY at a time per worker, so one chain-wide
+    search cannot flood the backend. Slots that have already started today
+    are left out.
+    """
+    shops = reference_cache.shops()
+    if shop_ids is not None:
+        by_id = {shop['$id']: shop for shop in shops}
+        unknown = [shop_id for shop_id in shop_ids if shop_id not in by_id]
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"Shop(s) not found: {', '.join(unknown)}")
+        shops = [by_id[shop_id] for shop_id in dict.fromkeys(shop_ids)]
+
+    now_local = datetime.now(timezone.utc).astimezone(TARGET_TIMEZONE)
+    not_before = now_local.strftime("%H:%M") if date_str == now_local.strftime("%Y-%m-%d") else None
+
+    results = await asyncio.gather(*(_shop_availability(shop, date_str, total_duration, not_before) for shop in shops))
+    return {"date": date_str, "total_duration": total_duration, "shops": results}
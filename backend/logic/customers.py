@@ -0,0 +1,204 @@
+# backend/logic/customers.py
+
+import asyncio
+import json
+import os
+import re
+import weakref
+from typing import List, Optional
+
+from appwrite.exception import AppwriteException
+
+from appwrite_client import APPWRITE_DATABASE_ID, COLLECTION_CUSTOMERS
+from logic.next_available import find_next_available
+from reference_cache import reference_cache
+from resilience import backend
+
+# Local numbers (10 digits, optionally with a leading 0) get this country code
+CUSTOMER_DEFAULT_COUNTRY_CODE = os.getenv("CUSTOMER_DEFAULT_COUNTRY_CODE", "91")
+# How many days ahead the rebook endpoint looks for the first open date
+REBOOK_SEARCH_DAYS = int(os.getenv("REBOOK_SEARCH_DAYS", "14"))
+
+
+def normalize_phone(phone: str) -> Optional[str]:
+    """
+    Reduces a phone number to its digits with the country code, e.g.
+    "+91 98765-43210", "098765 43210" and "9876543210" all become
+    "919876543210". Returns None if it cannot be a phone number.
+    The result doubles as the customer's document ID.
+    """
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) == 11 and digits.startswith("0"):
+        digits = digits[1:]
+    if len(digits) == 10:
+        digits = CUSTOMER_DEFAULT_COUNTRY_CODE + digits
+    if not 8 <= len(digits) <= 15: # E.164 allows at most 15 digits
+        return None
+    return digits
+
+
+def _is_not_found(error: Exception) -> bool:
+    return isinstance(error, AppwriteException) and error.code == 404
+
+
+def _is_conflict(error: Exception) -> bool:
+    return isinstance(error, AppwriteException) and error.code == 409
+
+
+class CustomerProfiles:
+    """
+    One document per customer in COLLECTION_CUSTOMERS, keyed by normalized
+    phone number, holding what the last booking looked like (shop, barber,
+    services) and a visit count. Reading a profile is a single get by ID,
+    instead of scanning appointments by `customer_phone`.
+
+    Profiles are updated after each booking. Updates for the same phone are
+    serialized within a worker; across workers the visit count may
+    occasionally miss a concurrent increment, which is fine for a suggestion.
+    """
+
+    def __init__(self):
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _lock(self, customer_id: str) -> asyncio.Lock:
+        lock = self._locks.get(customer_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[customer_id] = lock
+        return lock
+
+    async def get(self, phone: str) -> Optional[dict]:
+        customer_id = normalize_phone(phone)
+        if customer_id is None:
+            return None
+        try:
+            return await backend.get_document(
+                database_id=APPWRITE_DATABASE_ID,
+                collection_id=COLLECTION_CUSTOMERS,
+                document_id=customer_id
+            )
+        except Exception as e:
+            if _is_not_found(e):
+                return None
+            raise
+
+    async def record_visit(self, appointment: dict):
+        """
+        Folds a newly created appointment into its customer's profile. Runs
+        after the booking response is sent, so failures are logged, not raised.
+        """
+        customer_id = normalize_phone(appointment.get('customer_phone', ""))
+        if customer_id is None:
+            return
+
+        try:
+            services = json.loads(appointment.get('services_snapshot') or "[]")
+        except (TypeError, ValueError):
+            services = []
+        data = {
+            "phone": customer_id,
+            "name": appointment.get('customer_name', ""),
+            "gender": appointment.get('customer_gender'),
+            "last_shop_id": appointment.get('shop_id'),
+            "last_shop_name": appointment.get('shop_name'),
+            "last_barber_id": appointment.get('barber_id'),
+            "last_barber_name": appointment.get('barber_name'),
+            "last_services": json.dumps(services),
+            "last_duration": sum(service.get('duration', 0) or 0 for service in services),
+            "last_visit_at": appointment.get('start_time'),
+        }
+
+        try:
+            async with self._lock(customer_id):
+                profile = await self.get(customer_id)
+                if profile is not None:
+                    data["visit_count"] = (profile.get('visit_count') or 0) + 1
+                    await backend.update_document(
+                        database_id=APPWRITE_DATABASE_ID,
+                        collection_id=COLLECTION_CUSTOMERS,
+                        document_id=customer_id,
+                        data=data
+                    )
+                    return
+                try:
+                    await backend.create_document(
+                        database_id=APPWRITE_DATABASE_ID,
+                        collection_id=COLLECTION_CUSTOMERS,
+                        document_id=customer_id,
+                        data={**data, "visit_count": 1}
+                    )
+                except Exception as e:
+                    if not _is_conflict(e):
+                        raise
+                    # Another worker created the profile first; count this visit on top
+                    profile = await self.get(customer_id)
+                    data["visit_count"] = ((profile or {}).get('visit_count') or 0) + 1
+                    await backend.update_document(
+                        database_id=APPWRITE_DATABASE_ID,
+                        collection_id=COLLECTION_CUSTOMERS,
+                        document_id=customer_id,
+                        data=data
+                    )
+        except Exception as e:
+            print(f"Could not update the customer profile for appointment {appointment.get('$id')}: {e}")
+
+
+customer_profiles = CustomerProfiles()
+
+
+def _current_services(snapshots: List[dict]) -> List[dict]:
+    """The customer's last services, with duration and price taken from today's menu where possible."""
+    menu = {service['$id']: service for service in reference_cache.services()}
+    services = []
+    for snapshot in snapshots:
+        current = menu.get(snapshot.get('id'))
+        if current is not None:
+            services.append({"id": current['$id'], "name": current['name'], "duration": current['duration'], "price": current['price']})
+        else:
+            services.append(snapshot)
+    return services
+
+
+async def build_rebook_suggestion(phone: str) -> Optional[dict]:
+    """
+    Looks up the customer's profile and finds the next opening (within
+    REBOOK_SEARCH_DAYS) in which their last barber can fit their last
+    services. If that barber has left the shop, any barber in
+    the same shop is offered instead. Returns None if there is no profile.
+    """
+    profile = await customer_profiles.get(phone)
+    if profile is None:
+        return None
+
+    shop_id = profile.get('last_shop_id')
+    barber_id = profile.get('last_barber_id')
+    barber_name = profile.get('last_barber_name')
+    if not any(barber['$id'] == barber_id for barber in reference_cache.barbers(shop_id=shop_id)):
+        barber_id, barber_name = "any", "Any Barber"
+
+    try:
+        services = _current_services(json.loads(profile.get('last_services') or "[]"))
+    except (TypeError, ValueError):
+        services = []
+    total_duration = sum(service.get('duration', 0) or 0 for service in services) or profile.get('last_duration') or 0
+
+    suggestion = {
+        "customer_name": profile.get('name', ""),
+        "phone": profile['$id'],
+        "visit_count": profile.get('visit_count') or 0,
+        "last_visit_at": profile.get('last_visit_at'),
+        "shop_id": shop_id,
+        "shop_name": profile.get('last_shop_name'),
+        "barber_id": barber_id,
+        "barber_name": barber_name,
+        "services": services,
+        "total_duration": total_duration,
+        "date": None,
+        "slots": [],
+    }
+    if not shop_id or total_duration <= 0:
+        return suggestion
+
+    opening = await find_next_available(shop_id, barber_id, total_duration, REBOOK_SEARCH_DAYS)
+    suggestion.update(date=opening["date"], slots=opening["slots"])
+    return suggestion
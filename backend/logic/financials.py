@@ -0,0 +1,205 @@
+# backend/logic/financials.py
+
+import calendar
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+from appwrite.query import Query
+from fastapi import HTTPException
+
+from appwrite_client import APPWRITE_DATABASE_ID, COLLECTION_APPOINTMENTS
+from logic.appointment_record import AppointmentColumns, AppointmentRecord, MINUTES_PER_DAY, day_number
+from resilience import backend
+from utils import TARGET_TIMEZONE
+
+PAGE_SIZE = 100
+
+
+def resolve_period(date: Optional[str], month: Optional[str]) -> Tuple[datetime, datetime, str]:
+    """
+    Turns the 'date' / 'month' query parameters into a local [start, end) range
+    and a human-readable period label. Defaults to today in TARGET_TIMEZONE.
+    """
+    if date and month:
+        raise HTTPException(status_code=400, detail="Please provide either a 'date' or a 'month', not both.")
+
+    if date:
+        try:
+            target_date = datetime.strptime(date, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Please use YYYY-MM-DD.")
+        period_start = datetime.combine(target_date, datetime.min.time()).replace(tzinfo=TARGET_TIMEZONE)
+        return period_start, period_start + timedelta(days=1), f"for date {date}"
+
+    if month:
+        try:
+            year, month_num = map(int, month.split('-'))
+            period_start = datetime(year, month_num, 1, tzinfo=TARGET_TIMEZONE)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid month format. Please use YYYY-MM.")
+        _, last_day = calendar.monthrange(year, month_num)
+        return period_start, period_start + timedelta(days=last_day), f"for month {month}"
+
+    target_date = datetime.now(TARGET_TIMEZONE).date()
+    period_start = datetime.combine(target_date, datetime.min.time()).replace(tzinfo=TARGET_TIMEZONE)
+    return period_start, period_start + timedelta(days=1), f"for today, {target_date.strftime('%Y-%m-%d')}"
+
+
+async def stream_documents(collection_id: str, queries: List[str]) -> AsyncIterator[List[dict]]:
+    """
+    Pages through the documents matching `queries` with cursors, yielding one
+    page at a time so callers can aggregate without holding the whole result.
+    """
+    last_id = None
+    while True:
+        page_queries = queries + [Query.limit(PAGE_SIZE)]
+        if last_id:
+            page_queries.append(Query.cursor_after(last_id))
+
+        response = await backend.list_documents(
+            database_id=APPWRITE_DATABASE_ID,
+            collection_id=collection_id,
+            queries=page_queries
+        )
+        page = response['documents']
+        if page:
+            yield page
+
+        if len(page) < PAGE_SIZE:
+            return
+        last_id = page[-1]['$id']
+
+
+def stream_appointments(queries: List[str]) -> AsyncIterator[List[dict]]:
+    """Pages through the appointments matching `queries`, one page at a time."""
+    return stream_documents(COLLECTION_APPOINTMENTS, queries)
+
+
+def completed_in_period_queries(period_start: datetime, period_end: datetime, shop_id: Optional[str] = None) -> List[str]:
+    """Builds the queries for Completed appointments starting inside a local period."""
+    queries = [
+        Query.equal("status", ["Completed"]), # Only count completed appointments
+        Query.greater_than_equal("start_time", period_start.astimezone(timezone.utc).isoformat()),
+        Query.less_than("start_time", period_end.astimezone(timezone.utc).isoformat()),
+    ]
+    if shop_id:
+        queries.append(Query.equal("shop_id", [shop_id]))
+    return queries
+
+
+def _totals(revenue_after_tax: float, revenue_before_tax: float, appointments: int) -> dict:
+    return {
+        "revenue_before_tax": round(float(revenue_before_tax), 2),
+        "tax_collected": round(float(revenue_after_tax - revenue_before_tax), 2),
+        "revenue_after_tax": round(float(revenue_after_tax), 2),
+        "appointments": int(appointments),
+    }
+
+
+class FinancialAccumulator:
+    """
+    Aggregates Completed appointments in a single pass into the period total,
+    a per-day series (in TARGET_TIMEZONE) and per-barber totals. Appointments
+    are converted to compact records and summed column-wise with NumPy one
+    page at a time, so memory stays flat however long the period is.
+    """
+
+    def __init__(self, period_start: datetime, period_end: datetime):
+        self.period_start = period_start
+        self.period_end = period_end
+        self.first_day = day_number(period_start.date())
+        self.day_count = max((period_end.date() - period_start.date()).days, 0)
+        self.barber_ids: List[str] = []
+        self.barber_names: Dict[str, str] = {}
+        # Rows: revenue after tax, revenue before tax, appointments
+        self.by_day = np.zeros((3, self.day_count))
+        self.by_barber = np.zeros((3, 0))
+        self._pending: List[AppointmentRecord] = []
+
+    def add(self, appointment: dict):
+        record = AppointmentRecord.from_document(appointment)
+        if record.barber_id not in self.barber_names:
+            self.barber_names[record.barber_id] = appointment.get('barber_name', "")
+            self.barber_ids.append(record.barber_id)
+        self._pending.append(record)
+        if len(self._pending) >= PAGE_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        columns = AppointmentColumns(self._pending, self.barber_ids)
+        self._pending = []
+        weights = (columns.total_amount, columns.bill_amount, None)
+
+        day_positions = columns.start // MINUTES_PER_DAY - self.first_day
+        in_period = (day_positions >= 0) & (day_positions < self.day_count)
+        for row, weight in enumerate(weights):
+            self.by_day[row] += np.bincount(
+                day_positions[in_period],
+                weights=None if weight is None else weight[in_period],
+                minlength=self.day_count
+            )
+
+        barber_count = len(self.barber_ids)
+        if self.by_barber.shape[1] < barber_count:
+            self.by_barber = np.pad(self.by_barber, ((0, 0), (0, barber_count - self.by_barber.shape[1])))
+        for row, weight in enumerate(weights):
+            self.by_barber[row] += np.bincount(columns.barber, weights=weight, minlength=barber_count)
+
+    def report(self, filter_period: str) -> dict:
+        self._flush()
+
+        # Every day of the period appears in the series, zero-filled, so charts need no gap handling
+        daily_series = [
+            {
+                "date": (self.period_start.date() + timedelta(days=offset)).strftime("%Y-%m-%d"),
+                **_totals(*self.by_day[:, offset]),
+            }
+            for offset in range(self.day_count)
+        ]
+
+        barber_breakdown = sorted(
+            (
+                {"barber_id": barber_id, "barber_name": self.barber_names.get(barber_id, ""), **_totals(*self.by_barber[:, position])}
+                for position, barber_id in enumerate(self.barber_ids)
+            ),
+            key=lambda row: row["revenue_after_tax"],
+            reverse=True
+        )
+
+        # Every barber is counted, so the barber columns also hold the period totals
+        totals = _totals(*self.by_barber.sum(axis=1))
+        return {
+            "total_revenue_before_tax": totals["revenue_before_tax"],
+            "total_tax_collected": totals["tax_collected"],
+            "total_revenue_after_tax": totals["revenue_after_tax"],
+            "total_appointments": totals["appointments"],
+            "filter_period": filter_period,
+            "daily_series": daily_series,
+            "barber_breakdown": barber_breakdown,
+        }
+
+
+async def aggregate_completed(period_start: datetime, period_end: datetime, shop_id: Optional[str], *accumulators):
+    """
+    Streams the period's Completed appointments once and feeds each one to
+    every accumulator (any object with an `add(appointment)` method).
+    """
+    async for page in stream_appointments(completed_in_period_queries(period_start, period_end, shop_id)):
+        for appointment in page:
+            for accumulator in accumulators:
+                accumulator.add(appointment)
+
+
+async def build_financials_report(
+    period_start: datetime,
+    period_end: datetime,
+    filter_period: str,
+    shop_id: Optional[str] = None
+) -> dict:
+    """Streams the period's Completed appointments once and returns the full report."""
+    accumulator = FinancialAccumulator(period_start, period_end)
+    await aggregate_completed(period_start, period_end, shop_id, accumulator)
+    return accumulator.report(filter_period)
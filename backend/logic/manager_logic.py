@@ -1,17 +1,26 @@
 # backend/logic/manager_logic.py
 
 from datetime import datetime, time, timedelta, timezone
+from typing import List, Optional, Tuple
 from appwrite.query import Query
+from fastapi import HTTPException
 import asyncio
+import os
 
 from appwrite_client import (
-    databases,
     APPWRITE_DATABASE_ID,
-    COLLECTION_BARBERS,
-    COLLECTION_SCHEDULES,
     COLLECTION_APPOINTMENTS
 )
-from utils import TARGET_TIMEZONE, parse_iso_to_datetime
+from utils import TARGET_TIMEZONE
+from logic.appointment_index import appointment_index
+from logic.appointment_record import AppointmentRecord, IN_PROGRESS, minute_of
+from logic.waitlist import waitlist
+from reference_cache import reference_cache
+from resilience import backend
+from logic.financials import stream_appointments
+
+# How many status updates a bulk request sends to Appwrite at once
+BULK_STATUS_CONCURRENCY = int(os.getenv("BULK_STATUS_CONCURRENCY", "8"))
 
 async def find_available_barbers_for_walk_in(shop_id: str, duration: int):
     """
@@ -28,103 +37,163 @@ async def find_available_barbers_for_walk_in(shop_id: str, duration: int):
     try:
         # 1. Find all barbers in the shop who are supposed to be working NOW
         #    AND whose shift extends beyond the required walk-in end time.
-        on_shift_barbers_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_SCHEDULES,
-            queries=[
-                Query.equal("shop_id", [shop_id]),
-                Query.equal("day_of_week", [day_of_week]),
-                Query.equal("is_day_off", [False]),
-                Query.less_than_equal("start_time", current_time_str), # Started by now
-                Query.greater_than_equal("end_time", required_end_time_local.strftime("%H:%M")) # Ends after required_end_time
-            ]
-        )
-        
-        on_shift_barbers_schedules = on_shift_barbers_response['documents']
+        required_end_time_str = required_end_time_local.strftime("%H:%M")
+        on_shift_barbers_schedules = [
+            schedule for schedule in reference_cache.schedules(shop_id=shop_id, day_of_week=day_of_week)
+            if not schedule['is_day_off']
+            and schedule['start_time'] <= current_time_str # Started by now
+            and schedule['end_time'] >= required_end_time_str # Ends after required_end_time
+        ]
         if not on_shift_barbers_schedules:
             return [] # No barbers are on shift to handle this appointment
 
         # Extract the IDs of barbers who are on shift
         on_shift_barber_ids = [schedule['barber_id'] for schedule in on_shift_barbers_schedules]
 
-        # --- NEW LOGIC ADDITION: Check for current 'InProgress' appointments ---
-        # Query for all 'InProgress' appointments for these barbers that overlap 'now_local'
-        current_inprogress_appts_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_APPOINTMENTS,
-            queries=[
-                Query.equal("barber_id", on_shift_barber_ids),
-                Query.equal("status", ["InProgress"]),
-                # Appointment started before or at required_end_time
-                Query.less_than_equal("start_time", required_end_time_local.astimezone(timezone.utc).isoformat()),
-                # Appointment ends after or at now_utc
-                Query.greater_than_equal("end_time", now_utc.isoformat())
-            ]
-        )
+        now_naive = now_local.replace(tzinfo=None)
+        required_end_naive = required_end_time_local.replace(tzinfo=None)
+
+        if appointment_index.covers(now_naive, required_end_naive):
+            # --- FAST PATH: Answer both busy checks from the in-memory index ---
+            # A barber is blocked if an InProgress appointment overlaps the walk-in window,
+            # or if a not-yet-started appointment begins before the walk-in would end.
+            now_minute = minute_of(now_naive)
+            available_barber_ids = []
+            for barber_id in on_shift_barber_ids:
+                is_blocked = any(
+                    record.status == IN_PROGRESS or record.start >= now_minute
+                    for record in appointment_index.overlapping(barber_id, now_naive, required_end_naive)
+                )
+                if not is_blocked:
+                    available_barber_ids.append(barber_id)
+        else:
+            # --- NEW LOGIC ADDITION: Check for current 'InProgress' appointments ---
+            # Query for all 'InProgress' appointments for these barbers that overlap 'now_local'
+            current_inprogress_appts_response = await backend.list_documents(
+                database_id=APPWRITE_DATABASE_ID,
+                collection_id=COLLECTION_APPOINTMENTS,
+                queries=[
+                    Query.equal("barber_id", on_shift_barber_ids),
+                    Query.equal("status", ["InProgress"]),
+                    # Appointment started before or at required_end_time
+                    Query.less_than_equal("start_time", required_end_time_local.astimezone(timezone.utc).isoformat()),
+                    # Appointment ends after or at now_utc
+                    Query.greater_than_equal("end_time", now_utc.isoformat())
+                ],
+                allow_stale=False # A walk-in is seated now; an old answer could double-book a chair
+            )
         
-        # Get IDs of barbers currently busy with an InProgress appointment
-        busy_barber_ids_inprogress = {appt['barber_id'] for appt in current_inprogress_appts_response['documents']}
+            # Get IDs of barbers currently busy with an InProgress appointment
+            busy_barber_ids_inprogress = {appt['barber_id'] for appt in current_inprogress_appts_response['documents']}
 
-        # Filter out barbers who are currently busy
-        potentially_available_barber_ids = [
-            barber_id for barber_id in on_shift_barber_ids if barber_id not in busy_barber_ids_inprogress
-        ]
+            # Filter out barbers who are currently busy
+            potentially_available_barber_ids = [
+                barber_id for barber_id in on_shift_barber_ids if barber_id not in busy_barber_ids_inprogress
+            ]
 
-        if not potentially_available_barber_ids:
-            return [] # All on-shift barbers are currently busy.
+            if not potentially_available_barber_ids:
+                return [] # All on-shift barbers are currently busy.
 
-        # --- EXISTING LOGIC: Check for future appointments ---
-        # Fetch next appointment for ALL potentially available barbers
-        day_start_utc = now_local.replace(hour=0, minute=0, second=0, microsecond=0).astimezone(timezone.utc)
+            # --- EXISTING LOGIC: Check for future appointments ---
+            # Fetch next appointment for ALL potentially available barbers
+            day_start_utc = now_local.replace(hour=0, minute=0, second=0, microsecond=0).astimezone(timezone.utc)
         
-        next_appointments_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_APPOINTMENTS,
-            queries=[
-                Query.equal("barber_id", potentially_available_barber_ids), # Use the filtered list
-                Query.greater_than_equal("start_time", now_utc.isoformat()),
-                Query.less_than("start_time", (day_start_utc + timedelta(days=1)).isoformat()),
-                Query.not_equal("status", "Cancelled"),
-                Query.not_equal("status", "InProgress"), # Also exclude InProgress from here
-                Query.order_asc("start_time")
-            ]
-        )
-
-        next_appointment_map = {}
-        for appt in next_appointments_response['documents']:
-            barber_id = appt['barber_id']
-            # Only store the *first* (next) appointment for each barber
-            if barber_id not in next_appointment_map:
-                next_appointment_map[barber_id] = parse_iso_to_datetime(appt['start_time'])
-
-        available_barber_ids = []
-        for barber_id in potentially_available_barber_ids:
-            next_appointment_start = next_appointment_map.get(barber_id)
+            next_appointments_response = await backend.list_documents(
+                database_id=APPWRITE_DATABASE_ID,
+                collection_id=COLLECTION_APPOINTMENTS,
+                queries=[
+                    Query.equal("barber_id", potentially_available_barber_ids), # Use the filtered list
+                    Query.greater_than_equal("start_time", now_utc.isoformat()),
+                    Query.less_than("start_time", (day_start_utc + timedelta(days=1)).isoformat()),
+                    Query.not_equal("status", "Cancelled"),
+                    Query.not_equal("status", "InProgress"), # Also exclude InProgress from here
+                    Query.order_asc("start_time")
+                ],
+                allow_stale=False
+            )
+
+            next_appointment_map = {}
+            for appt in next_appointments_response['documents']:
+                barber_id = appt['barber_id']
+                # Only store the *first* (next) appointment for each barber
+                if barber_id not in next_appointment_map:
+                    next_appointment_map[barber_id] = AppointmentRecord.from_document(appt)
+
+            required_end_minute = minute_of(required_end_naive, round_up=True)
+            available_barber_ids = []
+            for barber_id in potentially_available_barber_ids:
+                next_appointment = next_appointment_map.get(barber_id)
             
-            if next_appointment_start is None:
-                available_barber_ids.append(barber_id)
-                continue
+                if next_appointment is None:
+                    available_barber_ids.append(barber_id)
+                    continue
             
-            # Compare required end time with next appointment start time
-            # Convert next_appointment_start (which is local naive) to local aware for direct comparison
-            next_appointment_start_local = next_appointment_start.replace(tzinfo=TARGET_TIMEZONE)
-            if required_end_time_local <= next_appointment_start_local:
-                available_barber_ids.append(barber_id)
+                # Compare required end time with next appointment start time (both in local minutes)
+                if required_end_minute <= next_appointment.start:
+                    available_barber_ids.append(barber_id)
         
         if not available_barber_ids:
             return []
 
-        # 4. Fetch the full details of the truly available barbers
-        final_barbers_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_BARBERS,
-            queries=[Query.equal("$id", available_barber_ids)]
-        )
-
-        return final_barbers_response['documents']
+        # 4. Look up the full details of the truly available barbers
+        barbers = await reference_cache.get_many("barbers", available_barber_ids)
+        return [barber for barber in barbers if barber['shop_id'] == shop_id]
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error finding available barbers for walk-in: {e}")
         return []
 
 
+async def find_appointments_for_rule(
+    shop_id: str,
+    day_start: datetime,
+    from_status: str,
+    barber_id: Optional[str] = None
+) -> List[str]:
+    """Returns the IDs of a shop's appointments on a local day that are in `from_status`."""
+    queries = [
+        Query.equal("shop_id", [shop_id]),
+        Query.equal("status", [from_status]),
+        Query.greater_than_equal("start_time", day_start.astimezone(timezone.utc).isoformat()),
+        Query.less_than("start_time", (day_start + timedelta(days=1)).astimezone(timezone.utc).isoformat()),
+    ]
+    if barber_id:
+        queries.append(Query.equal("barber_id", [barber_id]))
+
+    appointment_ids = []
+    async for page in stream_appointments(queries):
+        appointment_ids.extend(appointment['$id'] for appointment in page)
+    return appointment_ids
+
+
+async def apply_status_changes(changes: List[Tuple[str, str]]) -> List[dict]:
+    """
+    Applies (appointment_id, status) pairs with at most BULK_STATUS_CONCURRENCY
+    updates in flight. One failure does not stop the others; every pair gets
+    a result in the input order.
+    """
+    semaphore = asyncio.Semaphore(BULK_STATUS_CONCURRENCY)
+
+    async def apply_one(appointment_id: str, status: str) -> dict:
+        async with semaphore:
+            try:
+                updated_document = await backend.update_document(
+                    database_id=APPWRITE_DATABASE_ID,
+                    collection_id=COLLECTION_APPOINTMENTS,
+                    document_id=appointment_id,
+                    data={"status": status}
+                )
+            except Exception as e:
+                print(f"Bulk status update failed for appointment {appointment_id}: {e}")
+                return {"appointment_id": appointment_id, "status": status, "ok": False, "error": str(e) or type(e).__name__}
+
+        # Keep the in-memory index current (cancellations free the slot again)
+        appointment_index.apply(updated_document)
+        if status == "Cancelled":
+            # Offer the freed time to waiting customers
+            waitlist.on_cancelled(updated_document)
+        return {"appointment_id": appointment_id, "status": status, "ok": True, "error": None}
+
+    return await asyncio.gather(*(apply_one(appointment_id, status) for appointment_id, status in changes))
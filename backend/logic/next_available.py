@@ -0,0 +1,134 @@
+# backend/logic/next_available.py
+
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List
+
+from appwrite.query import Query
+
+from logic.appointment_index import appointment_index
+from logic.appointment_record import AppointmentRecord, free_blocks_between
+from logic.availability import slots_from_free_blocks
+from logic.financials import stream_appointments
+from logic.precompute import availability_precompute, working_window
+from reference_cache import reference_cache
+from utils import TARGET_TIMEZONE
+
+# How far ahead (in days, including today) the search may look
+NEXT_AVAILABLE_MAX_HORIZON_DAYS = int(os.getenv("NEXT_AVAILABLE_MAX_HORIZON_DAYS", "60"))
+NEXT_AVAILABLE_DEFAULT_HORIZON_DAYS = int(os.getenv("NEXT_AVAILABLE_DEFAULT_HORIZON_DAYS", "30"))
+# The first chunk covers this many days; each following chunk is twice as long
+NEXT_AVAILABLE_FIRST_CHUNK_DAYS = int(os.getenv("NEXT_AVAILABLE_FIRST_CHUNK_DAYS", "1"))
+
+
+def _chunks(first_day: date, horizon_days: int):
+    """Yields (first_date, day_count) chunks of 1, 2, 4, ... days covering the horizon."""
+    offset, size = 0, max(1, NEXT_AVAILABLE_FIRST_CHUNK_DAYS)
+    while offset < horizon_days:
+        count = min(size, horizon_days - offset)
+        yield first_day + timedelta(days=offset), count
+        offset += count
+        size *= 2
+
+
+async def _load_records(barber_ids: List[str], first_day: date, day_count: int) -> Dict[str, List[AppointmentRecord]]:
+    """One paged query for every candidate barber's bookings in the chunk, as records sorted by start."""
+    range_start = datetime.combine(first_day, datetime.min.time()).replace(tzinfo=TARGET_TIMEZONE)
+    range_end = range_start + timedelta(days=day_count)
+    queries = [
+        Query.equal("barber_id", barber_ids),
+        Query.not_equal("status", ["Cancelled"]),
+        Query.greater_than_equal("start_time", range_start.astimezone(timezone.utc).isoformat()),
+        Query.less_than("start_time", range_end.astimezone(timezone.utc).isoformat()),
+    ]
+    records_by_barber: Dict[str, List[AppointmentRecord]] = {}
+    async for page in stream_appointments(queries):
+        for appointment in page:
+            record = AppointmentRecord.from_document(appointment)
+            records_by_barber.setdefault(record.barber_id, []).append(record)
+    for records in records_by_barber.values():
+        records.sort(key=lambda record: record.start)
+    return records_by_barber
+
+
+async def find_next_available(shop_id: str, barber_id: str, total_duration: int, horizon_days: int = NEXT_AVAILABLE_DEFAULT_HORIZON_DAYS) -> dict:
+    """
+    Walks forward from today and returns the first date on which the barber
+    (or, for "any", at least one barber of the shop) can fit `total_duration`,
+    together with every fitting slot on that date. Today's slots that have
+    already started are skipped.
+
+    Free blocks come from the precomputed intervals or the appointment index
+    when they cover a day. Only the days they do not cover are loaded from
+    Appwrite, in chunks of growing length (1, 2, 4, ... days), and the search
+    stops at the first chunk with an opening. A "next opening is today" answer
+    therefore costs at most one small query.
+    """
+    horizon_days = max(1, min(horizon_days, NEXT_AVAILABLE_MAX_HORIZON_DAYS))
+    shop_barbers = reference_cache.barbers(shop_id=shop_id)
+    if barber_id.lower() == "any":
+        candidates = shop_barbers
+    else:
+        candidates = [barber for barber in shop_barbers if barber['$id'] == barber_id]
+    result = {"shop_id": shop_id, "barber_id": barber_id, "date": None, "slots": [], "barber_ids": [], "days_searched": 0}
+    if not candidates:
+        return result
+
+    candidate_ids = {barber['$id'] for barber in candidates}
+    schedules = {
+        (schedule['barber_id'], schedule['day_of_week']): schedule
+        for schedule in reference_cache.schedules()
+        if schedule['barber_id'] in candidate_ids
+    }
+    timings = {timing['day_of_week']: timing for timing in reference_cache.shop_timings(shop_id)}
+
+    now_local = datetime.now(timezone.utc).astimezone(TARGET_TIMEZONE)
+    today = now_local.date()
+    now_hhmm = now_local.strftime("%H:%M")
+
+    for chunk_start, chunk_days in _chunks(today, horizon_days):
+        days = [chunk_start + timedelta(days=offset) for offset in range(chunk_days)]
+
+        # --- PART 1: Each candidate's free blocks per day, from memory where possible ---
+        free_blocks: Dict[tuple, list] = {}
+        uncovered: Dict[tuple, tuple] = {}
+        for day in days:
+            date_str = day.strftime("%Y-%m-%d")
+            day_of_week = day.strftime("%A")
+            for barber in candidates:
+                key = (barber['$id'], day)
+                precomputed = availability_precompute.lookup(shop_id, barber['$id'], date_str)
+                if precomputed is not None:
+                    free_blocks[key] = precomputed
+                    continue
+                window = working_window(schedules.get((barber['$id'], day_of_week)), timings.get(day_of_week), day)
+                if window is None:
+                    free_blocks[key] = []
+                elif appointment_index.covers(*window):
+                    free_blocks[key] = appointment_index.free_blocks(barber['$id'], *window)
+                else:
+                    uncovered[key] = window
+
+        # --- PART 2: One query for whatever the caches could not answer in this chunk ---
+        if uncovered:
+            barber_ids = sorted({barber_key for barber_key, _ in uncovered})
+            records_by_barber = await _load_records(barber_ids, chunk_start, chunk_days)
+            for (barber_key, day), (work_start, work_end) in uncovered.items():
+                free_blocks[(barber_key, day)] = free_blocks_between(work_start, work_end, records_by_barber.get(barber_key, []))
+
+        # --- PART 3: The first day with a fitting slot ends the search ---
+        for day in days:
+            result["days_searched"] += 1
+            slots, barber_ids = set(), []
+            for barber in candidates:
+                barber_slots = slots_from_free_blocks(free_blocks[(barber['$id'], day)], total_duration)
+                if day == today:
+                    barber_slots = [slot for slot in barber_slots if slot > now_hhmm]
+                if barber_slots:
+                    slots.update(barber_slots)
+                    barber_ids.append(barber['$id'])
+            if slots:
+                result.update(date=day.strftime("%Y-%m-%d"), slots=sorted(slots), barber_ids=barber_ids)
+                return result
+
+    return result
@@ -0,0 +1,205 @@
+# backend/logic/precompute.py
+
+import asyncio
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from logic.appointment_index import appointment_index
+from logic.appointment_record import FreeBlock
+from reference_cache import reference_cache
+from utils import TARGET_TIMEZONE
+
+# --- Precompute Configuration ---
+PRECOMPUTE_ENABLED = os.getenv("AVAILABILITY_PRECOMPUTE_ENABLED", "true").lower() == "true"
+# How many days, starting today, have their free intervals computed ahead of time
+PRECOMPUTE_DAYS = int(os.getenv("AVAILABILITY_PRECOMPUTE_DAYS", "14"))
+# How many shops are computed at once, so a refresh never crowds out requests
+PRECOMPUTE_CONCURRENCY = int(os.getenv("AVAILABILITY_PRECOMPUTE_CONCURRENCY", "2"))
+# How soon a failed refresh (e.g. Appwrite unreachable at startup) is retried
+PRECOMPUTE_RETRY_SECONDS = float(os.getenv("AVAILABILITY_PRECOMPUTE_RETRY_SECONDS", "30"))
+
+# The reference collections the working windows are derived from
+SOURCE_COLLECTIONS = ("barbers", "schedules", "shop_timings")
+
+
+class _PrecomputedDay:
+    """One barber's working window on one date and the free blocks inside it."""
+
+    __slots__ = ("work_start", "work_end", "free_blocks", "index_version")
+
+    def __init__(self, work_start: datetime, work_end: datetime):
+        self.work_start = work_start
+        self.work_end = work_end
+        self.free_blocks: Optional[List[FreeBlock]] = None
+        self.index_version = None
+
+
+def working_window(schedule: Optional[dict], timing: Optional[dict], selected_date: date) -> Optional[Tuple[datetime, datetime]]:
+    """The barber's shift clipped to shop hours, or None if they cannot take bookings that day."""
+    if schedule is None or timing is None or schedule['is_day_off'] or timing['is_closed']:
+        return None
+    start_time = max(datetime.strptime(schedule['start_time'], "%H:%M").time(), datetime.strptime(timing['open_time'], "%H:%M").time())
+    end_time = min(datetime.strptime(schedule['end_time'], "%H:%M").time(), datetime.strptime(timing['close_time'], "%H:%M").time())
+    work_start = datetime.combine(selected_date, start_time)
+    work_end = datetime.combine(selected_date, end_time)
+    return (work_start, work_end) if work_start < work_end else None
+
+
+class AvailabilityPrecompute:
+    """
+    Free-interval sets for every barber for the next PRECOMPUTE_DAYS days,
+    computed in the background so the first customer of the day does not pay
+    the cold cost. Working windows come from the reference data and are
+    rebuilt at startup, after midnight in TARGET_TIMEZONE and after schedule
+    changes. Free blocks follow the appointment index: an entry whose barber
+    changed since it was computed is recomputed from the index on read.
+    """
+
+    def __init__(self):
+        self._days: Dict[Tuple[str, str, str], Optional[_PrecomputedDay]] = {}
+        self._sources: Optional[Tuple[List[dict], ...]] = None
+        self._refresh_requested = asyncio.Event()
+        self.last_refreshed_at: Optional[float] = None
+        self.last_refresh_seconds: Optional[float] = None
+        self.counters = {"refreshes": 0, "hits": 0, "misses": 0, "stale": 0, "recomputed": 0}
+
+    # --- Reading ---
+
+    def _sources_current(self) -> bool:
+        if self._sources is None:
+            return False
+        try:
+            current = reference_cache.collections(*SOURCE_COLLECTIONS)
+        except Exception:
+            return False
+        return all(now is then for now, then in zip(current, self._sources))
+
+    def lookup(self, shop_id: str, barber_id: str, date_str: str) -> Optional[List[FreeBlock]]:
+        """
+        Returns the barber's free blocks on the date ([] if they are not
+        working), or None if nothing current is precomputed and the caller
+        should compute it the normal way.
+        """
+        if not PRECOMPUTE_ENABLED:
+            return None
+        if not self._sources_current():
+            if self._sources is not None:
+                self.counters["stale"] += 1
+                self.request_refresh() # Schedules, timings or staff changed
+            return None
+
+        key = (shop_id, barber_id, date_str)
+        if key not in self._days:
+            self.counters["misses"] += 1
+            return None
+        day = self._days[key]
+        if day is None:
+            self.counters["hits"] += 1
+            return []
+
+        version = appointment_index.barber_version(barber_id)
+        if day.index_version != version:
+            if not appointment_index.covers(day.work_start, day.work_end):
+                self.counters["misses"] += 1
+                return None
+            day.free_blocks = appointment_index.free_blocks(barber_id, day.work_start, day.work_end)
+            day.index_version = version
+            self.counters["recomputed"] += 1
+        self.counters["hits"] += 1
+        return day.free_blocks
+
+    # --- Computing ---
+
+    def _compute_shop(self, shop_id: str, barbers: List[dict], schedules: Dict[tuple, dict], timings: Dict[tuple, dict], dates: List[date]) -> dict:
+        """Builds the entries for one shop. Runs in a worker thread."""
+        entries = {}
+        for selected_date in dates:
+            date_str = selected_date.strftime("%Y-%m-%d")
+            day_of_week = selected_date.strftime("%A")
+            timing = timings.get((shop_id, day_of_week))
+            for barber in barbers:
+                window = working_window(schedules.get((barber['$id'], day_of_week)), timing, selected_date)
+                if window is None:
+                    entries[(shop_id, barber['$id'], date_str)] = None
+                    continue
+                day = _PrecomputedDay(*window)
+                if appointment_index.covers(day.work_start, day.work_end):
+                    day.index_version = appointment_index.barber_version(barber['$id'])
+                    day.free_blocks = appointment_index.free_blocks(barber['$id'], day.work_start, day.work_end)
+                entries[(shop_id, barber['$id'], date_str)] = day
+        return entries
+
+    async def refresh(self):
+        """Recomputes every barber's next PRECOMPUTE_DAYS days and swaps them in."""
+        started = time.perf_counter()
+        sources = await asyncio.to_thread(reference_cache.collections, *SOURCE_COLLECTIONS)
+        barbers, schedules, timings = sources
+
+        schedules_by_key = {(schedule['barber_id'], schedule['day_of_week']): schedule for schedule in schedules}
+        timings_by_key = {(timing['shop_id'], timing['day_of_week']): timing for timing in timings}
+        barbers_by_shop: Dict[str, List[dict]] = {}
+        for barber in barbers:
+            barbers_by_shop.setdefault(barber['shop_id'], []).append(barber)
+
+        today = datetime.now(TARGET_TIMEZONE).date()
+        dates = [today + timedelta(days=offset) for offset in range(PRECOMPUTE_DAYS)]
+
+        semaphore = asyncio.Semaphore(PRECOMPUTE_CONCURRENCY)
+
+        async def compute(shop_id: str, shop_barbers: List[dict]) -> dict:
+            async with semaphore:
+                return await asyncio.to_thread(self._compute_shop, shop_id, shop_barbers, schedules_by_key, timings_by_key, dates)
+
+        results = await asyncio.gather(*(compute(shop_id, shop_barbers) for shop_id, shop_barbers in barbers_by_shop.items()))
+
+        fresh = {}
+        for entries in results:
+            fresh.update(entries)
+        self._days = fresh
+        self._sources = sources
+        self.last_refreshed_at = time.time()
+        self.last_refresh_seconds = time.perf_counter() - started
+        self.counters["refreshes"] += 1
+        print(f"Precomputed availability for {len(barbers)} barbers over {PRECOMPUTE_DAYS} days in {self.last_refresh_seconds:.2f}s.")
+
+    def request_refresh(self):
+        """Asks the background loop to recompute soon (e.g. after a schedule change)."""
+        self._refresh_requested.set()
+
+    async def run(self):
+        """
+        Background loop started from the app lifespan: refreshes at startup,
+        right after each local midnight, and whenever a refresh is requested.
+        """
+        while True:
+            self._refresh_requested.clear()
+            try:
+                await self.refresh()
+                now = datetime.now(TARGET_TIMEZONE)
+                next_midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=TARGET_TIMEZONE)
+                wait_seconds = (next_midnight - now).total_seconds() + 1
+            except Exception as e:
+                print(f"Availability precompute failed: {e}")
+                wait_seconds = PRECOMPUTE_RETRY_SECONDS
+
+            try:
+                await asyncio.wait_for(self._refresh_requested.wait(), timeout=wait_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "enabled": PRECOMPUTE_ENABLED,
+            "days": PRECOMPUTE_DAYS,
+            "entries": len(self._days),
+            "current": self._sources_current(),
+            "last_refreshed_at": self.last_refreshed_at,
+            "last_refresh_seconds": round(self.last_refresh_seconds, 3) if self.last_refresh_seconds is not None else None,
+            "counters": dict(self.counters),
+        }
+
+
+# A single, process-wide store shared by the availability logic.
+availability_precompute = AvailabilityPrecompute()
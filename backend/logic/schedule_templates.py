@@ -0,0 +1,185 @@
+# backend/logic/schedule_templates.py
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from appwrite.query import Query
+from fastapi import HTTPException
+
+from appwrite_client import APPWRITE_DATABASE_ID, COLLECTION_SCHEDULES, COLLECTION_SHOP_TIMINGS
+from logic.financials import stream_documents
+from logic.precompute import availability_precompute
+from reference_cache import reference_cache
+from resilience import backend
+
+# How many schedule / timing writes a template sends to Appwrite at once
+SCHEDULE_WRITE_CONCURRENCY = int(os.getenv("SCHEDULE_WRITE_CONCURRENCY", "8"))
+
+# Appwrite caps the number of values in one `equal` query
+EQUAL_VALUES_LIMIT = 100
+
+SCHEDULE_FIELDS = ("start_time", "end_time", "is_day_off")
+TIMING_FIELDS = ("open_time", "close_time", "is_closed")
+
+
+def _validate_window(day_of_week: str, start: str, end: str, is_off: bool):
+    try:
+        start_time = datetime.strptime(start, "%H:%M")
+        end_time = datetime.strptime(end, "%H:%M")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time on {day_of_week}. Please use HH:MM.")
+    if not is_off and end_time <= start_time:
+        raise HTTPException(status_code=400, detail=f"The end time on {day_of_week} must be after the start time.")
+
+
+def _plan_change(target: str, existing: Optional[dict], desired: dict, fields, barber_id: Optional[str] = None) -> Optional[dict]:
+    """Compares a desired document with the stored one; None means nothing to write."""
+    if existing is not None and all(existing.get(field) == desired[field] for field in fields):
+        return None
+    return {
+        "target": target,
+        "barber_id": barber_id,
+        "day_of_week": desired["day_of_week"],
+        "action": "update" if existing is not None else "create",
+        "document_id": existing['$id'] if existing is not None else None,
+        "before": {field: existing.get(field) for field in fields} if existing is not None else None,
+        "after": {field: desired[field] for field in fields},
+        "data": desired,
+    }
+
+
+async def _load_existing_schedules(barber_ids: List[str]) -> Dict[tuple, dict]:
+    """One bulk read of every existing schedule document for the barbers, keyed by (barber, day)."""
+    existing = {}
+    for chunk_start in range(0, len(barber_ids), EQUAL_VALUES_LIMIT):
+        chunk = barber_ids[chunk_start:chunk_start + EQUAL_VALUES_LIMIT]
+        async for page in stream_documents(COLLECTION_SCHEDULES, [Query.equal("barber_id", chunk)]):
+            for schedule in page:
+                existing[(schedule['barber_id'], schedule['day_of_week'])] = schedule
+    return existing
+
+
+async def _load_existing_timings(shop_id: str) -> Dict[str, dict]:
+    existing = {}
+    async for page in stream_documents(COLLECTION_SHOP_TIMINGS, [Query.equal("shop_id", [shop_id])]):
+        for timing in page:
+            existing[timing['day_of_week']] = timing
+    return existing
+
+
+async def _write_changes(changes: List[dict]) -> List[dict]:
+    """Runs the planned creates/updates with bounded concurrency and records each outcome."""
+    semaphore = asyncio.Semaphore(SCHEDULE_WRITE_CONCURRENCY)
+
+    async def write_one(change: dict):
+        collection_id = COLLECTION_SCHEDULES if change["target"] == "barber_schedule" else COLLECTION_SHOP_TIMINGS
+        async with semaphore:
+            try:
+                if change["action"] == "update":
+                    await backend.update_document(
+                        database_id=APPWRITE_DATABASE_ID,
+                        collection_id=collection_id,
+                        document_id=change["document_id"],
+                        data=change["data"]
+                    )
+                else:
+                    await backend.create_document(
+                        database_id=APPWRITE_DATABASE_ID,
+                        collection_id=collection_id,
+                        document_id='unique()',
+                        data=change["data"]
+                    )
+                change["ok"] = True
+            except Exception as e:
+                print(f"Schedule template write failed ({change['target']} {change['day_of_week']}): {e}")
+                change["ok"] = False
+                change["error"] = str(e) or type(e).__name__
+
+    await asyncio.gather(*(write_one(change) for change in changes))
+    return changes
+
+
+async def apply_schedule_template(shop_id: str, template, dry_run: bool = False) -> dict:
+    """
+    Applies a weekly pattern to all (or the selected) barbers of a shop, and
+    optionally the shop's own opening hours. Existing documents are read in
+    bulk, compared with the template and only real differences are written.
+    With `dry_run`, the diff is returned and nothing is written.
+    """
+    # --- PART 1: Validate the template and the target barbers ---
+    shop_barber_ids = [barber['$id'] for barber in reference_cache.barbers(shop_id)]
+    if template.barber_ids is None:
+        barber_ids = shop_barber_ids
+    else:
+        unknown = sorted(set(template.barber_ids) - set(shop_barber_ids))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Barbers not found in this shop: {', '.join(unknown)}")
+        barber_ids = list(dict.fromkeys(template.barber_ids))
+
+    for day in template.schedules:
+        _validate_window(day.day_of_week, day.start_time, day.end_time, day.is_day_off)
+    for day in template.shop_timings or []:
+        _validate_window(day.day_of_week, day.open_time, day.close_time, day.is_closed)
+
+    # --- PART 2: One bulk read of what is stored now ---
+    existing_schedules, existing_timings = await asyncio.gather(
+        _load_existing_schedules(barber_ids) if template.schedules else asyncio.sleep(0, {}),
+        _load_existing_timings(shop_id) if template.shop_timings else asyncio.sleep(0, {}),
+    )
+
+    # --- PART 3: Diff the template against it ---
+    changes = []
+    unchanged = 0
+    for barber_id in barber_ids:
+        for day in template.schedules:
+            desired = {
+                "start_time": day.start_time,
+                "end_time": day.end_time,
+                "is_day_off": day.is_day_off,
+                "barber_id": barber_id,
+                "shop_id": shop_id,
+                "day_of_week": day.day_of_week,
+            }
+            change = _plan_change("barber_schedule", existing_schedules.get((barber_id, day.day_of_week)), desired, SCHEDULE_FIELDS, barber_id)
+            if change is None:
+                unchanged += 1
+            else:
+                changes.append(change)
+
+    for day in template.shop_timings or []:
+        desired = {
+            "open_time": day.open_time,
+            "close_time": day.close_time,
+            "is_closed": day.is_closed,
+            "shop_id": shop_id,
+            "day_of_week": day.day_of_week,
+        }
+        change = _plan_change("shop_timing", existing_timings.get(day.day_of_week), desired, TIMING_FIELDS)
+        if change is None:
+            unchanged += 1
+        else:
+            changes.append(change)
+
+    # --- PART 4: Write the differences (unless this is a dry run) ---
+    if not dry_run and changes:
+        await _write_changes(changes)
+        touched = {change["target"] for change in changes if change.get("ok")}
+        if "barber_schedule" in touched:
+            await reference_cache.invalidate("schedules")
+        if "shop_timing" in touched:
+            await reference_cache.invalidate("shop_timings")
+        if touched:
+            availability_precompute.request_refresh()
+
+    failed = sum(1 for change in changes if change.get("ok") is False)
+    return {
+        "dry_run": dry_run,
+        "barbers": len(barber_ids),
+        "creates": sum(1 for change in changes if change["action"] == "create"),
+        "updates": sum(1 for change in changes if change["action"] == "update"),
+        "unchanged": unchanged,
+        "failed": failed,
+        "changes": changes,
+    }
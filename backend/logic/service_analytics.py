@@ -0,0 +1,106 @@
+# backend/logic/service_analytics.py
+
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from logic.financials import aggregate_completed
+
+# How many parsed `services_snapshot` values are kept in memory
+SNAPSHOT_PARSE_CACHE_SIZE = int(os.getenv("SNAPSHOT_PARSE_CACHE_SIZE", "20000"))
+
+
+class ParsedSnapshotCache:
+    """
+    Memoizes the decoded `services_snapshot` JSON of appointments, keyed by
+    appointment ID and `$updatedAt`, so repeated reports over the same period
+    don't decode the same strings again. Least recently used entries are evicted.
+    """
+
+    def __init__(self, max_size: int = SNAPSHOT_PARSE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple, List[dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, appointment: dict) -> List[dict]:
+        key = (appointment.get('$id'), appointment.get('$updatedAt'))
+        services = self._entries.get(key)
+        if services is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return services
+
+        self.misses += 1
+        try:
+            services = json.loads(appointment.get('services_snapshot') or "[]")
+        except (TypeError, ValueError):
+            print(f"Unreadable services_snapshot on appointment {key[0]}")
+            services = []
+
+        self._entries[key] = services
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return services
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+parsed_snapshot_cache = ParsedSnapshotCache()
+
+
+class ServiceAccumulator:
+    """Aggregates per-service counts, revenue and duration from appointment snapshots."""
+
+    def __init__(self, snapshot_cache: ParsedSnapshotCache = parsed_snapshot_cache):
+        self.snapshot_cache = snapshot_cache
+        self.appointments = 0
+        self._rows: Dict[str, dict] = {}
+
+    def add(self, appointment: dict):
+        self.appointments += 1
+        for service in self.snapshot_cache.get(appointment):
+            service_id = service.get('id') or service.get('name', "unknown")
+            row = self._rows.get(service_id)
+            if row is None:
+                row = {"service_id": service_id, "name": service.get('name', ""), "count": 0, "revenue": 0.0, "total_duration": 0}
+                self._rows[service_id] = row
+            row["count"] += 1
+            row["revenue"] += service.get('price', 0) or 0
+            row["total_duration"] += service.get('duration', 0) or 0
+
+    def report(self, filter_period: str) -> dict:
+        total_revenue = sum(row["revenue"] for row in self._rows.values())
+        services = [
+            {
+                "service_id": row["service_id"],
+                "name": row["name"],
+                "count": row["count"],
+                "revenue": round(row["revenue"], 2),
+                "revenue_share": round(row["revenue"] / total_revenue, 4) if total_revenue else 0.0,
+                "average_duration_minutes": round(row["total_duration"] / row["count"], 1),
+            }
+            for row in self._rows.values()
+        ]
+        services.sort(key=lambda row: row["revenue"], reverse=True)
+        return {
+            "filter_period": filter_period,
+            "total_appointments": self.appointments,
+            "total_service_revenue": round(total_revenue, 2),
+            "services": services,
+        }
+
+
+async def build_service_analytics_report(
+    period_start: datetime,
+    period_end: datetime,
+    filter_period: str,
+    shop_id: Optional[str] = None
+) -> dict:
+    """Per-service counts, pre-tax revenue and average duration for Completed appointments in a period."""
+    accumulator = ServiceAccumulator()
+    await aggregate_completed(period_start, period_end, shop_id, accumulator)
+    return accumulator.report(filter_period)
@@ -0,0 +1,42 @@
+# backend/logic/staff.py
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from logic.precompute import working_window
+from reference_cache import reference_cache
+from utils import TARGET_TIMEZONE
+
+
+def build_staff_summary(shop_id: Optional[str] = None) -> List[dict]:
+    """
+    Per shop: how many barbers it has and how many are on shift right now
+    (inside their schedule for today, while the shop is open). One pass
+    over today's schedules and shop timings from the reference cache.
+    """
+    now_local = datetime.now(timezone.utc).astimezone(TARGET_TIMEZONE).replace(tzinfo=None)
+    today = now_local.date()
+    day_of_week = now_local.strftime("%A")
+
+    shops = [shop for shop in reference_cache.shops() if shop_id is None or shop['$id'] == shop_id]
+    summary: Dict[str, dict] = {
+        shop['$id']: {"shop_id": shop['$id'], "shop_name": shop['name'], "headcount": 0, "on_shift": 0}
+        for shop in shops
+    }
+    barber_shops = {}
+    for barber in reference_cache.barbers():
+        if barber['shop_id'] in summary:
+            summary[barber['shop_id']]["headcount"] += 1
+            barber_shops[barber['$id']] = barber['shop_id']
+
+    shop_timings, = reference_cache.collections("shop_timings")
+    timings = {timing['shop_id']: timing for timing in shop_timings if timing['day_of_week'] == day_of_week}
+    for schedule in reference_cache.schedules(day_of_week=day_of_week):
+        barber_shop_id = barber_shops.get(schedule['barber_id'])
+        if barber_shop_id is None:
+            continue
+        window = working_window(schedule, timings.get(barber_shop_id), today)
+        if window is not None and window[0] <= now_local < window[1]:
+            summary[barber_shop_id]["on_shift"] += 1
+
+    return list(summary.values())
@@ -0,0 +1,175 @@
+# backend/logic/utilization.py
+
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+import numpy as np
+from appwrite.query import Query
+from fastapi import HTTPException
+
+from logic.financials import stream_appointments
+from reference_cache import reference_cache
+from logic.appointment_record import AppointmentColumns, AppointmentRecord, CANCELLED, LOCAL_EPOCH, MINUTES_PER_DAY, day_number, minute_of
+from logic.precompute import working_window
+from utils import TARGET_TIMEZONE
+
+# The widest date range a single report may cover
+UTILIZATION_MAX_DAYS = int(os.getenv("UTILIZATION_MAX_DAYS", "366"))
+
+
+def resolve_date_range(start_date: str, end_date: str) -> Tuple[date, date]:
+    """Validates an inclusive YYYY-MM-DD range and returns it as dates."""
+    try:
+        first_day = datetime.strptime(start_date, "%Y-%m-%d").date()
+        last_day = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Please use YYYY-MM-DD.")
+    if last_day < first_day:
+        raise HTTPException(status_code=400, detail="'end_date' must not be before 'start_date'.")
+    if (last_day - first_day).days + 1 > UTILIZATION_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"The date range cannot exceed {UTILIZATION_MAX_DAYS} days.")
+    return first_day, last_day
+
+
+def _interval_mask(rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, row_count: int) -> np.ndarray:
+    """
+    The sweep: +1 at every interval start and -1 at every end on a per-row
+    minute line, then a running sum. A minute is covered while the sum is > 0.
+    Overlapping intervals therefore count once.
+    """
+    sweep = np.zeros((row_count, MINUTES_PER_DAY + 1), dtype=np.int32)
+    valid = ends > starts
+    np.add.at(sweep, (rows[valid], starts[valid]), 1)
+    np.add.at(sweep, (rows[valid], ends[valid]), -1)
+    return np.cumsum(sweep[:, :MINUTES_PER_DAY], axis=1) > 0
+
+
+def _longest_runs(mask: np.ndarray) -> np.ndarray:
+    """The length of the longest run of True in each row."""
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    # nonzero() walks row-major, so the n-th run start pairs with the n-th run end
+    start_rows, start_cols = np.nonzero(edges == 1)
+    _, end_cols = np.nonzero(edges == -1)
+    longest = np.zeros(mask.shape[0], dtype=np.int64)
+    np.maximum.at(longest, start_rows, end_cols - start_cols)
+    return longest
+
+
+def _scheduled_windows(shop_id: str, barber_ids: List[str]) -> Dict[Tuple[str, str], Tuple[int, int]]:
+    """(barber_id, day_of_week) -> the minutes the barber is on shift AND the shop is open."""
+    timings = {
+        timing['day_of_week']: timing
+        for timing in reference_cache.shop_timings(shop_id)
+        if not timing['is_closed']
+    }
+    barber_id_set = set(barber_ids)
+    windows = {}
+    for schedule in reference_cache.schedules(shop_id=shop_id):
+        timing = timings.get(schedule['day_of_week'])
+        if schedule['barber_id'] not in barber_id_set:
+            continue
+        # Any date will do: only the time of day is kept
+        window = working_window(schedule, timing, LOCAL_EPOCH.date())
+        if window is not None:
+            start, end = (minute_of(moment) for moment in window)
+            windows[(schedule['barber_id'], schedule['day_of_week'])] = (start, end)
+    return windows
+
+
+async def build_utilization_report(shop_id: str, first_day: date, last_day: date) -> dict:
+    """
+    Per barber per day: scheduled, booked and idle minutes plus the largest
+    idle gap. Schedules come from the reference cache and the range's
+    appointments are loaded in bulk; the minute arithmetic is one NumPy sweep
+    over a (barber x day, minute) grid.
+    """
+    barbers = reference_cache.barbers(shop_id)
+    barber_ids = [barber['$id'] for barber in barbers]
+    day_count = (last_day - first_day).days + 1
+    days = [first_day + timedelta(days=offset) for offset in range(day_count)]
+    row_count = len(barbers) * day_count
+    barber_rows = {barber_id: position * day_count for position, barber_id in enumerate(barber_ids)}
+
+    # --- PART 1: Scheduled intervals, one per (barber, day) row ---
+    windows = _scheduled_windows(shop_id, barber_ids)
+    schedule_rows, schedule_starts, schedule_ends = [], [], []
+    for barber_id in barber_ids:
+        for offset, day in enumerate(days):
+            window = windows.get((barber_id, day.strftime("%A")))
+            if window:
+                schedule_rows.append(barber_rows[barber_id] + offset)
+                schedule_starts.append(window[0])
+                schedule_ends.append(window[1])
+
+    # --- PART 2: Booked intervals from the range's appointments, loaded in bulk ---
+    range_start = datetime.combine(first_day, datetime.min.time()).replace(tzinfo=TARGET_TIMEZONE)
+    range_end = range_start + timedelta(days=day_count)
+    queries = [
+        Query.equal("shop_id", [shop_id]),
+        Query.greater_than_equal("start_time", range_start.astimezone(timezone.utc).isoformat()),
+        Query.less_than("start_time", range_end.astimezone(timezone.utc).isoformat()),
+    ]
+    # Each document is converted once to a compact record; the arithmetic below runs on columns
+    records = []
+    async for page in stream_appointments(queries):
+        records.extend(AppointmentRecord.from_document(appointment) for appointment in page)
+    columns = AppointmentColumns(records, barber_ids)
+    keep = (columns.status != CANCELLED) & (columns.barber >= 0)
+    starts, ends, barber_positions = columns.start[keep], columns.end[keep], columns.barber[keep]
+    start_days = starts // MINUTES_PER_DAY
+    booked_rows = barber_positions.astype(np.int64) * day_count + (start_days - day_number(first_day))
+    booked_starts = starts % MINUTES_PER_DAY
+    # Anything running past midnight is clipped to the day it started on
+    booked_ends = np.where(ends // MINUTES_PER_DAY > start_days, MINUTES_PER_DAY, ends % MINUTES_PER_DAY)
+
+    # --- PART 3: The vectorized sweep ---
+    def as_array(values):
+        return np.asarray(values, dtype=np.int64)
+
+    scheduled = _interval_mask(as_array(schedule_rows), as_array(schedule_starts), as_array(schedule_ends), row_count)
+    booked = _interval_mask(as_array(booked_rows), as_array(booked_starts), as_array(booked_ends), row_count)
+    idle = scheduled & ~booked
+
+    scheduled_minutes = scheduled.sum(axis=1)
+    # Only bookings inside the barber's working window count towards utilization
+    booked_minutes = (scheduled & booked).sum(axis=1)
+    idle_minutes = idle.sum(axis=1)
+    largest_gaps = _longest_runs(idle)
+
+    # --- PART 4: Shape the response ---
+    report = []
+    for barber in barbers:
+        base = barber_rows[barber['$id']]
+        day_rows = []
+        for offset, day in enumerate(days):
+            row = base + offset
+            day_rows.append({
+                "date": day.strftime("%Y-%m-%d"),
+                "scheduled_minutes": int(scheduled_minutes[row]),
+                "booked_minutes": int(booked_minutes[row]),
+                "idle_minutes": int(idle_minutes[row]),
+                "largest_idle_gap_minutes": int(largest_gaps[row]),
+                "utilization": round(float(booked_minutes[row] / scheduled_minutes[row]), 4) if scheduled_minutes[row] else 0.0,
+            })
+        total_scheduled = int(scheduled_minutes[base:base + day_count].sum())
+        total_booked = int(booked_minutes[base:base + day_count].sum())
+        report.append({
+            "barber_id": barber['$id'],
+            "barber_name": barber['name'],
+            "scheduled_minutes": total_scheduled,
+            "booked_minutes": total_booked,
+            "idle_minutes": int(idle_minutes[base:base + day_count].sum()),
+            "largest_idle_gap_minutes": int(largest_gaps[base:base + day_count].max()) if day_count else 0,
+            "utilization": round(total_booked / total_scheduled, 4) if total_scheduled else 0.0,
+            "days": day_rows,
+        })
+
+    return {
+        "shop_id": shop_id,
+        "start_date": first_day.strftime("%Y-%m-%d"),
+        "end_date": last_day.strftime("%Y-%m-%d"),
+        "barbers": report,
+    }
@@ -0,0 +1,674 @@
+# backend/logic/waitlist.py
+
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from appwrite.exception import AppwriteException
+from appwrite.query import Query
+from fastapi import HTTPException
+
+try:
+    import fcntl
+except ImportError: # Windows: a single worker, which is always the owner
+    fcntl = None
+
+import schemas
+from appwrite_client import databases, APPWRITE_DATABASE_ID, COLLECTION_WAITLIST
+from logic.appointment_index import appointment_index
+from logic.appointment_record import AppointmentRecord, free_blocks_between, iso_to_minute, minute_of, minute_to_datetime
+from logic.booking import book_appointment
+from logic.customers import customer_profiles
+from logic.financials import stream_appointments, stream_documents
+from logic.precompute import working_window
+from reference_cache import reference_cache
+from resilience import backend
+from shared_snapshot import host_file_path
+from utils import TARGET_TIMEZONE, parse_iso_to_datetime
+
+# --- Waitlist Configuration ---
+# The waitlist is off unless switched on explicitly (and its collection is configured)
+WAITLIST_ENABLED = os.getenv("WAITLIST_ENABLED", "false").lower() == "true" and bool(COLLECTION_WAITLIST)
+# The longest date window a single registration may cover
+WAITLIST_MAX_WINDOW_DAYS = int(os.getenv("WAITLIST_MAX_WINDOW_DAYS", "14"))
+# How long a customer has to accept an offered slot before it goes to the next in line
+WAITLIST_OFFER_MINUTES = int(os.getenv("WAITLIST_OFFER_MINUTES", "15"))
+# How often the index is rebuilt from Appwrite and expired offers are released
+WAITLIST_RECONCILE_SECONDS = int(os.getenv("WAITLIST_RECONCILE_SECONDS", "60"))
+# How often the owner worker looks for appointments other workers cancelled
+WAITLIST_SWEEP_SECONDS = float(os.getenv("WAITLIST_SWEEP_SECONDS", "5"))
+# Cancellations already backfilled, remembered so the sweep does not offer their slot twice
+HANDLED_CANCELLATIONS = 10000
+# Offered slots start on the same 30-minute grid as the availability endpoints
+SLOT_INTERVAL_MINUTES = 30
+
+WARM_PAGE_SIZE = 100
+
+WAITING, OFFERED, BOOKED, WITHDRAWN = "Waiting", "Offered", "Booked", "Withdrawn"
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).astimezone(TARGET_TIMEZONE).date()
+
+
+def _now_minute() -> int:
+    return minute_of(datetime.now(timezone.utc).astimezone(TARGET_TIMEZONE).replace(tzinfo=None), round_up=True)
+
+
+def _is_not_found(error: Exception) -> bool:
+    return isinstance(error, AppwriteException) and error.code == 404
+
+
+class _WaitingEntry:
+    """The fields the matcher needs from a Waiting registration."""
+
+    __slots__ = ("entry_id", "shop_id", "barber_id", "duration", "dates", "key")
+
+    def __init__(self, document: dict, dates: List[str]):
+        self.entry_id = document['$id']
+        self.shop_id = document['shop_id']
+        self.barber_id = document['barber_id']
+        self.duration = int(document['duration'])
+        self.dates = dates
+        # Sorted by duration, then first come, first served
+        self.key = (self.duration, document.get('$createdAt') or "", self.entry_id)
+
+    def accepts(self, barber_id: str) -> bool:
+        return self.barber_id == "any" or self.barber_id == barber_id
+
+
+class _Bucket:
+    """The Waiting entries of one (shop, date), as sorted parallel arrays."""
+
+    __slots__ = ("keys", "durations", "entries")
+
+    def __init__(self):
+        self.keys: List[tuple] = []
+        self.durations: List[int] = []           # Same order as `keys`, used for bisecting
+        self.entries: List[_WaitingEntry] = []
+
+    def add(self, entry: _WaitingEntry):
+        position = bisect_left(self.keys, entry.key)
+        self.keys.insert(position, entry.key)
+        self.durations.insert(position, entry.duration)
+        self.entries.insert(position, entry)
+
+    def remove(self, entry: _WaitingEntry):
+        position = bisect_left(self.keys, entry.key)
+        if position < len(self.keys) and self.keys[position] == entry.key:
+            del self.keys[position]
+            del self.durations[position]
+            del self.entries[position]
+
+    def best_fit(self, gap_minutes: int, barber_id: str, exclude: Set[str]) -> Optional[_WaitingEntry]:
+        """
+        The longest entry that still fits the gap (the least idle time left
+        over), earliest registration first among equal durations. A bisect
+        finds the longest fitting duration; only entries that cannot take
+        this barber are stepped over.
+        """
+        high = bisect_right(self.durations, gap_minutes)
+        while high > 0:
+            low = bisect_left(self.durations, self.durations[high - 1])
+            for entry in self.entries[low:high]:
+                if entry.accepts(barber_id) and entry.entry_id not in exclude:
+                    return entry
+            high = low
+        return None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class Waitlist:
+    """
+    Customers waiting for a slot to open up at a shop (optionally with one
+    barber) on any day of a date window. Registrations live in
+    COLLECTION_WAITLIST; the Waiting ones are also held in memory, bucketed
+    by (shop, date) and sorted by duration, so a cancellation finds its best
+    candidates with a bisect instead of a scan.
+
+    When an appointment is cancelled, the free block it leaves behind is
+    refilled from the front: the best-fitting entry is offered the slot (or
+    booked into it, if it registered with auto_book), and the rest of the
+    block goes to the next best fit, until nothing else fits. An offer that
+    is not accepted within WAITLIST_OFFER_MINUTES returns the entry to the
+    waitlist and the slot goes to the next in line. Offers do not hold the
+    slot; accepting one runs the normal double-booking check.
+
+    Offers are only ever made by one worker per host, the owner, elected
+    with a host-wide lock like the snapshot refresher, and only from its
+    background loop, one backfill at a time. The loop sweeps Appwrite for
+    cancellations every WAITLIST_SWEEP_SECONDS (at once for the owner's
+    own), and releases expired offers and rebuilds the index every
+    WAITLIST_RECONCILE_SECONDS. With a single writer of offers, one entry
+    cannot be handed two slots; a deployment spread over several hosts must
+    enable the waitlist on one host only. Registering, withdrawing and
+    accepting work on any worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._buckets: Dict[Tuple[str, str], _Bucket] = {}
+        self._waiting: Dict[str, _WaitingEntry] = {}
+        self._rebuilding = False
+        self._writes_during_rebuild: List[dict] = []
+        # One backfill at a time per barber and day, so two cancellations don't offer the same minutes
+        self._gap_locks: "weakref.WeakValueDictionary[tuple, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._sweep_requested = asyncio.Event()
+        self.last_reconciled_at: Optional[datetime] = None
+        self.is_owner = False
+        self._owner_lock_file = None
+        # (appointment ID, $updatedAt) of cancellations already backfilled
+        self._handled: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._sweep_since: Optional[str] = None
+        self.counters = {"registered": 0, "backfills": 0, "offered": 0, "auto_booked": 0, "accepted": 0, "expired_offers": 0}
+
+    # --- In-memory Index ---
+
+    def apply(self, document: dict):
+        """Brings the index in line with a written registration."""
+        with self._lock:
+            if self._rebuilding:
+                self._writes_during_rebuild.append(document)
+            self._apply_locked(document)
+
+    def _apply_locked(self, document: dict):
+        self._remove_locked(document['$id'])
+        if document.get('status') != WAITING:
+            return
+        first_day = max(document['date_from'], _today().strftime("%Y-%m-%d"))
+        dates = []
+        day = datetime.strptime(first_day, "%Y-%m-%d").date()
+        while day.strftime("%Y-%m-%d") <= document['date_to']:
+            dates.append(day.strftime("%Y-%m-%d"))
+            day += timedelta(days=1)
+        if not dates:
+            return
+        entry = _WaitingEntry(document, dates)
+        self._waiting[entry.entry_id] = entry
+        for date_str in dates:
+            self._buckets.setdefault((entry.shop_id, date_str), _Bucket()).add(entry)
+
+    def _remove_locked(self, entry_id: str) -> Optional[_WaitingEntry]:
+        entry = self._waiting.pop(entry_id, None)
+        if entry is None:
+            return None
+        for date_str in entry.dates:
+            bucket = self._buckets.get((entry.shop_id, date_str))
+            if bucket is None:
+                continue
+            bucket.remove(entry)
+            if not bucket:
+                del self._buckets[(entry.shop_id, date_str)]
+        return entry
+
+    def _claim_best_fit(self, shop_id: str, date_str: str, barber_id: str, gap_minutes: int, exclude: Set[str]) -> Optional[_WaitingEntry]:
+        """Takes the best-fitting entry out of the index, so no other backfill offers it too."""
+        with self._lock:
+            bucket = self._buckets.get((shop_id, date_str))
+            entry = bucket.best_fit(gap_minutes, barber_id, exclude) if bucket else None
+            if entry is not None:
+                self._remove_locked(entry.entry_id)
+            return entry
+
+    def _restore(self, entry: _WaitingEntry):
+        """
+        Puts a claimed entry back into the index, unless a newer copy got there
+        first. Safe even if it has left Waiting meanwhile: _fill re-reads the
+        registration before using it, and the reconciler drops it.
+        """
+        with self._lock:
+            if entry.entry_id in self._waiting:
+                return
+            self._waiting[entry.entry_id] = entry
+            for date_str in entry.dates:
+                self._buckets.setdefault((entry.shop_id, date_str), _Bucket()).add(entry)
+
+    def has_waiting(self, shop_id: str, date_str: str) -> bool:
+        with self._lock:
+            return (shop_id, date_str) in self._buckets
+
+    # --- Registrations ---
+
+    async def register(self, registration: schemas.WaitlistCreate) -> dict:
+        try:
+            date_from = datetime.strptime(registration.date_from, "%Y-%m-%d").date()
+            date_to = datetime.strptime(registration.date_to, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Please use YYYY-MM-DD.")
+        if date_to < date_from:
+            raise HTTPException(status_code=400, detail="'date_to' must not be before 'date_from'.")
+        if date_to < _today():
+            raise HTTPException(status_code=400, detail="The date window has already passed.")
+        if (date_to - date_from).days + 1 > WAITLIST_MAX_WINDOW_DAYS:
+            raise HTTPException(status_code=400, detail=f"The date window cannot exceed {WAITLIST_MAX_WINDOW_DAYS} days.")
+
+        duration = sum(service.duration for service in registration.service_snapshots)
+        if duration <= 0:
+            raise HTTPException(status_code=400, detail="Duration must be a positive number.")
+        barber_id = registration.barber_id
+        if barber_id.lower() == "any":
+            barber_id = "any"
+        elif not any(barber['$id'] == barber_id for barber in reference_cache.barbers(shop_id=registration.shop_id)):
+            raise HTTPException(status_code=400, detail="This barber does not work at the selected shop.")
+
+        document = await backend.create_document(
+            database_id=APPWRITE_DATABASE_ID,
+            collection_id=COLLECTION_WAITLIST,
+            document_id='unique()',
+            data={
+                "customer_name": registration.customer_name,
+                "customer_phone": registration.customer_phone,
+                "customer_gender": registration.customer_gender,
+                "shop_id": registration.shop_id,
+                "shop_name": registration.shop_name,
+                "barber_id": barber_id,
+                "barber_name": registration.barber_name,
+                "date_from": date_from.strftime("%Y-%m-%d"),
+                "date_to": date_to.strftime("%Y-%m-%d"),
+                "duration": duration,
+                "services_snapshot": json.dumps([service.dict() for service in registration.service_snapshots]),
+                "tax_rate": registration.tax_rate,
+                "auto_book": registration.auto_book,
+                "status": WAITING,
+            }
+        )
+        self.apply(document)
+        self.counters["registered"] += 1
+        return document
+
+    async def get(self, entry_id: str, allow_stale: bool = True) -> dict:
+        try:
+            return await backend.get_document(
+                database_id=APPWRITE_DATABASE_ID,
+                collection_id=COLLECTION_WAITLIST,
+                document_id=entry_id,
+                allow_stale=allow_stale
+            )
+        except Exception as e:
+            if _is_not_found(e):
+                raise HTTPException(status_code=404, detail=f"Waitlist entry with ID {entry_id} not found.")
+            raise
+
+    async def _update(self, entry_id: str, data: dict) -> dict:
+        document = await backend.update_document(
+            database_id=APPWRITE_DATABASE_ID,
+            collection_id=COLLECTION_WAITLIST,
+            document_id=entry_id,
+            data=data
+        )
+        self.apply(document)
+        return document
+
+    async def withdraw(self, entry_id: str) -> dict:
+        document = await self.get(entry_id)
+        if document['status'] == BOOKED:
+            raise HTTPException(status_code=409, detail="This waitlist entry has already been booked.")
+        if document['status'] == WITHDRAWN:
+            return document
+        return await self._update(entry_id, {"status": WITHDRAWN})
+
+    async def accept(self, entry_id: str) -> dict:
+        """
+        Books the slot offered to the entry. If someone else took the slot in
+        the meantime, the entry goes back on the waitlist and a 409 is raised.
+        """
+        document = await self.get(entry_id, allow_stale=False)
+        if document['status'] != OFFERED:
+            raise HTTPException(status_code=409, detail="This waitlist entry has no open offer.")
+        if datetime.fromisoformat(document['offer_expires_at'].replace('Z', '+00:00')) <= datetime.now(timezone.utc):
+            raise HTTPException(status_code=409, detail="The offer has expired.")
+
+        start = parse_iso_to_datetime(document['offer_start_time'])
+        try:
+            appointment = await book_appointment(
+                _appointment_request(document, document['offer_barber_id'], document['offer_barber_name'], start)
+            )
+        except HTTPException as e:
+            if e.status_code == 409:
+                await self._update(entry_id, _BACK_TO_WAITING)
+                raise HTTPException(status_code=409, detail="The offered slot has just been booked. You are back on the waitlist.")
+            raise
+
+        await self._update(entry_id, {"status": BOOKED, "appointment_id": appointment['$id']})
+        self.counters["accepted"] += 1
+        return appointment
+
+    # --- Backfill ---
+
+    def on_cancelled(self, appointment: dict):
+        """
+        Called by the status-update paths after an appointment is cancelled.
+        On the owner it starts the next sweep right away; elsewhere the
+        owner's regular sweep picks the cancellation up. Either way the
+        cancellation itself is not held up.
+        """
+        if WAITLIST_ENABLED and self.is_owner:
+            self._sweep_requested.set()
+
+    def _mark_handled(self, appointment: dict) -> bool:
+        """Remembers a cancellation as backfilled. False if it already was."""
+        key = (appointment['$id'], appointment.get('$updatedAt') or "")
+        if key in self._handled:
+            return False
+        self._handled[key] = None
+        while len(self._handled) > HANDLED_CANCELLATIONS:
+            self._handled.popitem(last=False)
+        return True
+
+    async def sweep_cancellations(self):
+        """
+        The owner's poll for appointments cancelled since the last sweep
+        (through any worker) whose slot has not ended yet, each backfilled
+        once and one at a time.
+        """
+        if self._sweep_since is None:
+            # Taking over: look back far enough to cover the previous owner's last round
+            self._sweep_since = (datetime.now(timezone.utc) - timedelta(seconds=2 * WAITLIST_SWEEP_SECONDS)).isoformat()
+        queries = [
+            Query.equal("status", ["Cancelled"]),
+            Query.greater_than_equal("$updatedAt", self._sweep_since),
+            Query.greater_than("end_time", datetime.now(timezone.utc).isoformat()),
+            Query.order_asc("$updatedAt"),
+        ]
+        cancelled = []
+        since = self._sweep_since
+        async for page in stream_appointments(queries):
+            # Inclusive range: rows at the watermark come back once more and are skipped here
+            cancelled.extend(
+                appointment for appointment in page
+                if appointment.get('start_time') and self._mark_handled(appointment)
+            )
+            since = page[-1]['$updatedAt']
+        if cancelled:
+            # The cancellations and the entries registered through other
+            # workers are not in this worker's indexes yet.
+            for appointment in cancelled:
+                appointment_index.apply(appointment)
+            await asyncio.to_thread(self.rebuild)
+            for appointment in cancelled:
+                record = AppointmentRecord.from_document(appointment)
+                await self._backfill(
+                    appointment.get('shop_id'), record.barber_id, appointment.get('barber_name'), record.start, record.end, exclude=set()
+                )
+        self._sweep_since = since
+
+    def _gap_lock(self, barber_id: str, date_str: str) -> asyncio.Lock:
+        key = (barber_id, date_str)
+        lock = self._gap_locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._gap_locks[key] = lock
+        return lock
+
+    async def _backfill(self, shop_id: str, barber_id: str, barber_name: Optional[str], freed_start: int, freed_end: int, exclude: Set[str]):
+        """Refills the free block around [freed_start, freed_end) with best-fitting entries."""
+        try:
+            day = minute_to_datetime(freed_start).date()
+            date_str = day.strftime("%Y-%m-%d")
+            if freed_end <= _now_minute() or not self.has_waiting(shop_id, date_str):
+                return
+            self.counters["backfills"] += 1
+
+            async with self._gap_lock(barber_id, date_str):
+                gap = await _free_block_around(shop_id, barber_id, day, freed_start)
+                if gap is None:
+                    return
+                gap_start, gap_end = gap
+                now_minute = _now_minute()
+                if gap_start < now_minute:
+                    # Stay on the block's slot grid, like slots_from_free_blocks
+                    gap_start += -(-(now_minute - gap_start) // SLOT_INTERVAL_MINUTES) * SLOT_INTERVAL_MINUTES
+
+                while gap_end > gap_start:
+                    entry = self._claim_best_fit(shop_id, date_str, barber_id, gap_end - gap_start, exclude)
+                    if entry is None:
+                        return
+                    try:
+                        filled = await self._fill(entry, barber_id, barber_name, gap_start)
+                    except Exception:
+                        # Don't lose a claimed entry to a backend error; the next backfill re-checks it
+                        self._restore(entry)
+                        raise
+                    if filled is None:
+                        return
+                    if filled:
+                        gap_start += entry.duration
+        except Exception as e:
+            print(f"Waitlist backfill failed for barber {barber_id}: {e}")
+
+    async def _fill(self, entry: _WaitingEntry, barber_id: str, barber_name: Optional[str], start_minute: int) -> Optional[bool]:
+        """
+        Offers (or books) the slot to an entry already taken out of the index.
+        Returns True if the slot was filled, False if the entry was no longer
+        waiting, and None if the slot turned out to be taken (the entry is put
+        back and the backfill stops).
+        """
+        # Must be current: a stale "Waiting" could hand one entry two slots
+        document = await self.get(entry.entry_id, allow_stale=False)
+        if document['status'] != WAITING:
+            # Withdrawn, or offered a slot by another worker
+            self.apply(document)
+            return False
+
+        start = minute_to_datetime(start_minute)
+        if document.get('auto_book'):
+            try:
+                appointment = await book_appointment(_appointment_request(document, barber_id, barber_name, start))
+            except HTTPException as e:
+                print(f"Waitlist entry {entry.entry_id} could not be booked at {start}: {e.detail}")
+                self.apply(document)
+                return None
+            await self._update(entry.entry_id, {"status": BOOKED, "appointment_id": appointment['$id']})
+            await customer_profiles.record_visit(appointment)
+            self.counters["auto_booked"] += 1
+            print(f"Waitlist entry {entry.entry_id} booked into appointment {appointment['$id']} at {start}.")
+            return True
+
+        utc_start = start.replace(tzinfo=TARGET_TIMEZONE).astimezone(timezone.utc)
+        await self._update(entry.entry_id, {
+            "status": OFFERED,
+            "offer_barber_id": barber_id,
+            "offer_barber_name": barber_name,
+            "offer_start_time": utc_start.isoformat(),
+            "offer_expires_at": (datetime.now(timezone.utc) + timedelta(minutes=WAITLIST_OFFER_MINUTES)).isoformat(),
+        })
+        self.counters["offered"] += 1
+        print(f"Waitlist entry {entry.entry_id} offered {start} with barber {barber_id}.")
+        return True
+
+    # --- Warm-up & Reconciliation (Appwrite is the source of truth) ---
+
+    def rebuild(self):
+        """Loads every Waiting registration whose window has not passed and swaps it in."""
+        with self._lock:
+            self._rebuilding = True
+            self._writes_during_rebuild = []
+
+        try:
+            documents = []
+            last_id = None
+            while True:
+                queries = [
+                    Query.equal("status", [WAITING]),
+                    Query.greater_than_equal("date_to", _today().strftime("%Y-%m-%d")),
+                    Query.limit(WARM_PAGE_SIZE),
+                ]
+                if last_id:
+                    queries.append(Query.cursor_after(last_id))
+                response = databases.list_documents(
+                    database_id=APPWRITE_DATABASE_ID,
+                    collection_id=COLLECTION_WAITLIST,
+                    queries=queries
+                )
+                page = response['documents']
+                documents.extend(page)
+                if len(page) < WARM_PAGE_SIZE:
+                    break
+                last_id = page[-1]['$id']
+        except Exception:
+            with self._lock:
+                self._rebuilding = False
+                self._writes_during_rebuild = []
+            raise
+
+        fresh = Waitlist()
+        for document in documents:
+            fresh._apply_locked(document)
+
+        with self._lock:
+            self._buckets = fresh._buckets
+            self._waiting = fresh._waiting
+            for document in self._writes_during_rebuild:
+                self._apply_locked(document)
+            self._writes_during_rebuild = []
+            self._rebuilding = False
+            self.last_reconciled_at = datetime.now(timezone.utc)
+
+        print(f"Waitlist index rebuilt with {len(self._waiting)} waiting entries.")
+
+    async def release_expired_offers(self):
+        """Puts entries whose offer lapsed back on the waitlist and passes their slot on to the next in line."""
+        queries = [
+            Query.equal("status", [OFFERED]),
+            Query.less_than("offer_expires_at", datetime.now(timezone.utc).isoformat()),
+        ]
+        expired = []
+        async for page in stream_documents(COLLECTION_WAITLIST, queries):
+            expired.extend(page)
+
+        for document in expired:
+            await self._update(document['$id'], _BACK_TO_WAITING)
+            self.counters["expired_offers"] += 1
+            start = iso_to_minute(document['offer_start_time'])
+            await self._backfill(
+                document['shop_id'], document['offer_barber_id'], document.get('offer_barber_name'),
+                start, start + int(document['duration']), exclude={document['$id']}
+            )
+
+    def try_become_owner(self) -> bool:
+        """Elects this process as the host's waitlist owner if no other process holds the lock."""
+        if self.is_owner:
+            return True
+        lock_path = host_file_path("waitlist-owner", "lock") if fcntl is not None else None
+        if lock_path is None:
+            # Nothing to elect with: run as the owner, as a single worker would
+            print("No host-wide lock available; this process makes waitlist offers on its own.")
+            self.is_owner = True
+            return True
+        if self._owner_lock_file is None:
+            self._owner_lock_file = os.fdopen(os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600), "a+b")
+        try:
+            fcntl.flock(self._owner_lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self.is_owner = True
+        print(f"Process {os.getpid()} is the waitlist owner.")
+        return True
+
+    async def run_reconciler(self):
+        """
+        Background loop run by every worker; only the owner does anything.
+        It loads the index, then sweeps for cancellations, and every
+        WAITLIST_RECONCILE_SECONDS releases expired offers and rebuilds the
+        index. Started outside the warm-up, so a missing or unreachable
+        waitlist collection never holds up readiness; a failed round is
+        simply retried.
+        """
+        next_reconcile = 0.0
+        while True:
+            try:
+                if self.try_become_owner():
+                    if time.monotonic() >= next_reconcile:
+                        if self.last_reconciled_at is not None:
+                            await self.release_expired_offers()
+                        await asyncio.to_thread(self.rebuild)
+                        next_reconcile = time.monotonic() + WAITLIST_RECONCILE_SECONDS
+                    await self.sweep_cancellations()
+            except Exception as e:
+                print(f"Waitlist reconciliation failed: {e}")
+            try:
+                await asyncio.wait_for(self._sweep_requested.wait(), timeout=WAITLIST_SWEEP_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._sweep_requested.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": WAITLIST_ENABLED,
+                "is_owner": self.is_owner,
+                "waiting": len(self._waiting),
+                "buckets": len(self._buckets),
+                "last_reconciled_at": self.last_reconciled_at.isoformat() if self.last_reconciled_at else None,
+                "counters": dict(self.counters),
+            }
+
+
+_BACK_TO_WAITING = {
+    "status": WAITING,
+    "offer_barber_id": None,
+    "offer_barber_name": None,
+    "offer_start_time": None,
+    "offer_expires_at": None,
+}
+
+
+def _appointment_request(document: dict, barber_id: str, barber_name: Optional[str], start: datetime) -> schemas.AppointmentCreate:
+    """The booking request for a waitlist entry placed at `start` (naive local time)."""
+    return schemas.AppointmentCreate(
+        customer_name=document['customer_name'],
+        customer_phone=document['customer_phone'],
+        customer_gender=document.get('customer_gender'),
+        shop_id=document['shop_id'],
+        shop_name=document['shop_name'],
+        barber_id=barber_id,
+        barber_name=barber_name or "",
+        start_time=start,
+        service_snapshots=json.loads(document.get('services_snapshot') or "[]"),
+        tax_rate=document.get('tax_rate') or 0,
+    )
+
+
+async def _free_block_around(shop_id: str, barber_id: str, day: date, minute: int) -> Optional[Tuple[int, int]]:
+    """The barber's free block (in minutes) containing `minute`, or None if it is not free."""
+    day_of_week = day.strftime("%A")
+    schedule = next(iter(reference_cache.schedules(barber_id=barber_id, day_of_week=day_of_week)), None)
+    timing = next(iter(reference_cache.shop_timings(shop_id, day_of_week)), None)
+    window = working_window(schedule, timing, day)
+    if window is None:
+        return None
+
+    if appointment_index.covers(*window):
+        free_blocks = appointment_index.free_blocks(barber_id, *window)
+    else:
+        day_start = datetime.combine(day, datetime.min.time()).replace(tzinfo=TARGET_TIMEZONE)
+        queries = [
+            Query.equal("barber_id", [barber_id]),
+            Query.not_equal("status", ["Cancelled"]),
+            Query.greater_than_equal("start_time", day_start.astimezone(timezone.utc).isoformat()),
+            Query.less_than("start_time", (day_start + timedelta(days=1)).astimezone(timezone.utc).isoformat()),
+        ]
+        records = []
+        async for page in stream_appointments(queries):
+            records.extend(AppointmentRecord.from_document(appointment) for appointment in page)
+        records.sort(key=lambda record: record.start)
+        free_blocks = free_blocks_between(*window, records)
+
+    for block_start, block_end in free_blocks:
+        start, end = minute_of(block_start), minute_of(block_end)
+        if start <= minute < end:
+            return start, end
+    return None
+
+
+# A single, process-wide waitlist shared by the routers.
+waitlist = Waitlist()
@@ -1,21 +1,110 @@
 # backend/main.py
 
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
 from typing import List
 from appwrite.query import Query
 from fastapi.middleware.cors import CORSMiddleware
 # Import schemas and appwrite_client as before
 
-from routers import booking, manager, owner 
+from routers import booking, manager, owner, admin
+from appwrite_client import databases, init_backend, close_backend, APPWRITE_DATABASE_ID, COLLECTION_SHOPS
+from reference_cache import reference_cache
+from shared_snapshot import shared_snapshot, SNAPSHOT_ENABLED
+from logic.appointment_index import appointment_index
+from logic.precompute import availability_precompute, PRECOMPUTE_ENABLED
+from logic.waitlist import waitlist, WAITLIST_ENABLED
+from resilience import backend
+from admission import AdmissionControlMiddleware
+from profiling import ProfilingMiddleware
 
+# How long a /ready result is reused, so frequent probes don't each hit Appwrite
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "5"))
+# How long to wait before retrying a failed warm-up
+WARM_UP_RETRY_SECONDS = float(os.getenv("WARM_UP_RETRY_SECONDS", "10"))
+
+# Process-wide warm-up state reported by /ready
+warm_up_state = {"is_warm": False, "warmed_at": None, "last_error": None}
+_readiness_cache = {"checked_at": 0.0, "status_code": 503, "body": None}
+
+
+def warm_up():
+    """
+    Opens the pooled Appwrite connections and pre-loads the reference cache
+    and the appointment index. Runs in a worker thread during startup. (The
+    waitlist loads itself in the background and is not part of readiness.)
+    """
+    init_backend()
+    # A retry only redoes the steps that have not succeeded yet
+    if not reference_cache.is_warm:
+        reference_cache.warm()
+    if not appointment_index.is_warm:
+        appointment_index.rebuild()
+
+
+async def warm_up_until_ready():
+    """Retries a failed warm-up in the background until it succeeds."""
+    while not warm_up_state["is_warm"]:
+        await asyncio.sleep(WARM_UP_RETRY_SECONDS)
+        try:
+            await asyncio.to_thread(warm_up)
+            warm_up_state.update(is_warm=True, warmed_at=time.time(), last_error=None)
+            print("Warm-up succeeded on retry.")
+        except Exception as e:
+            warm_up_state["last_error"] = str(e)
+            print(f"Warm-up retry failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # --- Warm-up Phase ---
+    # Uvicorn does not accept connections until this completes, so a new
+    # worker only takes traffic once its caches are loaded.
+    background_tasks = []
+    try:
+        await asyncio.to_thread(warm_up)
+        warm_up_state.update(is_warm=True, warmed_at=time.time(), last_error=None)
+    except Exception as e:
+        # Serve anyway (logic falls back to Appwrite queries) but report not-ready
+        warm_up_state["last_error"] = str(e)
+        print(f"Warm-up failed, will retry in the background: {e}")
+        background_tasks.append(asyncio.create_task(warm_up_until_ready()))
+
+    background_tasks.append(asyncio.create_task(appointment_index.run_reconciler()))
+    if WAITLIST_ENABLED:
+        background_tasks.append(asyncio.create_task(waitlist.run_reconciler()))
+    if PRECOMPUTE_ENABLED:
+        # Runs now, after each local midnight and whenever schedules change
+        background_tasks.append(asyncio.create_task(availability_precompute.run()))
+    if SNAPSHOT_ENABLED:
+        # Every worker runs the loop; only the one holding the host lock refreshes.
+        background_tasks.append(asyncio.create_task(shared_snapshot.run_refresher(reference_cache.fetch_all)))
+
+    yield
+
+    # --- Shutdown Phase ---
+    for task in background_tasks:
+        task.cancel()
+    close_backend()
 
 
 app = FastAPI(
     title="Barber Shop API",
     description="Backend API for the Barber Shop Appointment System",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
+# Profiling sits innermost, so time spent queued for admission is not in the profile
+app.add_middleware(ProfilingMiddleware)
+
+# Admission control sits inside CORS, so shed 429/503 responses still carry CORS headers
+app.add_middleware(AdmissionControlMiddleware)
+
 origins = ["*"] 
 
 app.add_middleware(
@@ -24,6 +113,7 @@ app.add_middleware(
     allow_credentials=True,         # Allow cookies to be included in cross-origin requests
     allow_methods=["*"],            # Allow all standard HTTP methods (GET, POST, PUT, DELETE, PATCH, OPTIONS)
     allow_headers=["*"],            # Allow all headers to be sent in cross-origin requests
+    expose_headers=["X-Next-Cursor", "X-Watermark", "X-Profile-Id", "Idempotent-Replayed"], # Let clients read the pagination cursor, sync watermark, profile ID and replay flag
 )
 
 # --- Include API Routers ---
@@ -31,6 +121,7 @@ app.add_middleware(
 app.include_router(booking.router)
 app.include_router(manager.router)
 app.include_router(owner.router)
+app.include_router(admin.router)
 
 # --- API Endpoints ---
 @app.get("/")
@@ -40,3 +131,43 @@ async def read_root():
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "message": "API is healthy"}
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Deep readiness probe: pings Appwrite and reports backend latency and the
+    warm state of the in-memory caches. Returns 503 until the worker is warm.
+    The result is cached briefly so probes themselves stay cheap.
+    """
+    now = time.monotonic()
+    if _readiness_cache["body"] is not None and now - _readiness_cache["checked_at"] < READINESS_CACHE_SECONDS:
+        return JSONResponse(status_code=_readiness_cache["status_code"], content=_readiness_cache["body"])
+
+    backend_ok = True
+    backend_error = None
+    ping_started = time.perf_counter()
+    try:
+        await asyncio.to_thread(
+            databases.list_documents,
+            database_id=APPWRITE_DATABASE_ID,
+            collection_id=COLLECTION_SHOPS,
+            queries=[Query.limit(1)]
+        )
+    except Exception as e:
+        backend_ok = False
+        backend_error = str(e)
+    backend_latency_ms = round((time.perf_counter() - ping_started) * 1000, 1)
+
+    breaker_state = backend.breaker.state
+    is_ready = backend_ok and breaker_state != "open" and warm_up_state["is_warm"] and appointment_index.is_warm
+    body = {
+        "status": "ready" if is_ready else "not_ready",
+        "backend": {"ok": backend_ok, "latency_ms": backend_latency_ms, "error": backend_error, "breaker": breaker_state},
+        "warm_up": warm_up_state,
+        "reference_cache": {"is_warm": reference_cache.is_warm, **reference_cache.stats()},
+        "appointment_index": appointment_index.stats(),
+    }
+    status_code = 200 if is_ready else 503
+
+    _readiness_cache.update(checked_at=now, status_code=status_code, body=body)
+    return JSONResponse(status_code=status_code, content=body)
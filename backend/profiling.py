@@ -0,0 +1,241 @@
+# backend/profiling.py
+
+import hashlib
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+# --- Profiling Configuration ---
+# Requests carrying a valid X-Profile header signed with this secret are profiled.
+# Empty disables header-triggered profiling. Generate a header value with:
+#   python -c "from profiling import sign_profile_request; print(sign_profile_request())"
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+# How long a signed X-Profile header stays valid
+PROFILING_SIGNATURE_MAX_AGE_SECONDS = int(os.getenv("PROFILING_SIGNATURE_MAX_AGE_SECONDS", "300"))
+# Share of ordinary requests profiled at random (0 = off, 0.01 = 1%)
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+# Randomly sampled profiles are only kept when the request was at least this slow
+PROFILING_SLOW_MS = float(os.getenv("PROFILING_SLOW_MS", "500"))
+# How often the stacks of every thread are sampled while a profile is running
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+# How many captured profiles are kept (oldest are dropped)
+PROFILING_MAX_PROFILES = int(os.getenv("PROFILING_MAX_PROFILES", "50"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ADMIN_PREFIX = "/api/admin"
+
+
+def sign_profile_request(timestamp: Optional[int] = None, secret: str = PROFILING_SECRET) -> str:
+    """Builds an X-Profile header value: "<unix timestamp>.<hex HMAC-SHA256 of the timestamp>"."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(secret.encode(), str(timestamp).encode(), hashlib.sha256).hexdigest()
+    return f"{timestamp}.{signature}"
+
+
+def verify_profile_header(value: str, secret: str = PROFILING_SECRET) -> bool:
+    if not secret:
+        return False
+    try:
+        timestamp_text, signature = value.split(".", 1)
+        timestamp = int(timestamp_text)
+    except ValueError:
+        return False
+    if abs(time.time() - timestamp) > PROFILING_SIGNATURE_MAX_AGE_SECONDS:
+        return False
+    expected = hmac.new(secret.encode(), timestamp_text.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def strip_query_values(query: str) -> str:
+    """Keeps a query string's parameter names but drops their values (phone numbers, names, ...)."""
+    return "&".join(f"{parameter.split('=', 1)[0]}=" for parameter in query.split("&") if parameter)
+
+
+def _collapse(frame, thread_name: str) -> str:
+    """One stack as a collapsed line prefix: "thread;outer;...;inner"."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class ProfileSession:
+    """The samples collected while one request was in flight."""
+
+    def __init__(self, profile_id: str, method: str, path: str, query: str, trigger: str):
+        self.profile_id = profile_id
+        self.method = method
+        self.path = path
+        self.query = query
+        self.trigger = trigger
+        self.started_at = time.time()
+        # Guards samples: the sampler thread may still add to a session that is being downloaded
+        self._lock = threading.Lock()
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.duration_ms = 0.0
+        self.status_code: Optional[int] = None
+
+    def add_sample(self, stacks: List[str]):
+        with self._lock:
+            self.samples.update(stacks)
+            self.sample_count += 1
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format, readable by flamegraph.pl and speedscope."""
+        with self._lock:
+            samples = self.samples.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in samples)
+
+    def summary(self) -> dict:
+        return {
+            "profile_id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "trigger": self.trigger,
+            "status_code": self.status_code,
+            "duration_ms": round(self.duration_ms, 1),
+            "samples": self.sample_count,
+            "captured_at": self.started_at,
+        }
+
+
+class SamplingProfiler:
+    """
+    A wall-clock sampling profiler. While at least one profiled request is in
+    flight, a daemon thread snapshots the stack of every thread each
+    PROFILING_INTERVAL_MS and adds it to every active session. That covers
+    both the event loop and the worker threads running Appwrite calls.
+    Concurrent requests show up in each other's profiles, which is expected
+    of a process-wide sampler.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Dict[str, ProfileSession] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._sequence = itertools.count(1)
+        self.profiles: "OrderedDict[str, ProfileSession]" = OrderedDict()
+        self.counters = {"profiled": 0, "saved": 0, "discarded": 0}
+
+    def start(self, method: str, path: str, query: str, trigger: str) -> ProfileSession:
+        session = ProfileSession(f"{os.getpid()}-{next(self._sequence)}", method, path, query, trigger)
+        with self._lock:
+            self._active[session.profile_id] = session
+            self.counters["profiled"] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._thread.start()
+        return session
+
+    def finish(self, session: ProfileSession, duration_ms: float, status_code: Optional[int], keep: bool):
+        session.duration_ms = duration_ms
+        session.status_code = status_code
+        with self._lock:
+            self._active.pop(session.profile_id, None)
+            if not keep:
+                self.counters["discarded"] += 1
+                return
+            self.profiles[session.profile_id] = session
+            self.counters["saved"] += 1
+            while len(self.profiles) > PROFILING_MAX_PROFILES:
+                self.profiles.popitem(last=False)
+        print(f"Saved profile {session.profile_id}: {session.method} {session.path} took {duration_ms:.0f}ms ({session.sample_count} samples).")
+
+    def _sample_loop(self):
+        interval = PROFILING_INTERVAL_MS / 1000
+        own_ident = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                sessions = list(self._active.values())
+
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                _collapse(frame, thread_names.get(ident, f"thread-{ident}"))
+                for ident, frame in sys._current_frames().items()
+                if ident != own_ident
+            ]
+            for session in sessions:
+                session.add_sample(stacks)
+            time.sleep(interval)
+
+    def get(self, profile_id: str) -> Optional[ProfileSession]:
+        with self._lock:
+            return self.profiles.get(profile_id)
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            return [session.summary() for session in reversed(self.profiles.values())]
+
+    def stats(self) -> dict:
+        return {
+            "header_trigger_enabled": bool(PROFILING_SECRET),
+            "sample_rate": PROFILING_SAMPLE_RATE,
+            "slow_ms": PROFILING_SLOW_MS,
+            "interval_ms": PROFILING_INTERVAL_MS,
+            "active": len(self._active),
+            "stored": len(self.profiles),
+            "counters": dict(self.counters),
+        }
+
+
+profiler = SamplingProfiler()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles a request when it carries a valid signed
+    X-Profile header (always saved) or is picked by PROFILING_SAMPLE_RATE
+    (saved only if slower than PROFILING_SLOW_MS).
+    """
+
+    def __init__(self, app, sampler: SamplingProfiler = profiler):
+        self.app = app
+        self.sampler = sampler
+
+    async def __call__(self, scope, receive, send):
+        # The signed header also authorises the admin endpoints; don't profile those calls
+        if scope["type"] != "http" or scope["path"].startswith(PROFILE_ADMIN_PREFIX):
+            return await self.app(scope, receive, send)
+
+        trigger = None
+        header_value = next((value for name, value in scope["headers"] if name == PROFILE_HEADER), None)
+        if header_value is not None and verify_profile_header(header_value.decode("latin-1")):
+            trigger = "header"
+        elif PROFILING_SAMPLE_RATE and random.random() < PROFILING_SAMPLE_RATE:
+            trigger = "sampled"
+        if trigger is None:
+            return await self.app(scope, receive, send)
+
+        query = strip_query_values(scope.get("query_string", b"").decode("latin-1"))
+        session = self.sampler.start(scope["method"], scope["path"], query, trigger)
+        status_code = None
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if trigger == "header":
+                    message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", session.profile_id.encode())]}
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            keep = trigger == "header" or duration_ms >= PROFILING_SLOW_MS
+            self.sampler.finish(session, duration_ms, status_code, keep)
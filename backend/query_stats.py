@@ -0,0 +1,144 @@
+# backend/query_stats.py
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+# --- Query Statistics Configuration ---
+# Any single Appwrite call slower than this is logged
+SLOW_QUERY_MS = float(os.getenv("APPWRITE_SLOW_QUERY_MS", "500"))
+# How many recent slow calls are kept for the admin endpoint
+SLOW_LOG_SIZE = int(os.getenv("APPWRITE_SLOW_LOG_SIZE", "200"))
+# Latency samples kept per query shape for percentile estimates
+SHAPE_LATENCY_WINDOW = 500
+
+# Paging and ordering go last, in this order, so equivalent queries share a shape
+_TRAILING_METHODS = ["orderAsc", "orderDesc", "limit", "offset", "cursorAfter", "cursorBefore"]
+
+
+def _describe(query: str) -> str:
+    """One query with its values stripped: e.g. equal(barber_id), equal(barber_id, many), limit."""
+    try:
+        parsed = json.loads(query)
+    except (TypeError, ValueError):
+        return "?"
+    method = parsed.get("method", "?")
+    attribute = parsed.get("attribute")
+    if method in ("limit", "offset", "cursorAfter", "cursorBefore"):
+        return method
+    values = parsed.get("values") or []
+    if method == "equal" and len(values) > 1:
+        return f"{method}({attribute}, many)"
+    return f"{method}({attribute})" if attribute else method
+
+
+def fingerprint(operation: str, collection: str, queries: Optional[List[str]] = None) -> str:
+    """
+    Normalizes a call to its shape, so every call that differs only in its
+    values (IDs, dates, cursors) is counted together.
+    """
+    if operation != "list":
+        return f"{operation} {collection}"
+    described = [_describe(query) for query in queries or []]
+    filters = sorted(part for part in described if part.split("(")[0] not in _TRAILING_METHODS)
+    trailing = sorted(
+        (part for part in described if part.split("(")[0] in _TRAILING_METHODS),
+        key=lambda part: _TRAILING_METHODS.index(part.split("(")[0])
+    )
+    return f"list {collection} [{' & '.join(filters + trailing)}]"
+
+
+class _ShapeStats:
+    __slots__ = ("calls", "errors", "total_ms", "max_ms", "documents", "bytes", "latencies", "last_seen")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.documents = 0
+        self.bytes = 0
+        self.latencies = deque(maxlen=SHAPE_LATENCY_WINDOW)
+        self.last_seen = 0.0
+
+    def as_dict(self, shape: str) -> dict:
+        ordered = sorted(self.latencies)
+
+        def percentile(fraction):
+            return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1) if ordered else None
+
+        return {
+            "shape": shape,
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 1),
+            "avg_ms": round(self.total_ms / self.calls, 1) if self.calls else None,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(self.max_ms, 1),
+            "documents": self.documents,
+            "avg_documents": round(self.documents / self.calls, 1) if self.calls else None,
+            "bytes": self.bytes,
+            "last_seen": self.last_seen,
+        }
+
+
+class QueryStats:
+    """
+    Per-shape counters for every Appwrite Databases call: count, errors,
+    latency percentiles, documents returned and response bytes, plus a log
+    of recent calls slower than SLOW_QUERY_MS. Shapes with a high total time
+    point at missing Appwrite indexes; a shape called many times per request
+    points at an N+1 pattern.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shapes: Dict[str, _ShapeStats] = {}
+        self.slow_log = deque(maxlen=SLOW_LOG_SIZE)
+        self.started_at = time.time()
+
+    def record(self, shape: str, elapsed_ms: float, documents: int = 0, response_bytes: int = 0, error: Optional[str] = None):
+        with self._lock:
+            stats = self._shapes.get(shape)
+            if stats is None:
+                stats = self._shapes[shape] = _ShapeStats()
+            stats.calls += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.latencies.append(elapsed_ms)
+            stats.documents += documents
+            stats.bytes += response_bytes
+            stats.last_seen = time.time()
+            if error is not None:
+                stats.errors += 1
+
+        if elapsed_ms >= SLOW_QUERY_MS:
+            self.slow_log.append({
+                "shape": shape,
+                "elapsed_ms": round(elapsed_ms, 1),
+                "documents": documents,
+                "bytes": response_bytes,
+                "error": error,
+                "at": time.time(),
+            })
+            print(f"Slow Appwrite call ({elapsed_ms:.0f}ms, {documents} docs, {response_bytes} bytes): {shape}")
+
+    def table(self, sort_by: str = "total_ms", limit: int = 50) -> List[dict]:
+        with self._lock:
+            rows = [stats.as_dict(shape) for shape, stats in self._shapes.items()]
+        rows.sort(key=lambda row: row.get(sort_by) or 0, reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._shapes = {}
+            self.slow_log.clear()
+            self.started_at = time.time()
+
+
+query_stats = QueryStats()
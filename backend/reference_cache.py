@@ -0,0 +1,326 @@
+# backend/reference_cache.py
+
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from appwrite.query import Query
+
+from appwrite_client import (
+    databases,
+    APPWRITE_DATABASE_ID,
+    COLLECTION_SHOPS,
+    COLLECTION_SERVICES,
+    COLLECTION_BARBERS,
+    COLLECTION_SCHEDULES,
+    COLLECTION_SHOP_TIMINGS
+)
+from resilience import backend
+from shared_snapshot import shared_snapshot, SNAPSHOT_ENABLED
+
+# How long a loaded collection is served before it is fetched again.
+# Write endpoints invalidate the affected collection immediately.
+REFERENCE_CACHE_TTL_SECONDS = int(os.getenv("REFERENCE_CACHE_TTL_SECONDS", "300"))
+
+PAGE_SIZE = 100
+# The most IDs one batched lookup may ask for (Appwrite's limit on values in one query)
+MAX_IDS_PER_LOOKUP = 100
+
+# The small, read-mostly collections every request needs
+REFERENCE_COLLECTIONS = {
+    "shops": COLLECTION_SHOPS,
+    "services": COLLECTION_SERVICES,
+    "barbers": COLLECTION_BARBERS,
+    "schedules": COLLECTION_SCHEDULES,
+    "shop_timings": COLLECTION_SHOP_TIMINGS,
+}
+
+
+def fetch_all_documents(collection_id: str, queries: Optional[List[str]] = None) -> List[dict]:
+    """Pages through a whole collection with cursors and returns every document."""
+    documents = []
+    last_id = None
+    while True:
+        page_queries = list(queries or []) + [Query.limit(PAGE_SIZE)]
+        if last_id:
+            page_queries.append(Query.cursor_after(last_id))
+
+        response = databases.list_documents(
+            database_id=APPWRITE_DATABASE_ID,
+            collection_id=collection_id,
+            queries=page_queries
+        )
+        page = response['documents']
+        documents.extend(page)
+
+        if len(page) < PAGE_SIZE:
+            return documents
+        last_id = page[-1]['$id']
+
+
+async def fetch_all_documents_async(collection_id: str) -> List[dict]:
+    """fetch_all_documents through the resilient backend (retries, breaker), without blocking the event loop."""
+    documents = []
+    last_id = None
+    while True:
+        page_queries = [Query.limit(PAGE_SIZE)]
+        if last_id:
+            page_queries.append(Query.cursor_after(last_id))
+
+        response = await backend.list_documents(
+            database_id=APPWRITE_DATABASE_ID,
+            collection_id=collection_id,
+            queries=page_queries
+        )
+        page = response['documents']
+        documents.extend(page)
+
+        if len(page) < PAGE_SIZE:
+            return documents
+        last_id = page[-1]['$id']
+
+
+class ReferenceCache:
+    """
+    A TTL cache of the reference collections (shops, services, barbers,
+    schedules and shop timings). Each collection is loaded whole and filtered
+    in memory, which replaces many small per-request queries.
+
+    When the host-wide shared snapshot is enabled, collections are read from
+    it first, so only the elected refresher process queries Appwrite.
+
+    An expired or invalidated collection keeps being served while a single
+    background task refetches it, so no request waits on (or blocks the
+    event loop with) a reload. Only a collection never loaded is fetched inline.
+    """
+
+    def __init__(self, ttl_seconds: int = REFERENCE_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, List[dict]]] = {}
+        # name -> (the document list it was built from, documents by ID)
+        self._keyed: Dict[str, Tuple[List[dict], Dict[str, dict]]] = {}
+        self.counters = {"keyed_hits": 0, "keyed_misses": 0, "background_refreshes": 0, "write_refreshes": 0, "refresh_failures": 0}
+        # Collections with a refetch in flight, and the event loop that runs them
+        self._refreshing = set()
+        self._refresh_tasks = set()
+        # Bumped by every invalidate(), so a refetch that started before a write never overwrites its result
+        self._generations: Dict[str, int] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _collection(self, name: str) -> List[dict]:
+        if SNAPSHOT_ENABLED:
+            documents = shared_snapshot.read(name)
+            if documents is not None:
+                return documents
+
+        entry = self._entries.get(name)
+        if entry is None:
+            # Never loaded (warm-up failed): nothing to serve meanwhile
+            documents = fetch_all_documents(REFERENCE_COLLECTIONS[name])
+            with self._lock:
+                self._entries[name] = (time.monotonic(), documents)
+            return documents
+
+        if time.monotonic() - entry[0] >= self.ttl_seconds:
+            self._schedule_refresh(name)
+        return entry[1]
+
+    def _schedule_refresh(self, name: str):
+        """Starts a background refetch of the collection unless one is already running."""
+        try:
+            running = asyncio.get_running_loop()
+            self._loop = running
+        except RuntimeError:
+            running = None # Called from a worker thread; hand over to the loop seen last
+        with self._lock:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+
+        if running is not None:
+            task = running.create_task(self._refresh(name))
+            self._refresh_tasks.add(task)
+            task.add_done_callback(self._refresh_tasks.discard)
+        elif self._loop is not None and not self._loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self._refresh(name), self._loop)
+        else:
+            # No event loop yet (e.g. during warm-up): refresh inline
+            self._refresh_now(name)
+
+    async def _refresh(self, name: str):
+        generation = self._generations.get(name, 0)
+        try:
+            documents = await fetch_all_documents_async(REFERENCE_COLLECTIONS[name])
+            self._store(name, documents, generation)
+            self.counters["background_refreshes"] += 1
+        except Exception as e:
+            # Keep serving the previous copy; the next read tries again
+            self.counters["refresh_failures"] += 1
+            print(f"Serving stale '{name}' reference data after refresh failure: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(name)
+
+    def _refresh_now(self, name: str):
+        generation = self._generations.get(name, 0)
+        try:
+            self._store(name, fetch_all_documents(REFERENCE_COLLECTIONS[name]), generation)
+            self.counters["background_refreshes"] += 1
+        except Exception as e:
+            self.counters["refresh_failures"] += 1
+            print(f"Serving stale '{name}' reference data after refresh failure: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(name)
+
+    def _store(self, name: str, documents: List[dict], generation: int):
+        with self._lock:
+            if self._generations.get(name, 0) != generation:
+                return # Fetched before a write this worker has since refetched for
+            self._entries[name] = (time.monotonic(), documents)
+
+    # --- Lookups ---
+
+    def shops(self) -> List[dict]:
+        return self._collection("shops")
+
+    def services(self) -> List[dict]:
+        return self._collection("services")
+
+    def barbers(self, shop_id: Optional[str] = None) -> List[dict]:
+        barbers = self._collection("barbers")
+        if shop_id is None:
+            return barbers
+        return [barber for barber in barbers if barber['shop_id'] == shop_id]
+
+    def schedules(
+        self,
+        barber_id: Optional[str] = None,
+        shop_id: Optional[str] = None,
+        day_of_week: Optional[str] = None
+    ) -> List[dict]:
+        return [
+            schedule for schedule in self._collection("schedules")
+            if (barber_id is None or schedule['barber_id'] == barber_id)
+            and (shop_id is None or schedule.get('shop_id') == shop_id)
+            and (day_of_week is None or schedule['day_of_week'] == day_of_week)
+        ]
+
+    def shop_timings(self, shop_id: str, day_of_week: Optional[str] = None) -> List[dict]:
+        return [
+            timing for timing in self._collection("shop_timings")
+            if timing['shop_id'] == shop_id
+            and (day_of_week is None or timing['day_of_week'] == day_of_week)
+        ]
+
+    # --- Lookups by ID ---
+
+    def _by_id(self, name: str) -> Dict[str, dict]:
+        """The collection keyed by document ID, rebuilt whenever the collection is refetched."""
+        documents = self._collection(name)
+        keyed = self._keyed.get(name)
+        if keyed is None or keyed[0] is not documents:
+            keyed = (documents, {document['$id']: document for document in documents})
+            self._keyed[name] = keyed
+        return keyed[1]
+
+    async def get_many(self, name: str, document_ids: List[str]) -> List[dict]:
+        """
+        The documents with the given IDs, in the order asked for; unknown IDs
+        are left out. IDs the cache does not know yet (e.g. created by another
+        worker since the last refresh) are fetched in one batched query.
+        """
+        document_ids = list(dict.fromkeys(document_ids))
+        keyed = self._by_id(name)
+        missing = [document_id for document_id in document_ids if document_id not in keyed]
+        self.counters["keyed_hits"] += len(document_ids) - len(missing)
+        fetched = {}
+        if missing:
+            self.counters["keyed_misses"] += len(missing)
+            response = await backend.list_documents(
+                database_id=APPWRITE_DATABASE_ID,
+                collection_id=REFERENCE_COLLECTIONS[name],
+                queries=[Query.equal("$id", missing), Query.limit(len(missing))]
+            )
+            fetched = {document['$id']: document for document in response['documents']}
+        return [
+            keyed.get(document_id) or fetched[document_id]
+            for document_id in document_ids
+            if document_id in keyed or document_id in fetched
+        ]
+
+    async def get(self, name: str, document_id: str) -> Optional[dict]:
+        documents = await self.get_many(name, [document_id])
+        return documents[0] if documents else None
+
+    def collections(self, *names: str) -> Tuple[List[dict], ...]:
+        """
+        Returns the current document lists of the named collections. A list is
+        replaced (never mutated) when it is refetched, so callers can detect
+        changes by identity.
+        """
+        return tuple(self._collection(name) for name in names)
+
+    # --- Maintenance ---
+
+    async def invalidate(self, *names: str):
+        """
+        Called after a write: refetches the given collections (or all of
+        them) before returning, so this worker's next read includes the
+        write. If a refetch fails, the previous copy stays in service and a
+        background refresh is started. Also bumps the shared snapshot
+        version so every worker on the host sees the change.
+        """
+        if SNAPSHOT_ENABLED:
+            shared_snapshot.bump_version()
+        for name in names or REFERENCE_COLLECTIONS:
+            with self._lock:
+                generation = self._generations[name] = self._generations.get(name, 0) + 1
+            try:
+                self._store(name, await fetch_all_documents_async(REFERENCE_COLLECTIONS[name]), generation)
+                self.counters["write_refreshes"] += 1
+            except Exception as e:
+                self.counters["refresh_failures"] += 1
+                print(f"Serving stale '{name}' reference data after refresh failure: {e}")
+                self._schedule_refresh(name)
+
+    def fetch_all(self) -> Dict[str, List[dict]]:
+        """Fetches every reference collection from Appwrite (used by the snapshot refresher)."""
+        return {name: fetch_all_documents(collection_id) for name, collection_id in REFERENCE_COLLECTIONS.items()}
+
+    def warm(self):
+        """Loads every reference collection. Called during app warm-up."""
+        for name in REFERENCE_COLLECTIONS:
+            self._collection(name)
+        print(f"Reference cache warmed: {', '.join(f'{n}={len(self._collection(n))}' for n in REFERENCE_COLLECTIONS)}")
+
+    def _is_loaded(self, name: str) -> bool:
+        if SNAPSHOT_ENABLED and shared_snapshot.read(name) is not None:
+            return True
+        return name in self._entries
+
+    @property
+    def is_warm(self) -> bool:
+        """Every collection has been loaded; an expired copy still counts, as it is served while it refreshes."""
+        return all(self._is_loaded(name) for name in REFERENCE_COLLECTIONS)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "collections": {
+                name: {
+                    "documents": len(self._entries[name][1]),
+                    "age_seconds": round(now - self._entries[name][0], 1),
+                } if name in self._entries else None
+                for name in REFERENCE_COLLECTIONS
+            },
+            "shared_snapshot": shared_snapshot.stats(),
+            "counters": dict(self.counters),
+        }
+
+
+# A single, process-wide cache shared by the routers and logic modules.
+reference_cache = ReferenceCache()
@@ -0,0 +1,330 @@
+# backend/resilience.py
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Optional
+
+from appwrite.exception import AppwriteException
+from fastapi import HTTPException
+
+from appwrite_client import databases, APPWRITE_ATTEMPT_TIMEOUT_SECONDS
+
+# --- Resilience Configuration ---
+# Hard limit for one backend call, including retries and hedges
+CALL_TIMEOUT_SECONDS = float(os.getenv("APPWRITE_CALL_TIMEOUT_SECONDS", "8"))
+# Limit for a single attempt of a read. The HTTP socket timeout is capped to
+# this (see appwrite_client.py), so a timed-out attempt's thread is freed too.
+ATTEMPT_TIMEOUT_SECONDS = APPWRITE_ATTEMPT_TIMEOUT_SECONDS
+# Extra attempts for idempotent reads after a failure
+READ_RETRIES = int(os.getenv("APPWRITE_READ_RETRIES", "2"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("APPWRITE_RETRY_BASE_DELAY_SECONDS", "0.1"))
+# A duplicate read is fired once the first one runs longer than the recent p95
+HEDGING_ENABLED = os.getenv("APPWRITE_HEDGING_ENABLED", "true").lower() == "true"
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("APPWRITE_HEDGE_MIN_DELAY_SECONDS", "0.05"))
+# The circuit opens after this many consecutive failures and stays open this long
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("APPWRITE_BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("APPWRITE_BREAKER_RESET_SECONDS", "15"))
+# How many recent read results are kept to serve while the circuit is open
+STALE_CACHE_SIZE = int(os.getenv("APPWRITE_STALE_CACHE_SIZE", "1000"))
+
+LATENCY_WINDOW = 500
+
+
+class BackendUnavailable(HTTPException):
+    """Raised when Appwrite cannot be reached and no cached data can be served."""
+
+    def __init__(self, detail: str = "The booking backend is temporarily unavailable. Please try again shortly."):
+        super().__init__(status_code=503, detail=detail, headers={"Retry-After": str(int(BREAKER_RESET_SECONDS))})
+
+
+def _is_transient(error: BaseException) -> bool:
+    """
+    Timeouts, I/O errors and 5xx/429 responses are worth retrying. 4xx
+    responses and programming errors (KeyError, TypeError, ...) are not, and
+    do not count against the circuit breaker.
+    """
+    # OSError covers ConnectionError, TimeoutError and every requests exception
+    if isinstance(error, (asyncio.TimeoutError, OSError)):
+        return True
+    if isinstance(error, AppwriteException):
+        if not error.code:
+            # The SDK wraps transport errors without a status code; judge what it wrapped
+            cause = error.__cause__ or error.__context__
+            return cause is None or _is_transient(cause)
+        return error.code == 429 or error.code >= 500
+    return False
+
+
+def _retrieve_exception(task: asyncio.Task):
+    """Marks a cancelled attempt's outcome as seen, so asyncio does not warn about it."""
+    if not task.cancelled():
+        task.exception()
+
+
+class LatencyTracker:
+    """A rolling window of recent call latencies for percentile estimates."""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if len(self._samples) < 20:
+            return None # Not enough data to say what "slow" means yet
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Closed: calls flow. Open: calls fail fast for BREAKER_RESET_SECONDS.
+    Half-open: one trial call is let through; success closes the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def end_trial(self):
+        """Frees the half-open trial slot when the trial call ended without a verdict (e.g. it was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                    print(f"Appwrite circuit breaker OPEN after {self.consecutive_failures} failures.")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class ResilientBackend:
+    """
+    An async facade over the Appwrite `Databases` service with the same method
+    signatures. Every call runs off the event loop with a timeout. Reads are
+    retried with jitter, hedged when they run past the recent p95, and served
+    from a stale copy while the circuit breaker is open (never while it is
+    closed, and never for reads made with allow_stale=False). Writes are
+    never retried or hedged.
+    """
+
+    def __init__(self, service):
+        self._service = service
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+        self._stale: "OrderedDict[tuple, dict]" = OrderedDict()
+        self.counters = {
+            "calls": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "retries": 0,
+            "hedges_launched": 0,
+            "hedges_won": 0,
+            "short_circuited": 0,
+            "stale_served": 0,
+        }
+
+    # --- Public API (mirrors appwrite.services.databases.Databases) ---
+
+    # Pass allow_stale=False for reads that guard a write (e.g. the double-booking
+    # check): an old answer there is worse than no answer, so they get a 503 instead.
+
+    async def list_documents(self, database_id: str, collection_id: str, queries: Optional[list] = None, allow_stale: bool = True):
+        key = ("list_documents", collection_id, tuple(queries or ()))
+        return await self._read(key, allow_stale, self._service.list_documents, database_id=database_id,
+                                collection_id=collection_id, queries=queries)
+
+    async def get_document(self, database_id: str, collection_id: str, document_id: str, queries: Optional[list] = None, allow_stale: bool = True):
+        key = ("get_document", collection_id, document_id, tuple(queries or ()))
+        return await self._read(key, allow_stale, self._service.get_document, database_id=database_id,
+                                collection_id=collection_id, document_id=document_id, queries=queries)
+
+    async def create_document(self, database_id: str, collection_id: str, document_id: str, data: dict, permissions: Optional[list] = None):
+        return await self._write(self._service.create_document, database_id=database_id, collection_id=collection_id,
+                                 document_id=document_id, data=data, permissions=permissions)
+
+    async def update_document(self, database_id: str, collection_id: str, document_id: str, data: Optional[dict] = None, permissions: Optional[list] = None):
+        return await self._write(self._service.update_document, database_id=database_id, collection_id=collection_id,
+                                 document_id=document_id, data=data, permissions=permissions)
+
+    # --- Internals ---
+
+    async def _attempt(self, method: Callable, kwargs: dict):
+        started = time.perf_counter()
+        result = await asyncio.to_thread(method, **kwargs)
+        self.latency.record(time.perf_counter() - started)
+        return result
+
+    async def _hedged_attempt(self, method: Callable, kwargs: dict):
+        """Runs one read; if it outlives the recent p95, races a duplicate against it."""
+        p95 = self.latency.percentile(0.95)
+        if not HEDGING_ENABLED or p95 is None:
+            return await self._attempt(method, kwargs)
+
+        primary = asyncio.ensure_future(self._attempt(method, kwargs))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=max(p95, HEDGE_MIN_DELAY_SECONDS))
+            if done:
+                return primary.result()
+
+            self.counters["hedges_launched"] += 1
+            hedge = asyncio.ensure_future(self._attempt(method, kwargs))
+            pending = {primary, hedge}
+            last_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.counters["hedges_won"] += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            # Also runs when the caller's timeout cancels us: never leave a loser behind
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+                    task.add_done_callback(_retrieve_exception)
+
+    async def _read(self, key: tuple, allow_stale: bool, method: Callable, **kwargs):
+        self.counters["calls"] += 1
+        if not self.breaker.allow():
+            self.counters["short_circuited"] += 1
+            return self._serve_stale(key, allow_stale)
+        is_trial = self.breaker.state == "half_open"
+        try:
+            return await self._read_attempts(key, allow_stale, method, kwargs)
+        finally:
+            if is_trial:
+                # However the trial ended, the next call may try again
+                self.breaker.end_trial()
+
+    async def _read_attempts(self, key: tuple, allow_stale: bool, method: Callable, kwargs: dict):
+        deadline = time.monotonic() + CALL_TIMEOUT_SECONDS
+        for attempt in range(READ_RETRIES + 1):
+            remaining = deadline - time.monotonic()
+            try:
+                result = await asyncio.wait_for(
+                    self._hedged_attempt(method, kwargs),
+                    timeout=max(0.01, min(ATTEMPT_TIMEOUT_SECONDS, remaining))
+                )
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.counters["timeouts"] += 1
+                if not _is_transient(e):
+                    # e.g. 404 Not Found: the backend answered, so it is healthy
+                    self.breaker.record_success()
+                    raise
+                self.counters["failures"] += 1
+                self.breaker.record_failure()
+                out_of_time = time.monotonic() >= deadline
+                if attempt == READ_RETRIES or out_of_time or not self.breaker.allow():
+                    print(f"Appwrite read failed after {attempt + 1} attempt(s): {e!r}")
+                    if self.breaker.state != "open":
+                        # A blip, not an outage: the caller should see the failure
+                        raise BackendUnavailable()
+                    return self._serve_stale(key, allow_stale)
+                self.counters["retries"] += 1
+                # Full jitter: sleep a random amount up to the exponential backoff
+                await asyncio.sleep(random.uniform(0, RETRY_BASE_DELAY_SECONDS * (2 ** attempt)))
+                continue
+
+            self.breaker.record_success()
+            self._remember(key, result)
+            return result
+
+    async def _write(self, method: Callable, **kwargs):
+        self.counters["calls"] += 1
+        if not self.breaker.allow():
+            self.counters["short_circuited"] += 1
+            raise BackendUnavailable()
+        is_trial = self.breaker.state == "half_open"
+        try:
+            result = await asyncio.wait_for(self._attempt(method, kwargs), timeout=CALL_TIMEOUT_SECONDS)
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.counters["timeouts"] += 1
+            if _is_transient(e):
+                self.counters["failures"] += 1
+                self.breaker.record_failure()
+                print(f"Appwrite write failed: {e!r}")
+                raise BackendUnavailable() from e
+            self.breaker.record_success() # e.g. 409 Conflict: the backend answered
+            raise
+        finally:
+            if is_trial:
+                self.breaker.end_trial()
+        self.breaker.record_success()
+        return result
+
+    def _remember(self, key: tuple, result):
+        self._stale[key] = result
+        self._stale.move_to_end(key)
+        while len(self._stale) > STALE_CACHE_SIZE:
+            self._stale.popitem(last=False)
+
+    def _serve_stale(self, key: tuple, allow_stale: bool = True):
+        """Only called while the circuit is open."""
+        if allow_stale and key in self._stale:
+            self.counters["stale_served"] += 1
+            return self._stale[key]
+        raise BackendUnavailable()
+
+    def stats(self) -> dict:
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "times_opened": self.breaker.times_opened,
+            },
+            "latency_ms": {
+                "p50": ms(self.latency.percentile(0.50)),
+                "p95": ms(self.latency.percentile(0.95)),
+                "p99": ms(self.latency.percentile(0.99)),
+            },
+            "counters": dict(self.counters),
+            "stale_cache_entries": len(self._stale),
+        }
+
+
+# The async, resilient entry point for every request-path Appwrite call.
+backend = ResilientBackend(databases)
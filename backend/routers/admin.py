@@ -0,0 +1,104 @@
+# backend/routers/admin.py
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query as FastQuery
+from fastapi.responses import PlainTextResponse
+
+from admission import admission_controller
+from resilience import backend
+from profiling import profiler, verify_profile_header
+from query_stats import query_stats, SLOW_QUERY_MS
+from logic.service_analytics import parsed_snapshot_cache
+from logic.precompute import availability_precompute
+from logic.waitlist import waitlist
+from idempotency import idempotency_store
+
+def require_admin_signature(x_profile: Optional[str] = Header(None)):
+    """
+    The admin endpoints expose stack traces, request paths, query shapes and
+    the backend's health, so every one of them needs the same signed
+    X-Profile header (PROFILING_SECRET) that triggers profiling.
+    """
+    if not x_profile or not verify_profile_header(x_profile):
+        raise HTTPException(status_code=403, detail="A valid signed X-Profile header is required.")
+
+
+# Create a new router object for operational endpoints
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["Admin & Operations"],
+    dependencies=[Depends(require_admin_signature)]
+)
+
+@router.get("/backend")
+async def get_backend_resilience_stats():
+    """
+    Reports the state of the Appwrite resilience layer: circuit breaker state,
+    recent latency percentiles and counters for retries, hedges, timeouts and
+    stale responses served while the circuit was open.
+    """
+    return backend.stats()
+
+@router.get("/admission")
+async def get_admission_stats():
+    """
+    Reports the admission controller's configuration and live state per route
+    class: in-flight requests, queue depth, wait times and shed counts.
+    """
+    return admission_controller.stats()
+
+@router.get("/caches")
+async def get_cache_stats():
+    """Reports the hit rates and sizes of the in-memory computation caches."""
+    return {
+        "parsed_services_snapshot": parsed_snapshot_cache.stats(),
+        "availability_precompute": availability_precompute.stats(),
+        "idempotency": idempotency_store.stats(),
+        "waitlist": waitlist.stats(),
+    }
+
+@router.get("/profiles")
+async def list_profiles():
+    """
+    Lists the request profiles captured by this worker, newest first: every
+    request sent with a signed X-Profile header, plus randomly sampled
+    requests that were slower than PROFILING_SLOW_MS.
+    """
+    return {"profiler": profiler.stats(), "profiles": profiler.list()}
+
+@router.get("/profiles/{profileId}", response_class=PlainTextResponse)
+async def download_profile(profileId: str):
+    """
+    Downloads a profile as collapsed stacks ("frame;frame;frame count" per
+    line), ready for flamegraph.pl, speedscope or inferno.
+    """
+    session = profiler.get(profileId)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profileId} not found (it may have been rotated out or captured by another worker).")
+    return PlainTextResponse(
+        session.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profileId}.collapsed"'}
+    )
+
+@router.get("/queries")
+async def get_query_stats(
+    sort_by: str = FastQuery("total_ms", description="Column to sort by, e.g. total_ms, calls, p95_ms, bytes."),
+    limit: int = FastQuery(50, ge=1, le=1000)
+):
+    """
+    Reports Appwrite calls grouped by query shape (collection plus the query
+    methods and attributes, with values stripped): call counts, latency
+    percentiles, documents and bytes returned, and the recent slow-call log.
+    """
+    return {
+        "since": query_stats.started_at,
+        "slow_query_ms": SLOW_QUERY_MS,
+        "shapes": query_stats.table(sort_by, limit),
+        "slow_calls": list(query_stats.slow_log)[::-1],
+    }
+
+@router.delete("/queries", status_code=204)
+async def reset_query_stats():
+    """Clears the query-shape statistics and the slow-call log."""
+    query_stats.reset()
@@ -1,35 +1,27 @@
 # backend/routers/booking.py
 
 import asyncio
-import json
-from fastapi import APIRouter, HTTPException
-from typing import List
-from appwrite.query import Query
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Header, Response
+from typing import List, Optional
 from datetime import datetime, timedelta, timezone
 from logic.availability import calculate_barber_availability
 from logic.availability import is_barber_working_on_date, is_any_barber_working_on_date, get_weekly_available_dates_for_barber
 from logic.any_barber import calculate_any_barber_availability
+from logic.assignment import assign_any_barber
+from logic.cross_shop import calculate_cross_shop_availability
+from logic.booking import book_appointment, find_appointment
+from logic.next_available import find_next_available, NEXT_AVAILABLE_DEFAULT_HORIZON_DAYS, NEXT_AVAILABLE_MAX_HORIZON_DAYS
+from logic.customers import build_rebook_suggestion, customer_profiles, normalize_phone
+from logic.waitlist import waitlist, WAITLIST_ENABLED
 from datetime import timedelta
-import uuid
-# Import our new utils function
-from utils import parse_iso_to_datetime
 from utils import TARGET_TIMEZONE
 # Import the new Pydantic model for the request body
 import schemas
 
-# Import our Pydantic models and Appwrite client details
+# Import our Pydantic models and the shared caches
 import schemas
-from appwrite_client import (
-    databases, 
-    APPWRITE_DATABASE_ID, 
-    COLLECTION_SERVICES, 
-    COLLECTION_SHOPS,
-    COLLECTION_BARBERS,
-    COLLECTION_APPOINTMENTS,
-    COLLECTION_CUSTOMERS,
-    COLLECTION_APPOINTMENT_SERVICES 
-
-)
+from reference_cache import reference_cache, MAX_IDS_PER_LOOKUP
+from idempotency import document_id_for, idempotency_store, request_fingerprint
 
 # Create a new router object
 router = APIRouter(
@@ -37,27 +29,62 @@ router = APIRouter(
     tags=["Website Booking"] # Group these endpoints in the Swagger UI
 )
 
+def _parse_ids(ids: str) -> List[str]:
+    """Splits a comma-separated `ids` parameter, enforcing the batch size."""
+    document_ids = [document_id.strip() for document_id in ids.split(",") if document_id.strip()]
+    if not document_ids:
+        raise HTTPException(status_code=400, detail="Provide at least one ID.")
+    if len(document_ids) > MAX_IDS_PER_LOOKUP:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IDS_PER_LOOKUP} IDs can be looked up at once.")
+    return document_ids
+
+
 @router.get("/services", response_model=List[schemas.Service])
-async def get_all_services():
-    """Fetches a list of all available services from the database."""
+async def get_all_services(ids: Optional[str] = None):
+    """
+    Fetches a list of all available services from the reference cache, or
+    only the ones listed in `ids` (comma-separated; unknown IDs are skipped).
+    """
     try:
-        response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_SERVICES
-        )
-        return response['documents']
+        if ids is not None:
+            return await reference_cache.get_many("services", _parse_ids(ids))
+        return reference_cache.services()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/shops", response_model=List[schemas.Shop])
 async def get_all_shops():
-    """Fetches a list of all shop locations from the database."""
+    """Fetches a list of all shop locations from the reference cache."""
     try:
-        response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_SHOPS
-        )
-        return response['documents']
+        return reference_cache.shops()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/shops/{shopId}", response_model=schemas.Shop)
+async def get_shop(shopId: str):
+    """Fetches one shop by ID from the reference cache."""
+    try:
+        shop = await reference_cache.get("shops", shopId)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if shop is None:
+        raise HTTPException(status_code=404, detail=f"Shop with ID {shopId} not found.")
+    return shop
+
+@router.get("/barbers", response_model=List[schemas.BarberDetails])
+async def get_barbers_by_ids(ids: str):
+    """Fetches the barbers listed in `ids` (comma-separated; unknown IDs are skipped)."""
+    document_ids = _parse_ids(ids)
+    try:
+        return await reference_cache.get_many("barbers", document_ids)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -65,13 +92,9 @@ async def get_all_shops():
 async def get_barbers_for_shop(shopId: str):
     """Fetches a list of barbers for a specific shop ID."""
     try:
-        queries = [Query.equal("shop_id", [shopId])]
-        response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_BARBERS,
-            queries=queries
-        )
-        return response['documents']
+        return reference_cache.barbers(shop_id=shopId)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -131,78 +154,234 @@ async def get_available_slots(shop_id: str, barber_id: str, date_str: str, total
         )
     
 
+@router.get("/availability/next", response_model=schemas.NextAvailability)
+async def get_next_available(
+    shop_id: str,
+    barber_id: str,
+    total_duration: int,
+    horizon_days: int = NEXT_AVAILABLE_DEFAULT_HORIZON_DAYS
+):
+    """
+    Finds the next opening: the first date (from today, up to `horizon_days`
+    ahead) on which the barber, or any barber of the shop for "any", can fit
+    `total_duration`, with all of that date's fitting slots.
+    """
+    if total_duration <= 0:
+        raise HTTPException(status_code=400, detail="Duration must be a positive number.")
+    if horizon_days <= 0 or horizon_days > NEXT_AVAILABLE_MAX_HORIZON_DAYS:
+        raise HTTPException(status_code=400, detail=f"'horizon_days' must be between 1 and {NEXT_AVAILABLE_MAX_HORIZON_DAYS}.")
+    try:
+        return await find_next_available(shop_id, barber_id, total_duration, horizon_days)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error searching for the next available slot: {e}")
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
+
+
+@router.get("/availability/shops", response_model=schemas.CrossShopAvailability)
+async def get_cross_shop_availability(date: str, duration: int, shop_ids: Optional[str] = None):
+    """
+    "Any barber" slots for every shop on a date in one call, for customers
+    who don't mind which location they visit. `shop_ids` (comma-separated)
+    limits the search to some shops.
+    """
+    try:
+        datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Please use YYYY-MM-DD.")
+    if duration <= 0:
+        raise HTTPException(status_code=400, detail="Duration must be a positive number.")
+    selected_shop_ids = [shop_id.strip() for shop_id in shop_ids.split(",") if shop_id.strip()] if shop_ids else None
+    try:
+        return await calculate_cross_shop_availability(date, duration, selected_shop_ids)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error calculating cross-shop availability: {e}")
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
+
+
+@router.get("/availability/assign", response_model=schemas.BarberAssignment)
+async def assign_barber_for_slot(shop_id: str, date_str: str, start_time: str, total_duration: int):
+    """
+    For an "Any Barber" booking, picks the barber who can take the chosen slot
+    while leaving the fewest unusable idle gaps in their day.
+    """
+    if total_duration <= 0:
+        raise HTTPException(status_code=400, detail="Duration must be a positive number.")
+
+    try:
+        assignment = await assign_any_barber(
+            shop_id=shop_id,
+            date_str=date_str,
+            start_time=start_time,
+            total_duration=total_duration
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date or time format. Please use YYYY-MM-DD and HH:MM.")
+
+    if assignment is None:
+        raise HTTPException(status_code=404, detail="No barber is available for this slot.")
+    return assignment
+
+
 @router.post("/appointments", response_model=schemas.AppointmentDetails, status_code=201)
-async def create_appointment(appointment_data: schemas.AppointmentCreate):
+async def create_appointment(
+    appointment_data: schemas.AppointmentCreate,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """
     Creates a new, denormalized appointment record in a single database call
     after performing a final double-booking check.
+
+    Clients that may retry (flaky mobile connections, the walk-in dialog)
+    should send an Idempotency-Key header: a retry with the same key and body
+    gets the original booking back without booking again, and is marked
+    with an Idempotent-Replayed header. On the worker that served the first
+    attempt this does not touch the backend (and a 409 is replayed too);
+    on any other worker the booking is found by its key-derived ID.
     """
-    # --- Part 1: Calculate Totals from Incoming Data ---
-    # No database calls needed here anymore!
-    total_duration = sum(service.duration for service in appointment_data.service_snapshots)
-    bill_amount = sum(service.price for service in appointment_data.service_snapshots)
-    total_amount = bill_amount * (1 + appointment_data.tax_rate)
-    
-    appointment_end_time = appointment_data.start_time + timedelta(minutes=total_duration)
+    if idempotency_key is None:
+        return await _book_appointment(appointment_data, background_tasks)
 
+    fingerprint = request_fingerprint(appointment_data.dict())
+    (created_document, found_existing), replayed = await idempotency_store.run(
+        "create_appointment",
+        idempotency_key,
+        fingerprint,
+        lambda: _book_idempotent(appointment_data, background_tasks, document_id_for("create_appointment", idempotency_key))
+    )
+    if replayed or found_existing:
+        response.headers["Idempotent-Replayed"] = "true"
+    return created_document
+
+
+async def _book_appointment(appointment_data: schemas.AppointmentCreate, background_tasks: BackgroundTasks, document_id: str = 'unique()'):
+    """Books the appointment and updates the customer's profile after the response has been sent."""
+    created_document = await book_appointment(appointment_data, document_id=document_id)
+    background_tasks.add_task(customer_profiles.record_visit, created_document)
+    return created_document
+
+
+async def _book_idempotent(appointment_data: schemas.AppointmentCreate, background_tasks: BackgroundTasks, document_id: str):
+    """
+    Books under the key's document ID, unless an earlier attempt (possibly on
+    another worker) already did. Returns (document, found_existing).
+    """
+    existing = await find_appointment(document_id)
+    if existing is None:
+        try:
+            return await _book_appointment(appointment_data, background_tasks, document_id), False
+        except HTTPException as e:
+            if e.status_code != 409:
+                raise
+            # The slot is taken, possibly by a concurrent attempt with this key
+            existing = await find_appointment(document_id)
+            if existing is None:
+                raise
+    if not _is_same_booking(existing, appointment_data):
+        raise HTTPException(status_code=422, detail="This Idempotency-Key was already used with a different request.")
+    return existing, True
+
+
+def _is_same_booking(document: dict, appointment_data: schemas.AppointmentCreate) -> bool:
+    """Whether an existing appointment is the one this request asks for ("any" matches the barber it was assigned)."""
+    start_time = appointment_data.start_time.replace(tzinfo=TARGET_TIMEZONE).astimezone(timezone.utc)
+    return (
+        document.get('shop_id') == appointment_data.shop_id
+        and document.get('customer_phone') == appointment_data.customer_phone
+        and (appointment_data.barber_id.lower() == "any" or appointment_data.barber_id == document.get('barber_id'))
+        and datetime.fromisoformat(document['start_time'].replace('Z', '+00:00')) == start_time
+    )
+
+
+@router.get("/customers/{phone}/rebook", response_model=schemas.RebookSuggestion)
+async def get_rebook_suggestion(phone: str):
+    """
+    For a returning customer: their last shop, barber and services, and the
+    first date (within REBOOK_SEARCH_DAYS) on which that barber can fit the
+    same services again, with its open slots. The profile is one lookup by
+    normalized phone number.
+    """
+    if normalize_phone(phone) is None:
+        raise HTTPException(status_code=400, detail="Invalid phone number.")
     try:
-        # --- Part 2: Final Double-Booking Check (No change in logic) ---
-        local_start_check = appointment_data.start_time.replace(tzinfo=TARGET_TIMEZONE)
-        local_end_check = appointment_end_time.replace(tzinfo=TARGET_TIMEZONE)
-        utc_start_check = local_start_check.astimezone(timezone.utc)
-        utc_end_check = local_end_check.astimezone(timezone.utc)
-        
-        overlapping_appointments_response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_APPOINTMENTS,
-            queries=[
-                Query.equal("barber_id", [appointment_data.barber_id]),
-                Query.not_equal("status", "Cancelled"),
-                Query.less_than("start_time", utc_end_check.isoformat()),
-                Query.greater_than("end_time", utc_start_check.isoformat())
-            ]
-        )
+        suggestion = await build_rebook_suggestion(phone)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error building rebook suggestion: {e}")
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
+    if suggestion is None:
+        raise HTTPException(status_code=404, detail="No booking history found for this phone number.")
+    return suggestion
 
-        if overlapping_appointments_response['documents']:
-            raise HTTPException(status_code=409, detail="This time slot has just been booked. Please select another slot.")
-        
-        # --- Part 3: Create the Single, Denormalized Appointment Document ---
-        
-        # Convert the list of service snapshots to a JSON string for storage
-        services_json_string = json.dumps([s.dict() for s in appointment_data.service_snapshots])
-        
-        new_appointment_data = {
-            "shop_id": appointment_data.shop_id,
-            "shop_name": appointment_data.shop_name,
-            "barber_id": appointment_data.barber_id,
-            "barber_name": appointment_data.barber_name,
-            "customer_name": appointment_data.customer_name,
-            "customer_phone": appointment_data.customer_phone,
-            "customer_gender": appointment_data.customer_gender,
-            "start_time": utc_start_check.isoformat(),
-            "end_time": utc_end_check.isoformat(),
-            "status": appointment_data.status,
-            "is_walk_in": appointment_data.is_walk_in,
-            "payment_status": False,
-            "bill_amount": bill_amount,
-            "total_amount": round(total_amount, 2),
-            "tax_rate_snapshot": appointment_data.tax_rate,
-            "services_snapshot": services_json_string
-        }
-
-        created_document = databases.create_document(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_APPOINTMENTS,
-            document_id='unique()',
-            data=new_appointment_data
-        )
 
-        print(f"Successfully created denormalized appointment with ID: {created_document['$id']}")
-        
-        return created_document # FastAPI will validate this against AppointmentDetails
+def _require_waitlist():
+    if not WAITLIST_ENABLED:
+        raise HTTPException(status_code=503, detail="The waitlist is not available.")
+
+
+@router.post("/waitlist", response_model=schemas.WaitlistEntry, status_code=201)
+async def join_waitlist(registration: schemas.WaitlistCreate):
+    """
+    Puts a customer on the waitlist for a shop (and optionally one barber)
+    over a date window. When a booking in that window is cancelled and the
+    freed time fits their services, they are offered the slot, or booked
+    straight into it if `auto_book` is set.
+    """
+    _require_waitlist()
+    try:
+        return await waitlist.register(registration)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error joining the waitlist: {e}")
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
+
 
-    except HTTPException as http_exc:
-        raise http_exc
+@router.get("/waitlist/{entryId}", response_model=schemas.WaitlistEntry)
+async def get_waitlist_entry(entryId: str):
+    """Returns a waitlist entry, including the slot it has been offered, if any."""
+    _require_waitlist()
+    try:
+        return await waitlist.get(entryId)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error reading waitlist entry: {e}")
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
+
+
+@router.delete("/waitlist/{entryId}", response_model=schemas.WaitlistEntry)
+async def leave_waitlist(entryId: str):
+    """Takes a customer off the waitlist (and declines any open offer)."""
+    _require_waitlist()
+    try:
+        return await waitlist.withdraw(entryId)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error leaving the waitlist: {e}")
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
+
+
+@router.post("/waitlist/{entryId}/accept", response_model=schemas.AppointmentDetails, status_code=201)
+async def accept_waitlist_offer(entryId: str, background_tasks: BackgroundTasks):
+    """
+    Books the slot offered to a waitlist entry, through the same
+    double-booking check as a normal booking.
+    """
+    _require_waitlist()
+    try:
+        created_document = await waitlist.accept(entryId)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"An error occurred during booking: {e}")
-        raise HTTPException(status_code=500, detail="An internal server error occurred.")
\ No newline at end of file
+        print(f"Error accepting a waitlist offer: {e}")
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
+    background_tasks.add_task(customer_profiles.record_visit, created_document)
+    return created_document
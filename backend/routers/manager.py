@@ -1,16 +1,26 @@
 # backend/routers/manager.py
 
 import asyncio
-from fastapi import APIRouter, HTTPException, Query as FastQuery
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Response, Query as FastQuery
+from typing import List, Optional, Union
+from appwrite.exception import AppwriteException
 from appwrite.query import Query
 from datetime import datetime, timedelta, timezone
-from logic.manager_logic import find_available_barbers_for_walk_in
+from logic.manager_logic import find_available_barbers_for_walk_in, find_appointments_for_rule, apply_status_changes
+from logic.appointment_index import appointment_index
+from logic.waitlist import waitlist
+from logic.financials import resolve_period, build_financials_report, stream_appointments
+from logic.service_analytics import build_service_analytics_report
+from logic.utilization import resolve_date_range, build_utilization_report
+from logic.schedule_templates import apply_schedule_template
+from logic.precompute import availability_precompute
 import calendar
 
 # Import Pydantic schemas and Appwrite client details
 import schemas
-from appwrite_client import COLLECTION_BARBERS, COLLECTION_SCHEDULES, databases, APPWRITE_DATABASE_ID, COLLECTION_APPOINTMENTS
+from appwrite_client import COLLECTION_BARBERS, COLLECTION_SCHEDULES, APPWRITE_DATABASE_ID, COLLECTION_APPOINTMENTS
+from reference_cache import reference_cache
+from resilience import backend
 from utils import TARGET_TIMEZONE # For handling dates correctly
 
 # Create a new router object for the manager dashboard
@@ -19,6 +29,14 @@ router = APIRouter(
     tags=["Manager Dashboard"]
 )
 
+# The largest page a client can ask for from the appointments listing
+MAX_APPOINTMENTS_PAGE = 500
+# The most explicit items a single bulk status request may carry
+MAX_BULK_STATUS_ITEMS = 1000
+# The full listing's watermark is taken this long before the listing is read,
+# so clock skew with Appwrite can only re-send a change, never lose one
+WATERMARK_OVERLAP_SECONDS = 2
+
 # --- Pydantic Schema for Response ---
 # We need a more detailed Appointment schema for the dashboard
 # Add this to backend/schemas.py
@@ -30,14 +48,31 @@ router = APIRouter(
 #     end_time: datetime
 #     status: str
 
-@router.get("/appointments", response_model=List[schemas.AppointmentDetails])
+@router.get("/appointments", response_model=Union[List[schemas.AppointmentDetails], schemas.AppointmentDelta])
 async def get_manager_appointments(
     shop_id: str, 
-    date: Optional[str] = FastQuery(None, description="Date in YYYY-MM-DD format. Defaults to today.")
+    response: Response,
+    date: Optional[str] = FastQuery(None, description="Date in YYYY-MM-DD format. Defaults to today."),
+    since: Optional[str] = FastQuery(None, description="Delta sync: the watermark from the previous poll."),
+    barber_id: Optional[str] = FastQuery(None, description="Optional: Only this barber's appointments."),
+    status: Optional[str] = FastQuery(None, description="Optional: Only appointments with this status, e.g. 'Booked'."),
+    cursor: Optional[str] = FastQuery(None, description="The X-Next-Cursor value from the previous page."),
+    limit: Optional[int] = FastQuery(None, ge=1, le=MAX_APPOINTMENTS_PAGE, description="Page size. Omit to get the whole day.")
 ):
     """
-    Fetches the list of appointments for a specific shop on a given date.
-    If no date is provided, it defaults to the current day in the shop's timezone.
+    Fetches the list of appointments for a specific shop on a given date,
+    optionally filtered by barber and status. If no date is provided, it
+    defaults to the current day in the shop's timezone.
+
+    With `limit`, one page is returned and the cursor for the next page is
+    sent in the `X-Next-Cursor` response header (absent on the last page).
+    Without it, every matching appointment is returned, with the watermark
+    for the first delta poll in the `X-Watermark` response header.
+
+    With `since`, only the appointments created or updated since that
+    watermark are returned, as {appointments, cancelled_ids, watermark}.
+    Rows that were cancelled, or no longer match the `status` filter, are
+    listed in `cancelled_ids` so the client can drop them.
     """
     try:
         # Determine the target date
@@ -55,29 +90,103 @@ async def get_manager_appointments(
         day_start_utc = day_start.astimezone(timezone.utc)
         day_end_utc = day_end.astimezone(timezone.utc)
 
-        # Build the queries to fetch appointments
+        # Build the queries to fetch appointments. Filters are applied by Appwrite,
+        # so filtered views only transfer what they show.
         appointment_queries = [
             Query.equal("shop_id", [shop_id]),
             Query.greater_than_equal("start_time", day_start_utc.isoformat()),
             Query.less_than("start_time", day_end_utc.isoformat()),
-            Query.order_asc("start_time")
         ]
-        
-        response = databases.list_documents(
+        if barber_id:
+            appointment_queries.append(Query.equal("barber_id", [barber_id]))
+        if since:
+            return await _appointments_changed_since(appointment_queries, since, status)
+        if status:
+            appointment_queries.append(Query.equal("status", [status]))
+        appointment_queries.append(Query.order_asc("start_time"))
+
+        if limit is None:
+            # Page through the whole day with cursors, so busy days are never truncated
+            watermark = datetime.now(timezone.utc) - timedelta(seconds=WATERMARK_OVERLAP_SECONDS)
+            response.headers["X-Watermark"] = watermark.isoformat()
+            appointments = []
+            async for page in stream_appointments(appointment_queries):
+                appointments.extend(page)
+            return appointments
+
+        page_queries = appointment_queries + [Query.limit(limit)]
+        if cursor:
+            page_queries.append(Query.cursor_after(cursor))
+        page_response = await backend.list_documents(
             database_id=APPWRITE_DATABASE_ID,
             collection_id=COLLECTION_APPOINTMENTS,
-            queries=appointment_queries
+            queries=page_queries
         )
-        
-        return response['documents']
+        page = page_response['documents']
+        if len(page) == limit:
+            response.headers["X-Next-Cursor"] = page[-1]['$id']
+        return page
 
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Please use YYYY-MM-DD.")
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"An error occurred fetching manager appointments: {e}")
         raise HTTPException(status_code=500, detail="An internal server error occurred.")
     
 
+def _parse_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+async def _appointments_changed_since(queries: List[str], since: str, status: Optional[str]) -> dict:
+    """
+    The delta-sync branch of the appointments listing. Appwrite does the
+    `$updatedAt` range filtering, so a quiet poll returns almost nothing.
+
+    The range is inclusive, so a row updated in the same millisecond as the
+    last one sent is not skipped. The watermark is "<timestamp>|<ids>", the
+    IDs being the rows already sent at that timestamp, which are not sent again.
+    """
+    timestamp, _, sent_ids = since.partition("|")
+    try:
+        since_utc = _parse_timestamp(timestamp)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid 'since' watermark. Use the watermark from the previous response.")
+    already_sent = set(filter(None, sent_ids.split(",")))
+
+    # The status filter is applied here rather than in Appwrite, so rows that
+    # moved out of the filtered view are still seen and can be reported.
+    delta_queries = queries + [
+        Query.greater_than_equal("$updatedAt", since_utc.isoformat()),
+        Query.order_asc("$updatedAt"),
+    ]
+
+    changed, cancelled_ids = [], []
+    watermark_at, watermark_ids = since_utc, already_sent
+    async for page in stream_appointments(delta_queries):
+        for appointment in page:
+            updated_at = _parse_timestamp(appointment['$updatedAt'])
+            if updated_at == since_utc and appointment['$id'] in already_sent:
+                continue
+            if appointment['status'] == "Cancelled" or (status and appointment['status'] != status):
+                cancelled_ids.append(appointment['$id'])
+            else:
+                changed.append(appointment)
+            if updated_at > watermark_at:
+                watermark_at, watermark_ids = updated_at, set()
+            watermark_ids.add(appointment['$id'])
+
+    watermark = watermark_at.isoformat()
+    if watermark_ids:
+        watermark += "|" + ",".join(sorted(watermark_ids))
+    return {"appointments": changed, "cancelled_ids": cancelled_ids, "watermark": watermark}
+
+
 @router.patch("/appointments/{appointmentId}/status", response_model=schemas.AppointmentDetails)
 async def update_appointment_status(appointmentId: str, status_update: schemas.AppointmentStatusUpdate):
     """
@@ -91,23 +200,59 @@ async def update_appointment_status(appointmentId: str, status_update: schemas.A
         }
 
         # Call the Appwrite SDK to update the document
-        updated_document = databases.update_document(
+        updated_document = await backend.update_document(
             database_id=APPWRITE_DATABASE_ID,
             collection_id=COLLECTION_APPOINTMENTS,
             document_id=appointmentId,
             data=update_data
         )
 
+        # Keep the in-memory index current (cancellations free the slot again)
+        appointment_index.apply(updated_document)
+        if status_update.status == "Cancelled":
+            # Offer the freed time to waiting customers
+            waitlist.on_cancelled(updated_document)
+
         # Return the entire updated document, which will be validated by the response_model
         return updated_document
 
+    except HTTPException:
+        raise
     except Exception as e:
-        # The Appwrite SDK will raise an exception if the document is not found (404)
-        # or if there's a server error.
-        # A more advanced implementation could check the error type.
         print(f"An error occurred updating appointment status: {e}")
-        raise HTTPException(status_code=404, detail=f"Appointment with ID {appointmentId} not found or update failed.")
+        if isinstance(e, AppwriteException) and e.code == 404:
+            raise HTTPException(status_code=404, detail=f"Appointment with ID {appointmentId} not found.")
+        raise HTTPException(status_code=500, detail="Failed to update the appointment status.")
     
+@router.post("/appointments/bulk-status", response_model=schemas.BulkStatusResponse)
+async def bulk_update_appointment_status(bulk_update: schemas.BulkStatusUpdate):
+    """
+    Changes the status of many appointments at once, e.g. for end-of-day
+    close-out. Accepts either a list of (appointment_id, status) items or a
+    rule such as "all InProgress for this shop today -> Completed".
+    Updates run concurrently (bounded) and each one gets its own result.
+    """
+    if (bulk_update.items is None) == (bulk_update.rule is None):
+        raise HTTPException(status_code=400, detail="Provide either 'items' or 'rule', not both.")
+
+    if bulk_update.items is not None:
+        if len(bulk_update.items) > MAX_BULK_STATUS_ITEMS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_STATUS_ITEMS} items can be updated at once.")
+        changes = [(item.appointment_id, item.status) for item in bulk_update.items]
+    else:
+        rule = bulk_update.rule
+        try:
+            target_date = datetime.strptime(rule.date, "%Y-%m-%d").date() if rule.date else datetime.now(TARGET_TIMEZONE).date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Please use YYYY-MM-DD.")
+        day_start = datetime.combine(target_date, datetime.min.time()).replace(tzinfo=TARGET_TIMEZONE)
+        appointment_ids = await find_appointments_for_rule(rule.shop_id, day_start, rule.from_status, rule.barber_id)
+        changes = [(appointment_id, rule.to_status) for appointment_id in appointment_ids]
+
+    results = await apply_status_changes(changes)
+    updated = sum(1 for result in results if result["ok"])
+    return {"updated": updated, "failed": len(results) - updated, "results": results}
+
 @router.post("/staff", response_model=schemas.BarberDetails, status_code=201)
 async def add_new_staff(shop_id: str, barber_data: schemas.BarberCreate):
     """
@@ -122,16 +267,20 @@ async def add_new_staff(shop_id: str, barber_data: schemas.BarberCreate):
         }
 
         # Call the Appwrite SDK to create the new document
-        created_document = databases.create_document(
+        created_document = await backend.create_document(
             database_id=APPWRITE_DATABASE_ID,
             collection_id=COLLECTION_BARBERS,
             document_id='unique()', # Let Appwrite generate a unique ID
             data=new_barber_data
         )
+        await reference_cache.invalidate("barbers")
+        availability_precompute.request_refresh()
 
         # Return the full document of the newly created barber
         return created_document
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"An error occurred while adding new staff: {e}")
         raise HTTPException(status_code=500, detail="Failed to create new staff member.")
@@ -164,7 +313,7 @@ async def update_barber_schedule(
     """
     try:
         # --- PART 1: Fetch Existing Data (1 DB Call) ---
-        existing_schedule_response = databases.list_documents(
+        existing_schedule_response = await backend.list_documents(
             database_id=APPWRITE_DATABASE_ID,
             collection_id=COLLECTION_SCHEDULES,
             queries=[Query.equal("barber_id", [barberId])]
@@ -194,9 +343,8 @@ async def update_barber_schedule(
                 # If the day exists in our map, we UPDATE
                 document_id_to_update = existing_schedule_map[day]['$id']
                 
-                # Appwrite SDK calls are synchronous, so we need to wrap them to run concurrently
-                task = asyncio.to_thread(
-                    databases.update_document,
+                # The resilient backend runs each SDK call off the event loop, so these run concurrently
+                task = backend.update_document(
                     database_id=APPWRITE_DATABASE_ID,
                     collection_id=COLLECTION_SCHEDULES,
                     document_id=document_id_to_update,
@@ -205,8 +353,7 @@ async def update_barber_schedule(
                 tasks.append(task)
             else:
                 # If the day does not exist, we CREATE
-                task = asyncio.to_thread(
-                    databases.create_document,
+                task = backend.create_document(
                     database_id=APPWRITE_DATABASE_ID,
                     collection_id=COLLECTION_SCHEDULES,
                     document_id='unique()',
@@ -217,14 +364,41 @@ async def update_barber_schedule(
         # --- PART 6: Execute All Writes Concurrently ---
         if tasks:
             await asyncio.gather(*tasks)
+        await reference_cache.invalidate("schedules")
+        availability_precompute.request_refresh()
         
         return {"status": "success", "message": f"Schedule for barber {barberId} has been successfully updated."}
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"An error occurred while updating schedule: {e}")
         raise HTTPException(status_code=500, detail="Failed to update barber's schedule.")
     
 
+@router.post("/schedule-template", response_model=schemas.ScheduleTemplateResult)
+async def apply_shop_schedule_template(
+    shop_id: str,
+    template: schemas.ScheduleTemplate,
+    dry_run: bool = FastQuery(False, description="Only report what would change, without writing.")
+):
+    """
+    Applies a weekly schedule pattern to every barber of a shop (or just
+    `barber_ids`), and optionally updates the shop's opening hours too.
+    Unchanged days are skipped; the rest are written concurrently.
+    """
+    if not template.schedules and not template.shop_timings:
+        raise HTTPException(status_code=400, detail="The template must contain 'schedules' and/or 'shop_timings'.")
+
+    try:
+        return await apply_schedule_template(shop_id, template, dry_run=dry_run)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"An error occurred while applying a schedule template: {e}")
+        raise HTTPException(status_code=500, detail="Failed to apply the schedule template.")
+
+
 @router.get("/financials", response_model=schemas.FinancialsReport)
 async def get_manager_financials(
     shop_id: str,
@@ -232,102 +406,67 @@ async def get_manager_financials(
     month: Optional[str] = FastQuery(None, description="A specific month in YYYY-MM format.")
 ):
     """
-    Calculates financial totals for a given shop for a specific day or month.
+    Calculates financial totals for a given shop for a specific day or month,
+    with a per-day series and per-barber totals computed in the same pass.
     If no date or month is provided, it defaults to the current day.
     """
-    if date and month:
-        raise HTTPException(status_code=400, detail="Please provide either a 'date' or a 'month', not both.")
-
-    now_local = datetime.now(TARGET_TIMEZONE)
-    filter_period_str = ""
-
     # --- Determine the time range for the query ---
-    if date:
-        try:
-            target_date = datetime.strptime(date, "%Y-%m-%d").date()
-            filter_period_str = f"for date {date}"
-            day_start_local = datetime.combine(target_date, datetime.min.time()).replace(tzinfo=TARGET_TIMEZONE)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid date format. Please use YYYY-MM-DD.")
-    elif month:
-        try:
-            year, month_num = map(int, month.split('-'))
-            filter_period_str = f"for month {month}"
-            # Get the first day of the month
-            day_start_local = datetime(year, month_num, 1, tzinfo=TARGET_TIMEZONE)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid month format. Please use YYYY-MM.")
-    else:
-        # Default to the current day
-        target_date = now_local.date()
-        filter_period_str = f"for today, {target_date.strftime('%Y-%m-%d')}"
-        day_start_local = datetime.combine(target_date, datetime.min.time()).replace(tzinfo=TARGET_TIMEZONE)
-    
-    # Calculate the end of the period
-    if month:
-        _, last_day = calendar.monthrange(day_start_local.year, day_start_local.month)
-        day_end_local = day_start_local.replace(day=last_day, hour=23, minute=59, second=59)
-    else: # Daily
-        day_end_local = day_start_local + timedelta(days=1)
-
-    # Convert local time range to UTC for Appwrite query
-    day_start_utc = day_start_local.astimezone(timezone.utc)
-    day_end_utc = day_end_local.astimezone(timezone.utc)
+    period_start, period_end, filter_period_str = resolve_period(date, month)
 
     try:
-        # --- Query and Aggregate Data ---
-        # Appwrite does not support server-side aggregation (SUM), so we must fetch all documents and sum them in our code.
-        # We'll use pagination to handle potentially large numbers of appointments.
-        
-        all_completed_appointments = []
-        offset = 0
-        limit = 100 # Fetch 100 documents at a time
-
-        while True:
-            response = databases.list_documents(
-                database_id=APPWRITE_DATABASE_ID,
-                collection_id=COLLECTION_APPOINTMENTS,
-                queries=[
-                    Query.equal("shop_id", [shop_id]),
-                    Query.equal("status", ["Completed"]), # Only count completed appointments
-                    Query.greater_than_equal("start_time", day_start_utc.isoformat()),
-                    Query.less_than("start_time", day_end_utc.isoformat()),
-                    Query.limit(limit),
-                    Query.offset(offset)
-                ]
-            )
-            
-            documents = response['documents']
-            all_completed_appointments.extend(documents)
-            
-            if len(documents) < limit:
-                # We've fetched all the documents
-                break
-            
-            offset += limit
-
-        # --- Calculate Totals ---
-        total_revenue = 0.0
-        total_pre_tax = 0.0
-        
-        for appt in all_completed_appointments:
-            total_revenue += appt.get('total_amount', 0)
-            total_pre_tax += appt.get('bill_amount', 0)
-        
-        total_tax = total_revenue - total_pre_tax
-        
-        return {
-            "total_revenue_before_tax": round(total_pre_tax, 2),
-            "total_tax_collected": round(total_tax, 2),
-            "total_revenue_after_tax": round(total_revenue, 2),
-            "total_appointments": len(all_completed_appointments),
-            "filter_period": filter_period_str
-        }
+        # Appwrite does not support server-side aggregation (SUM), so we stream the
+        # Completed appointments page by page and aggregate them in one pass.
+        return await build_financials_report(period_start, period_end, filter_period_str, shop_id=shop_id)
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"An error occurred while generating financials: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate financial report.")
     
+@router.get("/analytics/services", response_model=schemas.ServiceAnalyticsReport)
+async def get_manager_service_analytics(
+    shop_id: str,
+    date: Optional[str] = FastQuery(None, description="A specific date in YYYY-MM-DD format."),
+    month: Optional[str] = FastQuery(None, description="A specific month in YYYY-MM format.")
+):
+    """
+    Breaks a shop's Completed appointments down by service: how often each
+    service was sold, the revenue it earned and its average duration.
+    Defaults to the current day.
+    """
+    period_start, period_end, filter_period_str = resolve_period(date, month)
+
+    try:
+        return await build_service_analytics_report(period_start, period_end, filter_period_str, shop_id=shop_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"An error occurred while generating service analytics: {e}")
+        raise HTTPException(status_code=500, detail="Failed to generate service analytics.")
+
+@router.get("/utilization", response_model=schemas.UtilizationReport)
+async def get_barber_utilization(
+    shop_id: str,
+    start_date: Optional[str] = FastQuery(None, description="First day in YYYY-MM-DD format. Defaults to today."),
+    end_date: Optional[str] = FastQuery(None, description="Last day (inclusive) in YYYY-MM-DD format. Defaults to start_date.")
+):
+    """
+    Reports how busy each barber's chair is, per day over a date range:
+    scheduled, booked and idle minutes and the largest idle gap.
+    """
+    if not start_date:
+        start_date = datetime.now(TARGET_TIMEZONE).strftime("%Y-%m-%d")
+    first_day, last_day = resolve_date_range(start_date, end_date or start_date)
+
+    try:
+        return await build_utilization_report(shop_id, first_day, last_day)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"An error occurred while generating utilization: {e}")
+        raise HTTPException(status_code=500, detail="Failed to generate utilization report.")
+
 @router.get("/staff/{barberId}/schedule", response_model=schemas.WeeklyScheduleResponse)
 async def get_barber_schedule(barberId: str):
     """
@@ -336,7 +475,7 @@ async def get_barber_schedule(barberId: str):
     """
     try:
         # 1. Fetch all existing schedule documents for this barber
-        existing_schedule_response = databases.list_documents(
+        existing_schedule_response = await backend.list_documents(
             database_id=APPWRITE_DATABASE_ID,
             collection_id=COLLECTION_SCHEDULES,
             queries=[Query.equal("barber_id", [barberId]), Query.limit(7)] # Limit to 7 for safety
@@ -372,6 +511,8 @@ async def get_barber_schedule(barberId: str):
         
         return {"schedules": full_week_schedule}
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"An error occurred while fetching schedule: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch barber's schedule.")
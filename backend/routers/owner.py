@@ -1,16 +1,20 @@
 # backend/routers/owner.py
 
-import calendar
-from fastapi import APIRouter, HTTPException, Query as FastQuery
+from fastapi import APIRouter, HTTPException, Response, Query as FastQuery
 from typing import List, Optional
 from appwrite.query import Query
 
 # Import Pydantic schemas and Appwrite client details
 import schemas
-from appwrite_client import databases, APPWRITE_DATABASE_ID, COLLECTION_SHOPS, COLLECTION_BARBERS, COLLECTION_APPOINTMENTS 
-from utils import TARGET_TIMEZONE
-from datetime import datetime, timedelta, timezone
+from appwrite_client import APPWRITE_DATABASE_ID, COLLECTION_SHOPS, COLLECTION_BARBERS
+from logic.financials import resolve_period, build_financials_report, stream_documents
+from logic.service_analytics import build_service_analytics_report
+from logic.staff import build_staff_summary
+from reference_cache import reference_cache
+from resilience import backend
 
+# The largest page the staff directory serves at once
+MAX_STAFF_PAGE = 100
 
 # Create a new router object for the owner dashboard
 router = APIRouter(
@@ -24,27 +28,56 @@ async def get_all_shops_for_owner():
     Fetches a list of all shops in the business for the owner's dashboard.
     """
     try:
-        # This is a simple fetch of all documents from the Shops collection
-        response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTION_SHOPS
-        )
-        
-        return response['documents']
+        # Shops are read-mostly, so they are served from the reference cache
+        return reference_cache.shops()
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"An error occurred fetching shops for owner: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch shop list.")
     
+def _search_cached_staff(shop_id: Optional[str], search: str) -> List[dict]:
+    """
+    Barbers whose name contains every word of `search` (case-insensitive),
+    in ID order. Filtered from the reference cache, so no fulltext index is needed.
+    """
+    words = search.lower().split()
+    return sorted(
+        (barber for barber in reference_cache.barbers(shop_id=shop_id)
+         if all(word in barber['name'].lower() for word in words)),
+        key=lambda barber: barber['$id']
+    )
+
+
 @router.get("/staff", response_model=List[schemas.BarberDetails])
 async def get_all_staff_for_owner(
-    shop_id: Optional[str] = FastQuery(None, description="Optional: Filter the staff list by a specific shop ID.")
+    response: Response,
+    shop_id: Optional[str] = FastQuery(None, description="Optional: Filter the staff list by a specific shop ID."),
+    search: Optional[str] = FastQuery(None, description="Optional: Only staff whose name contains these words."),
+    cursor: Optional[str] = FastQuery(None, description="The X-Next-Cursor value from the previous page. Requires `limit`."),
+    limit: Optional[int] = FastQuery(None, ge=1, le=MAX_STAFF_PAGE, description="Page size. Omit to get every match.")
 ):
     """
     Fetches a list of all staff (barbers) across all shops.
-    Can be optionally filtered by a specific shop ID.
+    Can be optionally filtered by a specific shop ID and searched by name.
+
+    With `limit`, one page is returned and the cursor for the next page is
+    sent in the `X-Next-Cursor` response header (absent on the last page).
+    Without it, every matching barber is returned.
     """
+    if cursor and limit is None:
+        raise HTTPException(status_code=400, detail="'cursor' requires 'limit'.")
     try:
+        if search and search.strip():
+            staff = _search_cached_staff(shop_id, search)
+            if cursor:
+                staff = [barber for barber in staff if barber['$id'] > cursor]
+            if limit is not None and len(staff) > limit:
+                staff = staff[:limit]
+                response.headers["X-Next-Cursor"] = staff[-1]['$id']
+            return staff
+
         # Prepare a list to hold our Appwrite queries
         queries = []
 
@@ -52,20 +85,45 @@ async def get_all_staff_for_owner(
         if shop_id:
             queries.append(Query.equal("shop_id", [shop_id]))
 
-        # We can also add pagination for large staff lists
-        queries.append(Query.limit(100)) # Limit to 100 barbers for this call
-
-        response = databases.list_documents(
+        if limit is None:
+            # Page through the whole directory with cursors, so large chains are never truncated
+            staff = []
+            async for page in stream_documents(COLLECTION_BARBERS, queries):
+                staff.extend(page)
+            return staff
+
+        page_queries = queries + [Query.limit(limit)]
+        if cursor:
+            page_queries.append(Query.cursor_after(cursor))
+        page_response = await backend.list_documents(
             database_id=APPWRITE_DATABASE_ID,
             collection_id=COLLECTION_BARBERS,
-            queries=queries
+            queries=page_queries
         )
-        
-        return response['documents']
+        staff = page_response['documents']
+        if len(staff) == limit:
+            response.headers["X-Next-Cursor"] = staff[-1]['$id']
+        return staff
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"An error occurred fetching staff for owner: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch staff list.")
+
+
+@router.get("/staff/summary", response_model=List[schemas.ShopStaffSummary])
+async def get_staff_summary_for_owner(
+    shop_id: Optional[str] = FastQuery(None, description="Optional: Only this shop.")
+):
+    """
+    Each shop's headcount and how many of its barbers are on shift right now.
+    """
+    try:
+        return build_staff_summary(shop_id)
+    except Exception as e:
+        print(f"An error occurred building the staff summary: {e}")
+        raise HTTPException(status_code=500, detail="Failed to build the staff summary.")
     
 
 @router.get("/financials", response_model=schemas.FinancialsReport)
@@ -75,104 +133,51 @@ async def get_owner_financials(
     month: Optional[str] = FastQuery(None, description="A specific month in YYYY-MM format.")
 ):
     """
-    Calculates financial totals for a specific day or month.
+    Calculates financial totals for a specific day or month, with a per-day
+    series and per-barber totals computed in the same pass.
     Can be filtered by a single shop, or aggregated across all shops.
     Defaults to today's data for all shops if no parameters are given.
     """
-    if date and month:
-        raise HTTPException(status_code=400, detail="Please provide either a 'date' or a 'month', not both.")
-
-    filter_period_str = ""
-
     # --- Determine the time range for the query (same logic as manager's) ---
-    if date:
-        try:
-            target_date = datetime.strptime(date, "%Y-%m-%d").date()
-            filter_period_str = f"for date {date}"
-            day_start_local = datetime.combine(target_date, datetime.min.time()).replace(tzinfo=TARGET_TIMEZONE)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid date format. Please use YYYY-MM-DD.")
-    elif month:
-        try:
-            year, month_num = map(int, month.split('-'))
-            filter_period_str = f"for month {month}"
-            day_start_local = datetime(year, month_num, 1, tzinfo=TARGET_TIMEZONE)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid month format. Please use YYYY-MM.")
-    else:
-        now_local = datetime.now(TARGET_TIMEZONE)
-        target_date = now_local.date()
-        filter_period_str = f"for today, {target_date.strftime('%Y-%m-%d')}"
-        day_start_local = datetime.combine(target_date, datetime.min.time()).replace(tzinfo=TARGET_TIMEZONE)
-    
-    if month:
-        _, last_day = calendar.monthrange(day_start_local.year, day_start_local.month)
-        day_end_local = day_start_local.replace(day=last_day, hour=23, minute=59, second=59)
-    else: # Daily
-        day_end_local = day_start_local + timedelta(days=1)
+    period_start, period_end, filter_period_str = resolve_period(date, month)
 
-    day_start_utc = day_start_local.astimezone(timezone.utc)
-    day_end_utc = day_end_local.astimezone(timezone.utc)
+    # ** THE KEY DIFFERENCE FOR THE OWNER **
+    # The shop filter is optional
+    if shop_id:
+        filter_period_str += f" for shop {shop_id}"
+    else:
+        filter_period_str += " for ALL shops"
 
     try:
-        # --- Build Queries ---
-        queries = [
-            Query.equal("status", ["Completed"]),
-            Query.greater_than_equal("start_time", day_start_utc.isoformat()),
-            Query.less_than("start_time", day_end_utc.isoformat())
-        ]
-        
-        # ** THE KEY DIFFERENCE FOR THE OWNER **
-        # Conditionally add the shop_id filter if it's provided
-        if shop_id:
-            queries.append(Query.equal("shop_id", [shop_id]))
-            filter_period_str += f" for shop {shop_id}"
-        else:
-            filter_period_str += " for ALL shops"
-
-        # --- Query and Aggregate Data (with pagination) ---
-        all_completed_appointments = []
-        offset = 0
-        limit = 100
-
-        while True:
-            paginated_queries = queries + [Query.limit(limit), Query.offset(offset)]
-            response = databases.list_documents(
-                database_id=APPWRITE_DATABASE_ID,
-                collection_id=COLLECTION_APPOINTMENTS,
-                queries=paginated_queries
-            )
-            
-            documents = response['documents']
-            all_completed_appointments.extend(documents)
-            
-            if len(documents) < limit:
-                break
-            
-            offset += limit
-
-        # --- Calculate Totals ---
-        total_revenue = 0.0
-        total_pre_tax = 0.0
-        
-        for appt in all_completed_appointments:
-            total_revenue += appt.get('total_amount', 0)
-            total_pre_tax += appt.get('bill_amount', 0)
-        
-        total_tax = total_revenue - total_pre_tax
-        
-        return {
-            "total_revenue_before_tax": round(total_pre_tax, 2),
-            "total_tax_collected": round(total_tax, 2),
-            "total_revenue_after_tax": round(total_revenue, 2),
-            "total_appointments": len(all_completed_appointments),
-            "filter_period": filter_period_str
-        }
+        return await build_financials_report(period_start, period_end, filter_period_str, shop_id=shop_id)
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"An error occurred while generating owner financials: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate financial report.")
     
+@router.get("/analytics/services", response_model=schemas.ServiceAnalyticsReport)
+async def get_owner_service_analytics(
+    shop_id: Optional[str] = FastQuery(None, description="Optional: Filter analytics by a specific shop ID."),
+    date: Optional[str] = FastQuery(None, description="A specific date in YYYY-MM-DD format."),
+    month: Optional[str] = FastQuery(None, description="A specific month in YYYY-MM format.")
+):
+    """
+    Breaks Completed appointments down by service for one shop or all shops:
+    count, revenue and average duration per service. Defaults to today.
+    """
+    period_start, period_end, filter_period_str = resolve_period(date, month)
+    filter_period_str += f" for shop {shop_id}" if shop_id else " for ALL shops"
+
+    try:
+        return await build_service_analytics_report(period_start, period_end, filter_period_str, shop_id=shop_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"An error occurred while generating owner service analytics: {e}")
+        raise HTTPException(status_code=500, detail="Failed to generate service analytics.")
+    
 @router.post("/shops", response_model=schemas.Shop, status_code=201)
 async def create_shop(shop_data: schemas.ShopCreate):
     """
@@ -183,17 +188,20 @@ async def create_shop(shop_data: schemas.ShopCreate):
         new_shop_data = shop_data.dict()
 
         # Call the Appwrite SDK to create the new document
-        created_document = databases.create_document(
+        created_document = await backend.create_document(
             database_id=APPWRITE_DATABASE_ID,
             collection_id=COLLECTION_SHOPS,
             document_id='unique()', # Let Appwrite generate a unique ID
             data=new_shop_data
         )
+        await reference_cache.invalidate("shops")
 
         # Return the full document of the newly created shop
         # FastAPI will validate it against the `schemas.Shop` response model
         return created_document
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"An error occurred while creating a new shop: {e}")
         raise HTTPException(status_code=500, detail="Failed to create the new shop.")
\ No newline at end of file
@@ -88,9 +88,128 @@ class AppointmentDetails(AppwriteBaseModel):
     services_snapshot: str # The response will contain the JSON string
 
 
+class AppointmentDelta(BaseModel):
+    """What changed in a manager's appointment list since the client's last poll."""
+    appointments: List[AppointmentDetails] # Created or updated rows still in the view
+    cancelled_ids: List[str] # Rows the client should drop
+    watermark: str # Pass back as `since` on the next poll
+
+class NextAvailability(BaseModel):
+    """The first date with an opening for a barber (or "any"), and every fitting slot on it."""
+    shop_id: str
+    barber_id: str
+    date: Optional[str] = None # None if nothing fits within the horizon
+    slots: List[str]
+    barber_ids: List[str] # The barbers with at least one of the slots
+    days_searched: int
+
+
+class ShopAvailability(BaseModel):
+    """One shop's "any barber" slots for a date."""
+    shop_id: str
+    shop_name: str
+    slots: List[str]
+    barber_ids: List[str] # The barbers with at least one of the slots
+
+
+class CrossShopAvailability(BaseModel):
+    date: str
+    total_duration: int
+    shops: List[ShopAvailability]
+
+
+class RebookSuggestion(BaseModel):
+    """A returning customer's last booking, with the first open slots to book it again."""
+    customer_name: str
+    phone: str
+    visit_count: int
+    last_visit_at: Optional[datetime] = None
+    shop_id: Optional[str] = None
+    shop_name: Optional[str] = None
+    barber_id: Optional[str] = None # "any" if their last barber has left the shop
+    barber_name: Optional[str] = None
+    services: List[ServiceSnapshot]
+    total_duration: int
+    date: Optional[str] = None # First date with open slots, or None if none were found
+    slots: List[str]
+
+
+class WaitlistCreate(BaseModel):
+    """A customer asking to be offered a slot that opens up through a cancellation."""
+    customer_name: str
+    customer_phone: str
+    customer_gender: Optional[str] = None
+    shop_id: str
+    shop_name: str
+    barber_id: str = "any"
+    barber_name: Optional[str] = None
+    date_from: str # YYYY-MM-DD, inclusive
+    date_to: str   # YYYY-MM-DD, inclusive
+    service_snapshots: List[ServiceSnapshot]
+    tax_rate: float
+    auto_book: bool = False # Book the freed slot straight away instead of offering it
+
+
+class WaitlistEntry(AppwriteBaseModel):
+    """A waitlist registration and, once a slot has freed up, the slot it was offered or booked into."""
+    customer_name: str
+    customer_phone: str
+    shop_id: str
+    shop_name: str
+    barber_id: str
+    date_from: str
+    date_to: str
+    duration: int
+    auto_book: bool
+    status: Literal["Waiting", "Offered", "Booked", "Withdrawn"]
+    offer_barber_id: Optional[str] = None
+    offer_barber_name: Optional[str] = None
+    offer_start_time: Optional[datetime] = None
+    offer_expires_at: Optional[datetime] = None
+    appointment_id: Optional[str] = None
+
+
+class BarberAssignment(BaseModel):
+    """The barber chosen by the assignment engine for an "Any Barber" slot."""
+    barber_id: str
+    barber_name: str
+    date: str
+    start_time: str # "HH:MM"
+    end_time: str   # "HH:MM"
+    idle_fragment_minutes: int # Unbookable idle minutes the booking leaves around it
+
+
 class AppointmentStatusUpdate(BaseModel):
     status: Literal["InProgress", "Completed", "Cancelled", "Booked"]
 
+class BulkStatusItem(BaseModel):
+    appointment_id: str
+    status: Literal["InProgress", "Completed", "Cancelled", "Booked"]
+
+class BulkStatusRule(BaseModel):
+    """e.g. every InProgress appointment of a shop today -> Completed"""
+    shop_id: str
+    date: Optional[str] = None # YYYY-MM-DD, defaults to today
+    barber_id: Optional[str] = None
+    from_status: Literal["InProgress", "Completed", "Cancelled", "Booked"]
+    to_status: Literal["InProgress", "Completed", "Cancelled", "Booked"]
+
+class BulkStatusUpdate(BaseModel):
+    """Either an explicit list of changes or a rule, not both."""
+    items: Optional[List[BulkStatusItem]] = None
+    rule: Optional[BulkStatusRule] = None
+
+class BulkStatusResult(BaseModel):
+    appointment_id: str
+    status: str
+    ok: bool
+    error: Optional[str] = None
+
+class BulkStatusResponse(BaseModel):
+    updated: int
+    failed: int
+    results: List[BulkStatusResult]
+
 class BarberCreate(BaseModel):
     name: str
     contact_info: Optional[str] = None
@@ -101,6 +220,12 @@ class BarberDetails(AppwriteBaseModel):
     contact_info: Optional[str] = None
     shop_id: str
 
+class ShopStaffSummary(BaseModel):
+    shop_id: str
+    shop_name: str
+    headcount: int
+    on_shift: int # Barbers inside their schedule right now, while the shop is open
+
 
 class DailySchedule(BaseModel):
     day_of_week: Literal["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
@@ -112,12 +237,99 @@ class DailySchedule(BaseModel):
 class WeeklyScheduleUpdate(BaseModel):
     schedules: List[DailySchedule]
 
+class DailyShopTiming(BaseModel):
+    day_of_week: Literal["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    open_time: str # e.g., "09:00"
+    close_time: str # e.g., "21:00"
+    is_closed: bool
+
+# A weekly pattern applied to many barbers (and optionally the shop hours) at once
+class ScheduleTemplate(BaseModel):
+    schedules: List[DailySchedule] = []
+    barber_ids: Optional[List[str]] = None # None = every barber of the shop
+    shop_timings: Optional[List[DailyShopTiming]] = None
+
+class ScheduleTemplateChange(BaseModel):
+    target: Literal["barber_schedule", "shop_timing"]
+    barber_id: Optional[str] = None
+    day_of_week: str
+    action: Literal["create", "update"]
+    before: Optional[dict] = None
+    after: dict
+    ok: Optional[bool] = None # None on a dry run
+    error: Optional[str] = None
+
+class ScheduleTemplateResult(BaseModel):
+    dry_run: bool
+    barbers: int
+    creates: int
+    updates: int
+    unchanged: int
+    failed: int
+    changes: List[ScheduleTemplateChange]
+
+class DailyFinancials(BaseModel):
+    date: str # YYYY-MM-DD in the shop's timezone
+    revenue_before_tax: float
+    tax_collected: float
+    revenue_after_tax: float
+    appointments: int
+
+class BarberFinancials(BaseModel):
+    barber_id: str
+    barber_name: str
+    revenue_before_tax: float
+    tax_collected: float
+    revenue_after_tax: float
+    appointments: int
+
 class FinancialsReport(BaseModel):
     total_revenue_before_tax: float
     total_tax_collected: float
     total_revenue_after_tax: float
     total_appointments: int
     filter_period: str
+    # One entry per day of the period (zero-filled), for drawing charts in one request
+    daily_series: List[DailyFinancials] = []
+    barber_breakdown: List[BarberFinancials] = []
+
+class ServiceAnalytics(BaseModel):
+    service_id: str
+    name: str
+    count: int
+    revenue: float # Pre-tax, from the price captured in the appointment's snapshot
+    revenue_share: float
+    average_duration_minutes: float
+
+class ServiceAnalyticsReport(BaseModel):
+    filter_period: str
+    total_appointments: int
+    total_service_revenue: float
+    services: List[ServiceAnalytics]
+
+class DailyUtilization(BaseModel):
+    date: str
+    scheduled_minutes: int
+    booked_minutes: int
+    idle_minutes: int
+    largest_idle_gap_minutes: int
+    utilization: float # booked / scheduled, 0 when the barber is not scheduled
+
+class BarberUtilization(BaseModel):
+    barber_id: str
+    barber_name: str
+    scheduled_minutes: int
+    booked_minutes: int
+    idle_minutes: int
+    largest_idle_gap_minutes: int
+    utilization: float
+    days: List[DailyUtilization]
+
+class UtilizationReport(BaseModel):
+    shop_id: str
+    start_date: str
+    end_date: str
+    barbers: List[BarberUtilization]
 
 class DailyScheduleResponse(BaseModel):
     day_of_week: str
@@ -0,0 +1,257 @@
+# backend/shared_snapshot.py
+
+import asyncio
+import json
+import mmap
+import os
+import re
+import stat
+import struct
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError: # Windows: no flock, so each worker keeps its own cache
+    fcntl = None
+
+from appwrite_client import APPWRITE_PROJECT_ID, APPWRITE_DATABASE_ID
+
+
+def _private_directory() -> Optional[str]:
+    """
+    A directory only this user can enter: $XDG_RUNTIME_DIR, or a per-user
+    directory under the system temp dir. None if one exists but is not safe
+    (someone else's, a symlink, or open to other users).
+    """
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    directory = os.path.join(runtime_dir or tempfile.gettempdir(), f"barber-shop-{os.getuid()}")
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    except OSError as e:
+        print(f"Cannot create the directory for host-shared files {directory}: {e}")
+        return None
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        print(f"Not using {directory} for host-shared files: it is not a private directory.")
+        return None
+    return directory
+
+
+def host_file_path(name: str, extension: str) -> Optional[str]:
+    """
+    A file shared by this deployment's workers on the host, e.g. the
+    reference snapshot or an election lock. Keyed by Appwrite project and
+    database, so deployments on one host never share one. None if there is
+    no private directory to put it in.
+    """
+    directory = _private_directory()
+    if directory is None:
+        return None
+    scope = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{APPWRITE_PROJECT_ID}-{APPWRITE_DATABASE_ID}")
+    return os.path.join(directory, f"{name}-{scope}.{extension}")
+
+
+# --- Snapshot Configuration ---
+SNAPSHOT_ENABLED = os.getenv("REFERENCE_SNAPSHOT_ENABLED", "true").lower() == "true" and fcntl is not None
+SNAPSHOT_PATH = os.getenv("REFERENCE_SNAPSHOT_PATH") or (host_file_path("reference", "snapshot") if SNAPSHOT_ENABLED else None)
+# Without a safe place for the files, each worker keeps its own cache
+SNAPSHOT_ENABLED = SNAPSHOT_ENABLED and SNAPSHOT_PATH is not None
+# How often the refresher checks whether the snapshot needs rebuilding, and
+# how often readers check whether it was replaced
+SNAPSHOT_POLL_SECONDS = float(os.getenv("REFERENCE_SNAPSHOT_POLL_SECONDS", "1"))
+# A snapshot older than this is rebuilt even if no write bumped the version
+SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("REFERENCE_SNAPSHOT_MAX_AGE_SECONDS", "300"))
+
+# Snapshot file layout: header, then a JSON payload of {collection_name: [documents]}
+#   magic (8s) | built_from_version (Q) | built_at (d) | payload_length (Q)
+SNAPSHOT_MAGIC = b"BSREFSN1"
+HEADER_FORMAT = "<8sQdQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# Version file layout: data_version (Q), bumped by every reference-data write
+VERSION_FORMAT = "<Q"
+VERSION_SIZE = struct.calcsize(VERSION_FORMAT)
+
+
+class SharedSnapshot:
+    """
+    A host-wide snapshot of the reference collections shared by every uvicorn
+    worker. One elected refresher process writes it and is the only one that
+    queries Appwrite for it; the write endpoints bump a version counter in a
+    small shared memory-mapped file so the refresher knows to rebuild.
+
+    The payload is JSON, so every worker still parses it into its own Python
+    objects (once per snapshot, not per read); what is shared is the fetch,
+    not the memory. Readers look for a replaced file at most every
+    SNAPSHOT_POLL_SECONDS, or on every read while waiting for a snapshot
+    that includes their own write.
+    """
+
+    def __init__(self, path: Optional[str] = SNAPSHOT_PATH):
+        self.path = path
+        self.version_path = f"{path}.version"
+        self.lock_path = f"{path}.lock"
+        self._version_file = None
+        self._version_map = None
+        self._lock_file = None
+        self.is_refresher = False
+        # This worker's parsed copy, keyed by the snapshot file identity
+        self._parsed_identity = None
+        self._parsed_version = 0
+        self._parsed_built_at = 0.0
+        self._parsed: Dict[str, List[dict]] = {}
+        self._checked_at = float("-inf")
+        # After this worker writes, it must not read snapshots older than its write
+        self._min_version = 0
+
+    # --- Version Counter ---
+
+    def _open_version_map(self):
+        if self._version_map is None:
+            fd = os.open(self.version_path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._version_file = os.fdopen(fd, "r+b")
+            if os.fstat(fd).st_size < VERSION_SIZE:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    if os.fstat(fd).st_size < VERSION_SIZE:
+                        os.ftruncate(fd, VERSION_SIZE)
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            self._version_map = mmap.mmap(fd, VERSION_SIZE)
+        return self._version_map
+
+    def data_version(self) -> int:
+        return struct.unpack_from(VERSION_FORMAT, self._open_version_map())[0]
+
+    def bump_version(self) -> int:
+        """Marks the reference data as changed. Called by the write endpoints."""
+        version_map = self._open_version_map()
+        fd = self._version_file.fileno()
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            new_version = struct.unpack_from(VERSION_FORMAT, version_map)[0] + 1
+            struct.pack_into(VERSION_FORMAT, version_map, 0, new_version)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._min_version = new_version
+        return new_version
+
+    # --- Reading (every worker) ---
+
+    def _load(self, force: bool = False):
+        """
+        Re-reads and parses the snapshot file if the refresher replaced it.
+        Checked at most every poll interval, unless this worker is waiting
+        for a snapshot that includes its own write.
+        """
+        now = time.monotonic()
+        up_to_date = self._parsed_version >= self._min_version
+        if not force and up_to_date and now - self._checked_at < SNAPSHOT_POLL_SECONDS:
+            return
+        self._checked_at = now
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        if identity == self._parsed_identity or stat.st_size < HEADER_SIZE:
+            return
+
+        with open(self.path, "rb") as snapshot_file:
+            magic, built_from_version, built_at, payload_length = struct.unpack(HEADER_FORMAT, snapshot_file.read(HEADER_SIZE))
+            if magic != SNAPSHOT_MAGIC:
+                return
+            payload = json.loads(snapshot_file.read(payload_length))
+
+        self._parsed = payload
+        self._parsed_identity = identity
+        self._parsed_version = built_from_version
+        self._parsed_built_at = built_at
+
+    def read(self, name: str) -> Optional[List[dict]]:
+        """
+        Returns a collection from the shared snapshot, or None if there is no
+        usable snapshot and the caller should fetch from Appwrite itself.
+        """
+        self._load()
+        if name not in self._parsed:
+            return None
+        if self._parsed_version < self._min_version:
+            return None # Our own write is not in the snapshot yet
+        if time.time() - self._parsed_built_at > SNAPSHOT_MAX_AGE_SECONDS * 2:
+            return None # The refresher appears to be gone
+        return self._parsed[name]
+
+    # --- Writing (the elected refresher only) ---
+
+    def try_become_refresher(self) -> bool:
+        """Elects this process as the host's refresher if no other process holds the lock."""
+        if self.is_refresher:
+            return True
+        if self._lock_file is None:
+            self._lock_file = os.fdopen(os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600), "a+b")
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self.is_refresher = True
+        print(f"Process {os.getpid()} is the reference snapshot refresher.")
+        return True
+
+    def write(self, collections: Dict[str, List[dict]], built_from_version: int):
+        """Atomically replaces the snapshot file with a new payload."""
+        payload = json.dumps(collections, separators=(",", ":")).encode("utf-8")
+        header = struct.pack(HEADER_FORMAT, SNAPSHOT_MAGIC, built_from_version, time.time(), len(payload))
+
+        directory = os.path.dirname(self.path) or "."
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(header)
+                temp_file.write(payload)
+            os.chmod(temp_path, 0o600)
+            os.replace(temp_path, self.path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+
+    def needs_refresh(self) -> bool:
+        self._load(force=True)
+        if not self._parsed:
+            return True
+        if self._parsed_version != self.data_version():
+            return True
+        return time.time() - self._parsed_built_at > SNAPSHOT_MAX_AGE_SECONDS
+
+    async def run_refresher(self, fetch_collections):
+        """
+        Background loop run by every worker. Only the elected process rebuilds
+        the snapshot; the others keep trying in case the refresher exits.
+        `fetch_collections` is a blocking callable returning {name: documents}.
+        """
+        while True:
+            try:
+                if self.try_become_refresher() and self.needs_refresh():
+                    version = self.data_version()
+                    collections = await asyncio.to_thread(fetch_collections)
+                    self.write(collections, version)
+                    print(f"Reference snapshot rebuilt at version {version}.")
+            except Exception as e:
+                print(f"Reference snapshot refresh failed: {e}")
+            await asyncio.sleep(SNAPSHOT_POLL_SECONDS)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": SNAPSHOT_ENABLED,
+            "path": self.path,
+            "is_refresher": self.is_refresher,
+            "data_version": self.data_version() if SNAPSHOT_ENABLED else None,
+            "snapshot_version": self._parsed_version,
+            "snapshot_age_seconds": round(time.time() - self._parsed_built_at, 1) if self._parsed_built_at else None,
+        }
+
+
+shared_snapshot = SharedSnapshot()
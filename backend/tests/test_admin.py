@@ -0,0 +1,58 @@
+# backend/tests/test_admin.py
+
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import profiling
+from profiling import ProfileSession, sign_profile_request
+from routers import admin as admin_router
+
+SECRET = "test-secret"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(admin_router, "verify_profile_header", lambda value: profiling.verify_profile_header(value, secret=SECRET))
+    app = FastAPI()
+    app.include_router(admin_router.router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("method, path", [
+    ("GET", "/api/admin/backend"),
+    ("GET", "/api/admin/admission"),
+    ("GET", "/api/admin/caches"),
+    ("GET", "/api/admin/queries"),
+    ("DELETE", "/api/admin/queries"),
+    ("GET", "/api/admin/profiles"),
+    ("GET", "/api/admin/profiles/unknown"),
+])
+def test_every_admin_endpoint_needs_a_signed_header(client, method, path):
+    assert client.request(method, path).status_code == 403
+    assert client.request(method, path, headers={"X-Profile": sign_profile_request(secret="wrong")}).status_code == 403
+    signed = client.request(method, path, headers={"X-Profile": sign_profile_request(secret=SECRET)})
+    assert signed.status_code in (200, 204, 404)
+
+
+def test_collapsed_can_be_read_while_samples_are_added():
+    session = ProfileSession("p1", "GET", "/api/shops", "", "header")
+    stop = threading.Event()
+
+    def sample():
+        count = 0
+        while not stop.is_set():
+            session.add_sample([f"main;frame{count % 500}"])
+            count += 1
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    try:
+        for _ in range(200):
+            session.collapsed()
+    finally:
+        stop.set()
+        sampler.join()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in session.collapsed().splitlines()) == session.sample_count
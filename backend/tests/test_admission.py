@@ -0,0 +1,98 @@
+# backend/tests/test_admission.py
+
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Overloaded
+
+
+def _controller(max_concurrency: int, **limits) -> AdmissionController:
+    controller = AdmissionController(max_concurrency=max_concurrency)
+    for name, limit in limits.items():
+        controller.classes[name].limit = limit
+    return controller
+
+
+def test_class_capped_waiter_does_not_block_other_classes():
+    async def scenario():
+        controller = _controller(4, booking=1)
+        await controller.acquire("booking")
+        # A second booking queues behind its own class limit...
+        queued = asyncio.ensure_future(controller.acquire("booking"))
+        await asyncio.sleep(0)
+        # ...which must not stop a lower-priority class while the pool has room
+        await asyncio.wait_for(controller.acquire("browse"), timeout=0.5)
+        assert controller.in_flight == 2
+
+        controller.release("booking")
+        await asyncio.wait_for(queued, timeout=0.5)
+        assert controller.classes["booking"].in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_waiter_with_room_is_served_before_direct_admission():
+    async def scenario():
+        controller = _controller(1)
+        await controller.acquire("default")
+        waiting_booking = asyncio.ensure_future(controller.acquire("booking"))
+        await asyncio.sleep(0)
+
+        controller.release("default")
+        # The freed slot went to the queued booking, so browse has to wait
+        browse = asyncio.ensure_future(controller.acquire("browse"))
+        await asyncio.wait_for(waiting_booking, timeout=0.5)
+        await asyncio.sleep(0)
+        assert not browse.done()
+        assert controller.classes["booking"].in_flight == 1
+
+        controller.release("booking")
+        await asyncio.wait_for(browse, timeout=0.5)
+
+    asyncio.run(scenario())
+
+
+def test_higher_priority_waiters_are_woken_first():
+    async def scenario():
+        controller = _controller(1)
+        await controller.acquire("default")
+        browse = asyncio.ensure_future(controller.acquire("browse"))
+        await asyncio.sleep(0)
+        booking = asyncio.ensure_future(controller.acquire("booking"))
+        await asyncio.sleep(0)
+
+        controller.release("default")
+        await asyncio.wait_for(booking, timeout=0.5)
+        assert not browse.done()
+        controller.release("booking")
+        await asyncio.wait_for(browse, timeout=0.5)
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_shed_with_429():
+    async def scenario():
+        controller = _controller(1)
+        controller.classes["browse"].queue_size = 0
+        await controller.acquire("default")
+        with pytest.raises(Overloaded) as shed:
+            await controller.acquire("browse")
+        assert shed.value.status_code == 429
+        assert controller.classes["browse"].shed_queue_full == 1
+
+    asyncio.run(scenario())
+
+
+def test_long_wait_is_shed_with_503():
+    async def scenario():
+        controller = _controller(1)
+        controller.classes["browse"].max_wait_seconds = 0.05
+        await controller.acquire("default")
+        with pytest.raises(Overloaded) as shed:
+            await controller.acquire("browse")
+        assert shed.value.status_code == 503
+        assert controller.classes["browse"].queued == 0
+        assert controller._waiters == []
+
+    asyncio.run(scenario())
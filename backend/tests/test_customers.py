@@ -0,0 +1,19 @@
+# backend/tests/test_customers.py
+
+import pytest
+
+from logic.customers import normalize_phone
+
+
+@pytest.mark.parametrize("phone", ["+91 98765-43210", "098765 43210", "9876543210", "(91) 98765 43210"])
+def test_formats_of_one_number_normalize_alike(phone):
+    assert normalize_phone(phone) == "919876543210"
+
+
+def test_foreign_numbers_keep_their_country_code():
+    assert normalize_phone("+44 20 7946 0958") == "442079460958"
+
+
+@pytest.mark.parametrize("phone", ["", None, "12345", "not a phone", "1" * 16])
+def test_non_numbers_are_rejected(phone):
+    assert normalize_phone(phone) is None
@@ -0,0 +1,162 @@
+# backend/tests/test_idempotency.py
+
+import asyncio
+import re
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+import schemas
+from idempotency import IdempotencyStore, document_id_for, request_fingerprint
+from routers import booking as booking_router
+
+
+class _Operation:
+    """Counts its calls and returns (or raises) a fixed outcome, optionally after a delay."""
+
+    def __init__(self, result=None, error=None, delay: float = 0):
+        self.result = result
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_finished_request_is_replayed():
+    async def scenario():
+        store = IdempotencyStore()
+        operation = _Operation(result={"$id": "a1"})
+        assert await store.run("book", "key", "fp", operation) == ({"$id": "a1"}, False)
+        assert await store.run("book", "key", "fp", operation) == ({"$id": "a1"}, True)
+        assert operation.calls == 1
+        assert store.counters["replayed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_retry_joins_the_request_in_flight():
+    async def scenario():
+        store = IdempotencyStore()
+        operation = _Operation(result="done", delay=0.05)
+        first, second = await asyncio.gather(
+            store.run("book", "key", "fp", operation),
+            store.run("book", "key", "fp", operation),
+        )
+        assert first == ("done", False)
+        assert second == ("done", True)
+        assert operation.calls == 1
+        assert store.counters["joined_in_flight"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_client_errors_are_replayed():
+    async def scenario():
+        store = IdempotencyStore()
+        operation = _Operation(error=HTTPException(status_code=409, detail="taken"))
+        for _ in range(2):
+            with pytest.raises(HTTPException) as error:
+                await store.run("book", "key", "fp", operation)
+            assert error.value.status_code == 409
+        assert operation.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_server_errors_are_not_stored():
+    async def scenario():
+        store = IdempotencyStore()
+        failing = _Operation(error=HTTPException(status_code=503, detail="down"))
+        with pytest.raises(HTTPException):
+            await store.run("book", "key", "fp", failing)
+        succeeding = _Operation(result="ok")
+        assert await store.run("book", "key", "fp", succeeding) == ("ok", False)
+        assert succeeding.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_reused_key_with_a_different_body_is_rejected():
+    async def scenario():
+        store = IdempotencyStore()
+        await store.run("book", "key", request_fingerprint({"slot": "10:00"}), _Operation(result="ok"))
+        other = _Operation(result="other")
+        with pytest.raises(HTTPException) as error:
+            await store.run("book", "key", request_fingerprint({"slot": "11:00"}), other)
+        assert error.value.status_code == 422
+        assert other.calls == 0
+
+    asyncio.run(scenario())
+
+
+def test_keys_are_scoped_and_validated():
+    async def scenario():
+        store = IdempotencyStore()
+        await store.run("book", "key", "fp", _Operation(result="booking"))
+        assert await store.run("waitlist", "key", "fp", _Operation(result="waitlist")) == ("waitlist", False)
+        with pytest.raises(HTTPException) as error:
+            await store.run("book", "", "fp", _Operation(result="ok"))
+        assert error.value.status_code == 400
+
+    asyncio.run(scenario())
+
+
+def test_fingerprint_ignores_key_order():
+    assert request_fingerprint({"a": 1, "b": 2}) == request_fingerprint({"b": 2, "a": 1})
+    assert request_fingerprint({"a": 1}) != request_fingerprint({"a": 2})
+
+
+def test_document_id_is_stable_and_a_valid_appwrite_id():
+    document_id = document_id_for("create_appointment", "key")
+    assert document_id == document_id_for("create_appointment", "key")
+    assert document_id != document_id_for("create_appointment", "other")
+    assert re.fullmatch(r"[a-f0-9]{36}", document_id)
+
+
+def _booking_request(**changes) -> schemas.AppointmentCreate:
+    request = dict(
+        customer_name="A", customer_phone="+919900000000", shop_id="shop1", shop_name="Shop",
+        barber_id="any", barber_name="Any", start_time=datetime(2026, 1, 5, 12, 0),
+        service_snapshots=[{"id": "s1", "name": "Cut", "duration": 30, "price": 300}], tax_rate=0.18,
+    )
+    return schemas.AppointmentCreate(**{**request, **changes})
+
+
+_EXISTING = {
+    "$id": "id1", "shop_id": "shop1", "barber_id": "b1", "customer_phone": "+919900000000",
+    "start_time": "2026-01-05T06:30:00.000+00:00",
+}
+
+
+def test_retry_on_another_worker_gets_the_concurrent_booking(monkeypatch):
+    lookups = iter([None, _EXISTING])
+
+    async def find(document_id):
+        return next(lookups)
+
+    async def slot_taken(*args):
+        # The other worker's create won the race for the document ID
+        raise HTTPException(status_code=409, detail="This appointment has already been booked.")
+
+    monkeypatch.setattr(booking_router, "find_appointment", find)
+    monkeypatch.setattr(booking_router, "_book_appointment", slot_taken)
+    result = asyncio.run(booking_router._book_idempotent(_booking_request(), None, "id1"))
+    assert result == (_EXISTING, True)
+
+
+def test_retry_on_another_worker_with_a_different_body_is_rejected(monkeypatch):
+    async def find(document_id):
+        return _EXISTING
+
+    monkeypatch.setattr(booking_router, "find_appointment", find)
+    assert asyncio.run(booking_router._book_idempotent(_booking_request(barber_id="b1"), None, "id1")) == (_EXISTING, True)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(booking_router._book_idempotent(_booking_request(start_time=datetime(2026, 1, 5, 13, 0)), None, "id1"))
+    assert error.value.status_code == 422
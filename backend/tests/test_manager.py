@@ -0,0 +1,49 @@
+# backend/tests/test_manager.py
+
+import asyncio
+
+from routers import manager as manager_router
+
+
+def _appointment(appointment_id: str, status: str, updated_at: str) -> dict:
+    return {"$id": appointment_id, "status": status, "$updatedAt": updated_at}
+
+
+def _delta(monkeypatch, rows, since: str, status=None) -> dict:
+    async def one_page(queries):
+        yield rows
+
+    monkeypatch.setattr(manager_router, "stream_appointments", one_page)
+    return asyncio.run(manager_router._appointments_changed_since([], since, status))
+
+
+def test_unfiltered_delta_reports_cancelled_rows_for_removal(monkeypatch):
+    rows = [
+        _appointment("a1", "Booked", "2026-01-05T10:00:01.000+00:00"),
+        _appointment("a2", "Cancelled", "2026-01-05T10:00:02.000+00:00"),
+    ]
+    delta = _delta(monkeypatch, rows, "2026-01-05T10:00:00+00:00")
+    assert [row["$id"] for row in delta["appointments"]] == ["a1"]
+    assert delta["cancelled_ids"] == ["a2"]
+    assert delta["watermark"] == "2026-01-05T10:00:02+00:00|a2"
+
+
+def test_filtered_delta_reports_rows_that_left_the_filter(monkeypatch):
+    rows = [
+        _appointment("a1", "Booked", "2026-01-05T10:00:01.000+00:00"),
+        _appointment("a2", "InProgress", "2026-01-05T10:00:02.000+00:00"),
+        _appointment("a3", "Cancelled", "2026-01-05T10:00:02.000+00:00"),
+    ]
+    delta = _delta(monkeypatch, rows, "2026-01-05T10:00:00+00:00", status="Booked")
+    assert [row["$id"] for row in delta["appointments"]] == ["a1"]
+    assert delta["cancelled_ids"] == ["a2", "a3"]
+
+
+def test_rows_already_sent_at_the_watermark_are_skipped(monkeypatch):
+    rows = [
+        _appointment("a1", "Booked", "2026-01-05T10:00:00.000+00:00"),
+        _appointment("a2", "Booked", "2026-01-05T10:00:00.000+00:00"),
+    ]
+    delta = _delta(monkeypatch, rows, "2026-01-05T10:00:00+00:00|a1")
+    assert [row["$id"] for row in delta["appointments"]] == ["a2"]
+    assert delta["watermark"] == "2026-01-05T10:00:00+00:00|a1,a2"
@@ -0,0 +1,31 @@
+# backend/tests/test_query_stats.py
+
+from appwrite.query import Query
+
+from query_stats import fingerprint
+
+
+def test_values_are_stripped():
+    first = fingerprint("list", "appointments", [Query.equal("barber_id", ["b1"]), Query.limit(10)])
+    second = fingerprint("list", "appointments", [Query.equal("barber_id", ["b2"]), Query.limit(500)])
+    assert first == second == "list appointments [equal(barber_id) & limit]"
+
+
+def test_filters_are_order_independent_and_trailing_methods_go_last():
+    shape = fingerprint("list", "appointments", [
+        Query.limit(5),
+        Query.order_asc("start_time"),
+        Query.less_than("start_time", "2026-01-02"),
+        Query.equal("shop_id", ["s1"]),
+        Query.cursor_after("a1"),
+    ])
+    assert shape == "list appointments [equal(shop_id) & lessThan(start_time) & orderAsc(start_time) & limit & cursorAfter]"
+
+
+def test_multi_value_equal_is_its_own_shape():
+    assert fingerprint("list", "barbers", [Query.equal("$id", ["a", "b"])]) == "list barbers [equal($id, many)]"
+
+
+def test_non_list_operations_are_keyed_by_collection():
+    assert fingerprint("get", "shops") == "get shops"
+    assert fingerprint("list", "shops") == "list shops []"
@@ -0,0 +1,70 @@
+# backend/tests/test_reference_cache.py
+
+import asyncio
+
+import reference_cache as reference_cache_module
+from reference_cache import REFERENCE_COLLECTIONS, ReferenceCache
+
+
+def _loaded_cache(monkeypatch) -> ReferenceCache:
+    monkeypatch.setattr(reference_cache_module, "SNAPSHOT_ENABLED", False)
+    cache = ReferenceCache()
+    for name in REFERENCE_COLLECTIONS:
+        cache._store(name, [{"$id": f"{name}-old", "shop_id": "s1"}], 0)
+    return cache
+
+
+def test_invalidate_refetches_before_returning_and_stays_warm(monkeypatch):
+    cache = _loaded_cache(monkeypatch)
+
+    async def fetch(collection_id):
+        return [{"$id": "shop-new", "shop_id": "s1"}]
+
+    monkeypatch.setattr(reference_cache_module, "fetch_all_documents_async", fetch)
+    asyncio.run(cache.invalidate("shops"))
+
+    assert [shop["$id"] for shop in cache.shops()] == ["shop-new"]
+    assert cache.is_warm
+
+
+def test_a_refresh_started_before_a_write_does_not_overwrite_it(monkeypatch):
+    cache = _loaded_cache(monkeypatch)
+    responses = {}
+
+    async def fetch(collection_id):
+        response = responses[collection_id] = asyncio.get_running_loop().create_future()
+        return await response
+
+    async def scenario():
+        stale_refresh = asyncio.create_task(cache._refresh("shops"))
+        await asyncio.sleep(0)
+        stale_response = responses.pop(REFERENCE_COLLECTIONS["shops"])
+
+        write_refresh = asyncio.create_task(cache.invalidate("shops"))
+        await asyncio.sleep(0)
+        responses[REFERENCE_COLLECTIONS["shops"]].set_result([{"$id": "after-write"}])
+        await write_refresh
+
+        # The older fetch finishes last
+        stale_response.set_result([{"$id": "before-write"}])
+        await stale_refresh
+
+    monkeypatch.setattr(reference_cache_module, "fetch_all_documents_async", fetch)
+    asyncio.run(scenario())
+    assert [shop["$id"] for shop in cache.shops()] == ["after-write"]
+
+
+def test_failed_refetch_keeps_serving_the_previous_copy(monkeypatch):
+    cache = _loaded_cache(monkeypatch)
+    scheduled = []
+
+    async def failing_fetch(collection_id):
+        raise ConnectionError("backend down")
+
+    monkeypatch.setattr(reference_cache_module, "fetch_all_documents_async", failing_fetch)
+    monkeypatch.setattr(cache, "_schedule_refresh", scheduled.append)
+    asyncio.run(cache.invalidate("barbers"))
+
+    assert [barber["$id"] for barber in cache.barbers()] == ["barbers-old"]
+    assert scheduled == ["barbers"]
+    assert cache.is_warm
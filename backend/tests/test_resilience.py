@@ -0,0 +1,157 @@
+# backend/tests/test_resilience.py
+
+import asyncio
+
+import pytest
+import requests
+from appwrite.exception import AppwriteException
+
+import resilience
+from resilience import BackendUnavailable, CircuitBreaker, ResilientBackend, _is_transient
+
+
+class FakeDatabases:
+    """Stands in for the Appwrite Databases service; each call takes the next scripted outcome."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def list_documents(self, database_id, collection_id, queries=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def _sdk_transport_error() -> AppwriteException:
+    """How the SDK reports a connection failure: a code-less AppwriteException wrapping it."""
+    try:
+        try:
+            raise requests.ConnectionError("connection refused")
+        except requests.ConnectionError as e:
+            raise AppwriteException(str(e))
+    except AppwriteException as wrapped:
+        return wrapped
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRY_BASE_DELAY_SECONDS", 0)
+    monkeypatch.setattr(resilience, "HEDGING_ENABLED", False)
+
+
+def _read(backend: ResilientBackend, allow_stale: bool = True):
+    return asyncio.run(backend.list_documents("db", "shops", queries=["q"], allow_stale=allow_stale))
+
+
+PAGE = {"total": 1, "documents": [{"$id": "s1"}]}
+
+
+def test_transient_failures_are_retried():
+    service = FakeDatabases(_sdk_transport_error(), AppwriteException("busy", 503), PAGE)
+    backend = ResilientBackend(service)
+    assert _read(backend) == PAGE
+    assert service.calls == 3
+    assert backend.counters["retries"] == 2
+    assert backend.breaker.state == "closed"
+
+
+def test_client_errors_are_not_retried():
+    service = FakeDatabases(AppwriteException("not found", 404))
+    backend = ResilientBackend(service)
+    with pytest.raises(AppwriteException):
+        _read(backend)
+    assert service.calls == 1
+    assert backend.counters["failures"] == 0
+
+
+def test_programming_errors_are_not_retried():
+    service = FakeDatabases(KeyError("documents"))
+    backend = ResilientBackend(service)
+    with pytest.raises(KeyError):
+        _read(backend)
+    assert service.calls == 1
+
+
+def test_no_stale_data_while_the_circuit_is_closed():
+    service = FakeDatabases(PAGE, AppwriteException("down", 503))
+    backend = ResilientBackend(service)
+    assert _read(backend) == PAGE
+    with pytest.raises(BackendUnavailable):
+        _read(backend)
+    assert backend.counters["stale_served"] == 0
+
+
+def test_stale_data_is_served_only_while_open_and_when_allowed():
+    service = FakeDatabases(PAGE, AppwriteException("down", 503))
+    backend = ResilientBackend(service)
+    backend.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    assert _read(backend) == PAGE
+
+    assert _read(backend) == PAGE # Fails, opens the circuit, falls back to the last result
+    assert backend.breaker.state == "open"
+    with pytest.raises(BackendUnavailable):
+        _read(backend, allow_stale=False)
+    assert backend.counters["stale_served"] == 1
+
+
+def test_unknown_read_fails_fast_while_open():
+    service = FakeDatabases(AppwriteException("down", 503))
+    backend = ResilientBackend(service)
+    backend.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    with pytest.raises(BackendUnavailable):
+        _read(backend)
+    calls = service.calls
+    with pytest.raises(BackendUnavailable):
+        _read(backend)
+    assert service.calls == calls # Short-circuited
+    assert backend.counters["short_circuited"] == 1
+
+
+def test_is_transient():
+    assert _is_transient(asyncio.TimeoutError())
+    assert _is_transient(requests.ReadTimeout())
+    assert _is_transient(_sdk_transport_error())
+    assert _is_transient(AppwriteException("rate limited", 429))
+    assert not _is_transient(AppwriteException("conflict", 409))
+    assert not _is_transient(ValueError("bad date"))
+
+
+def _half_open_backend(service) -> ResilientBackend:
+    backend = ResilientBackend(service)
+    backend.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    backend.breaker.record_failure() # Open; with no reset delay the next call is the trial
+    return backend
+
+
+def test_client_error_during_half_open_trial_closes_the_circuit():
+    service = FakeDatabases(AppwriteException("not found", 404), PAGE)
+    backend = _half_open_backend(service)
+    with pytest.raises(AppwriteException):
+        _read(backend)
+    assert backend.breaker.state == "closed"
+    assert _read(backend) == PAGE
+
+
+def test_cancelled_half_open_trial_frees_the_trial_slot():
+    class SlowDatabases(FakeDatabases):
+        def list_documents(self, *args, **kwargs):
+            import time
+            time.sleep(0.2)
+            return super().list_documents(*args, **kwargs)
+
+    async def scenario():
+        backend = _half_open_backend(SlowDatabases(PAGE))
+        trial = asyncio.ensure_future(backend.list_documents("db", "shops"))
+        await asyncio.sleep(0.05)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        assert backend.breaker.state == "half_open"
+        # The next call becomes the new trial instead of being short-circuited
+        assert await backend.list_documents("db", "shops") == PAGE
+        assert backend.breaker.state == "closed"
+
+    asyncio.run(scenario())
@@ -0,0 +1,23 @@
+# backend/tests/test_shared_snapshot.py
+
+import shared_snapshot as shared_snapshot_module
+from shared_snapshot import SharedSnapshot
+
+
+def test_readers_look_for_a_new_snapshot_on_a_timer_and_after_their_own_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_snapshot_module, "SNAPSHOT_POLL_SECONDS", 3600)
+    refresher = SharedSnapshot(str(tmp_path / "reference.snapshot"))
+    reader = SharedSnapshot(str(tmp_path / "reference.snapshot"))
+
+    refresher.write({"shops": [{"$id": "s1"}]}, built_from_version=0)
+    assert reader.read("shops") == [{"$id": "s1"}]
+
+    refresher.write({"shops": [{"$id": "s2"}]}, built_from_version=0)
+    # Within the poll interval the reader keeps its parsed copy without touching the file
+    assert reader.read("shops") == [{"$id": "s1"}]
+
+    version = reader.bump_version()
+    # Its own write makes older snapshots unusable, and the one that includes it is picked up at once
+    assert reader.read("shops") is None
+    refresher.write({"shops": [{"$id": "s3"}]}, built_from_version=version)
+    assert reader.read("shops") == [{"$id": "s3"}]
@@ -0,0 +1,105 @@
+# backend/tests/test_waitlist.py
+
+import asyncio
+from datetime import datetime
+
+from logic import waitlist as waitlist_module
+from logic.appointment_record import minute_of
+from logic.waitlist import Waitlist, _Bucket, _WaitingEntry
+
+
+def _entry(entry_id: str, duration: int, barber_id: str = "any", created_at: str = "") -> _WaitingEntry:
+    document = {
+        "$id": entry_id,
+        "$createdAt": created_at or f"2026-01-01T00:00:{entry_id[-2:]}.000+00:00",
+        "shop_id": "shop1",
+        "barber_id": barber_id,
+        "duration": duration,
+    }
+    return _WaitingEntry(document, ["2026-01-05"])
+
+
+def _bucket(*entries: _WaitingEntry) -> _Bucket:
+    bucket = _Bucket()
+    for entry in entries:
+        bucket.add(entry)
+    return bucket
+
+
+def test_best_fit_takes_the_longest_entry_that_fits():
+    bucket = _bucket(_entry("e01", 30), _entry("e02", 60), _entry("e03", 45), _entry("e04", 90))
+    assert bucket.best_fit(60, "b1", set()).entry_id == "e02"
+    assert bucket.best_fit(59, "b1", set()).entry_id == "e03"
+    assert bucket.best_fit(29, "b1", set()) is None
+
+
+def test_best_fit_is_first_come_first_served_among_equal_durations():
+    bucket = _bucket(_entry("e02", 30, created_at="2026-01-02"), _entry("e01", 30, created_at="2026-01-03"))
+    assert bucket.best_fit(30, "b1", set()).entry_id == "e02"
+
+
+def test_best_fit_skips_other_barbers_and_excluded_entries():
+    bucket = _bucket(_entry("e01", 30), _entry("e02", 45, barber_id="b2"), _entry("e03", 45, barber_id="b1"))
+    assert bucket.best_fit(60, "b1", set()).entry_id == "e03"
+    assert bucket.best_fit(60, "b1", {"e03"}).entry_id == "e01"
+    assert bucket.best_fit(60, "b2", set()).entry_id == "e02"
+
+
+def test_removed_entries_are_no_longer_matched():
+    kept, removed = _entry("e01", 30), _entry("e02", 45)
+    bucket = _bucket(kept, removed)
+    bucket.remove(removed)
+    assert len(bucket) == 1
+    assert bucket.best_fit(60, "b1", set()) is kept
+
+
+
+def test_claimed_entry_is_restored_when_filling_fails(monkeypatch):
+    index = Waitlist()
+    entry = _entry("e01", 30)
+    index._restore(entry)
+    day_start = minute_of(datetime(2026, 1, 5))
+    fill_attempts = []
+
+    async def whole_day(shop_id, barber_id, day, freed_start):
+        return day_start, day_start + 24 * 60
+
+    async def failing_fill(claimed, *args):
+        fill_attempts.append(claimed.entry_id)
+        raise ConnectionError("backend down")
+
+    monkeypatch.setattr(waitlist_module, "_free_block_around", whole_day)
+    monkeypatch.setattr(waitlist_module, "_now_minute", lambda: day_start)
+    monkeypatch.setattr(index, "_fill", failing_fill)
+    asyncio.run(index._backfill("shop1", "b1", "Barber", day_start + 600, day_start + 630, set()))
+
+    assert fill_attempts == ["e01"]
+    assert index.has_waiting("shop1", "2026-01-05")
+    assert index.stats()["waiting"] == 1
+
+
+def test_sweep_backfills_each_cancellation_once(monkeypatch):
+    index = Waitlist()
+    cancelled = {
+        "$id": "a01", "$updatedAt": "2026-01-05T04:00:00.000+00:00", "status": "Cancelled",
+        "shop_id": "shop1", "barber_id": "b1", "barber_name": "Barber",
+        "start_time": "2026-01-05T05:30:00.000+00:00", "end_time": "2026-01-05T06:00:00.000+00:00",
+    }
+    backfilled = []
+
+    async def one_page(queries):
+        yield [cancelled]
+
+    async def record_backfill(shop_id, barber_id, barber_name, freed_start, freed_end, exclude):
+        backfilled.append((shop_id, barber_id, freed_end - freed_start))
+
+    monkeypatch.setattr(waitlist_module, "stream_appointments", one_page)
+    monkeypatch.setattr(waitlist_module.appointment_index, "apply", lambda document: None)
+    monkeypatch.setattr(index, "rebuild", lambda: None)
+    monkeypatch.setattr(index, "_backfill", record_backfill)
+    # The inclusive $updatedAt range returns the same row on the next sweep
+    asyncio.run(index.sweep_cancellations())
+    asyncio.run(index.sweep_cancellations())
+
+    assert backfilled == [("shop1", "b1", 30)]
+    assert index._sweep_since == cancelled["$updatedAt"]
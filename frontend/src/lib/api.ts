@@ -9,6 +9,8 @@ import type {
   RawShopDocument, // <-- NEW
   RawBarberDocument, // <-- NEW
   AppointmentPayload,
+  NextAvailability,
+  CrossShopAvailability,
   ManagerAppointment,
   RawManagerAppointment,
   AppointmentStatus,
@@ -17,6 +19,7 @@ import type {
   UpdateSchedulePayload,
   FinancialsReport,
   OwnerStaffMember,
+  ShopStaffSummary,
   NewShopPayload
 } from "./types";
 
@@ -119,11 +122,87 @@ export const getAvailableSlots = async (
 };
 
 
+// API function to find the next opening (first date with fitting slots) in one call
+export const getNextAvailable = async (
+  shopId: string,
+  barberId: string,
+  totalDuration: number
+): Promise<NextAvailability | null> => {
+  try {
+    const response = await api.get<NextAvailability>("/api/availability/next", {
+      params: {
+        shop_id: shopId,
+        barber_id: barberId,
+        total_duration: totalDuration,
+      },
+    });
+    return response.data;
+  } catch (error) {
+    console.error("Failed to fetch the next available slot:", error);
+    return null;
+  }
+};
+
+// API function to get "any barber" slots for every shop (or some shops) in one call
+export const getAvailabilityAcrossShops = async (
+  date: string,
+  totalDuration: number,
+  shopIds?: string[]
+): Promise<CrossShopAvailability | null> => {
+  try {
+    const response = await api.get<CrossShopAvailability>("/api/availability/shops", {
+      params: {
+        date,
+        duration: totalDuration,
+        shop_ids: shopIds?.join(","),
+      },
+    });
+    return response.data;
+  } catch (error) {
+    console.error("Failed to fetch availability across shops:", error);
+    return null;
+  }
+};
+
+// Retrying the same booking reuses its Idempotency-Key, so a request whose
+// response was lost returns the original appointment instead of a 409.
+let pendingBooking: { body: string; key: string } | null = null;
+
+// crypto.randomUUID only exists in secure contexts (HTTPS or localhost)
+const newIdempotencyKey = (): string => {
+  if (typeof crypto !== "undefined" && typeof crypto.randomUUID === "function") {
+    return crypto.randomUUID();
+  }
+  const bytes = new Uint8Array(16);
+  if (typeof crypto !== "undefined" && typeof crypto.getRandomValues === "function") {
+    crypto.getRandomValues(bytes);
+  } else {
+    for (let i = 0; i < bytes.length; i++) bytes[i] = Math.floor(Math.random() * 256);
+  }
+  return Array.from(bytes, (byte) => byte.toString(16).padStart(2, "0")).join("");
+};
 
 export const createAppointment = async (payload: AppointmentPayload) => {
   // The old AppointmentPayload interface is now defined in types.ts
-  const response = await api.post("/api/appointments", payload);
-  return response.data;
+  const body = JSON.stringify(payload);
+  if (pendingBooking?.body !== body) {
+    pendingBooking = { body, key: newIdempotencyKey() };
+  }
+  try {
+    const response = await api.post("/api/appointments", payload, {
+      headers: { "Idempotency-Key": pendingBooking.key },
+    });
+    pendingBooking = null;
+    return response.data;
+  } catch (error) {
+    // The server answered definitively (e.g. 409 slot taken, 422): a retry is a
+    // new attempt and needs a new key. Keep it only when the outcome is unknown.
+    const status = axios.isAxiosError(error) ? error.response?.status : undefined;
+    if (status !== undefined && status < 500) {
+      pendingBooking = null;
+    }
+    throw error;
+  }
 };
 
 
@@ -222,12 +301,16 @@ export const getAvailableBarbers = async (
 
 export const getShopById = async (shopId: string): Promise<Shop | null> => {
   try {
-    // We don't have a direct /api/shops/{id} endpoint, so we fetch all
-    // and find the one we need. This is acceptable since there are only 2 shops.
-    // If there were many shops, a dedicated backend endpoint would be better.
-    const allShops = await getAllShops();
-    const shop = allShops.find((s) => s.id === shopId);
-    return shop || null;
+    // Served from the backend's reference cache, so this is a single lookup
+    const response = await api.get<RawShopDocument>(`/api/shops/${shopId}`);
+    const shop = response.data;
+    return {
+      id: shop.$id,
+      name: shop.name,
+      address: shop.address,
+      phone_number: shop.phone_number,
+      tax_rate: shop.tax_rate,
+    };
   } catch (error) {
     console.error(`Failed to fetch details for shop ${shopId}:`, error);
     return null;
@@ -342,12 +425,13 @@ export const getOwnerShops = async (): Promise<Shop[]> => {
 };
 
 export const getOwnerStaff = async (
-  shopId?: string
+  shopId?: string,
+  search?: string // Only staff whose name contains these words
 ): Promise<OwnerStaffMember[]> => {
   try {
     const response = await api.get<OwnerStaffMember[]>("/api/owner/staff", {
       // Axios will automatically omit the 'shop_id' param if `shopId` is undefined
-      params: { shop_id: shopId },
+      params: { shop_id: shopId, search },
     });
     // The API response matches our type, so no mapping is needed.
     return response.data;
@@ -358,6 +442,21 @@ export const getOwnerStaff = async (
   }
 };
 
+// Per-shop headcounts and how many barbers are on shift right now
+export const getOwnerStaffSummary = async (
+  shopId?: string
+): Promise<ShopStaffSummary[]> => {
+  try {
+    const response = await api.get<ShopStaffSummary[]>("/api/owner/staff/summary", {
+      params: { shop_id: shopId },
+    });
+    return response.data;
+  } catch (error) {
+    console.error("Failed to fetch owner staff summary:", error);
+    return [];
+  }
+};
+
 export const getOwnerFinancials = async (
   filters: { shop_id?: string; date?: string; month?: string } // date: "YYYY-MM-DD", month: "YYYY-MM"
 ): Promise<FinancialsReport | null> => {
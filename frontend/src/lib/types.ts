@@ -63,6 +63,28 @@ export interface ServiceSnapshot {
   price: number;
 }
 
+export interface NextAvailability {
+  shop_id: string;
+  barber_id: string;
+  date: string | null; // null if nothing fits within the horizon
+  slots: string[];
+  barber_ids: string[];
+  days_searched: number;
+}
+
+export interface ShopAvailability {
+  shop_id: string;
+  shop_name: string;
+  slots: string[];
+  barber_ids: string[];
+}
+
+export interface CrossShopAvailability {
+  date: string;
+  total_duration: number;
+  shops: ShopAvailability[];
+}
+
 export interface AppointmentPayload {
   customer_name: string;
   customer_phone: string;
@@ -143,12 +165,31 @@ export interface UpdateSchedulePayload {
   }[];
 }
 
+export interface DailyFinancials {
+  date: string; // YYYY-MM-DD
+  revenue_before_tax: number;
+  tax_collected: number;
+  revenue_after_tax: number;
+  appointments: number;
+}
+
+export interface BarberFinancials {
+  barber_id: string;
+  barber_name: string;
+  revenue_before_tax: number;
+  tax_collected: number;
+  revenue_after_tax: number;
+  appointments: number;
+}
+
 export interface FinancialsReport {
   total_revenue_before_tax: number;
   total_tax_collected: number;
   total_revenue_after_tax: number;
   total_appointments: number;
   filter_period: string; // e.g., "for date 2025-09-15"
+  daily_series?: DailyFinancials[]; // One entry per day of the period
+  barber_breakdown?: BarberFinancials[];
 }
 
 export interface OwnerStaffMember {
@@ -165,6 +206,13 @@ export interface OwnerStaffMember {
   shop_id: string; // The shop this staff member belongs to
 }
 
+export interface ShopStaffSummary {
+  shop_id: string;
+  shop_name: string;
+  headcount: number;
+  on_shift: number; // Barbers inside their schedule right now
+}
+
 export interface NewShopPayload {
   name: string;
   address: string;